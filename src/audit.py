@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from config import (
+    AUDIT_WORKERS,
+    BUNDLE_CACHE_PATH,
+    BUNDLE_STORE_PATH,
+    DATAPATH,
+    DEFAULT_SERVER,
+    DOWNLOADPATH,
+    ak_assets_url,
+    ak_version_api,
+)
+from download_res import bundle_url, manifest_key, res_name, server_path
+from downloader import ArkDownloader, DownloadError, full_md5
+from journal import DownloadJournal
+from manifest_db import ManifestDB
+from pack_planner import verify_repacked
+from store import BundleStore
+from util import file_md5
+
+# 版本目录下按资源类别保存的子目录
+CATEGORY_DIRS = ("new", "update", "full")
+
+
+class Auditor:
+    """下载目录完整性检查
+
+    按 hot_update_list 中的 md5 和 totalSize 检查版本目录和资源存储中的文件：
+
+    - corrupt：大小正确但 md5 不符，或大小超出
+    - truncated：比期望的小
+    - orphaned：没有任何已知版本引用的文件，以及残留的 ``.part`` 和整包文件
+    - missing：完整快照（``full/<类别>``）中缺少的资源
+
+    anon 资源的 md5 不完整（见 ``downloader.full_md5``），只检查大小。
+    从整包中取出的资源经过重新打包，md5 和大小都与 abInfos 不同，改为检查
+    zip 成员的大小和 CRC（见 ``pack_planner.verify_repacked``），
+    通过的计入 ``repacked``。
+
+    版本目录中的文件大多是资源存储的硬链接，同一个 inode 只计算一次 md5。
+    只使用本地已有的版本文件列表，缺少列表的版本计入 ``unknown_versions``，不做检查。
+
+    Args:
+        root (Path, optional): 下载目录.
+        manifest_db (ManifestDB | None, optional): 版本文件列表数据库.
+        workers (int | None, optional): 计算 md5 的线程数，为空时等于 CPU 核数.
+    """
+
+    def __init__(
+        self,
+        root: Path = DOWNLOADPATH,
+        manifest_db: ManifestDB | None = None,
+        workers: int | None = AUDIT_WORKERS,
+    ):
+        self.root = Path(root)
+        self.db = manifest_db or ManifestDB()
+        self.workers = workers or os.cpu_count() or 4
+        self.store = BundleStore(
+            self.root / BUNDLE_STORE_PATH.relative_to(DOWNLOADPATH)
+        )
+        self.cache_root = self.root / BUNDLE_CACHE_PATH.relative_to(DOWNLOADPATH)
+        self.journal = DownloadJournal(self.root / "journal.json")
+        self._indexes: dict[tuple[str, str, str], dict[str, dict] | None] = {}
+
+    # 版本文件列表
+
+    def _has_manifest(self, server: str, version: str) -> bool:
+        key = manifest_key(version, server)
+        if self.db.has_version(key):
+            return True
+        ver_file = server_path(DATAPATH / "hot_update_list", server) / f"{version}.json"
+        if not ver_file.exists():
+            return False
+        with open(ver_file, encoding="utf8") as file:
+            self.db.ingest(json.load(file), key)
+        return True
+
+    def _index(self, server: str, version: str, prefix: str) -> dict[str, dict] | None:
+        """版本中某类别的资源，以下载后的文件名（不含扩展名）为键"""
+        cache_key = (server, version, prefix)
+        if cache_key not in self._indexes:
+            index = None
+            if self._has_manifest(server, version):
+                infos = self.db.ab_infos(manifest_key(version, server), prefix)
+                if prefix == "anon":
+                    # anon 资源的扩展名为 4 个字符，见 ResourceSyncer.sync_anon
+                    index = {i["name"].split("/")[-1][:-4]: i for i in infos}
+                else:
+                    index = {res_name(i["name"]): i for i in infos}
+            self._indexes[cache_key] = index
+        return self._indexes[cache_key]
+
+    # 扫描
+
+    def _version_dirs(self):
+        """(服务器, 版本号, 版本目录)"""
+        for child in sorted(self.root.iterdir()):
+            if not child.is_dir() or child in (self.store.root, self.cache_root):
+                continue
+            if child.name in ak_version_api:
+                for version_dir in sorted(child.iterdir()):
+                    if version_dir.is_dir():
+                        yield child.name, version_dir.name, version_dir
+            else:
+                yield DEFAULT_SERVER, child.name, child
+
+    def scan(self) -> tuple[list[dict], list[str]]:
+        """列出需要检查的文件
+
+        Returns:
+            tuple[list[dict], list[str]]: (文件记录, 缺少版本文件列表的版本)
+        """
+        records = []
+        unknown = set()
+
+        if self.store.root.exists():
+            for path in self.store.root.rglob("*"):
+                if not path.is_file() or path.suffix == ".part":
+                    continue
+                md5 = path.stem
+                records.append(
+                    {
+                        "path": path,
+                        "type": "store",
+                        "md5": md5,
+                        "size": self.db.md5_size(md5),
+                    }
+                )
+
+        for server, version, version_dir in self._version_dirs():
+            for path in version_dir.rglob("*"):
+                if not path.is_file() or self.cache_root in path.parents:
+                    continue
+                parts = path.relative_to(version_dir).parts
+                record = {
+                    "path": path,
+                    "type": "bundle",
+                    "server": server,
+                    "version": version,
+                }
+
+                if path.suffix == ".part" or parts[0] == "packs":
+                    # 下载日志中有记录的 .part 可以续传，不算残留
+                    if path.suffix == ".part" and self.journal.get(
+                        path.with_name(path.name[: -len(".part")])
+                    ):
+                        continue
+                    records.append({**record, "type": "partial"})
+                    continue
+                if path.suffix != ".zip":
+                    continue
+
+                if parts[0] in CATEGORY_DIRS:
+                    prefix = "/".join(parts[1:-1])
+                elif parts[0] == "anon":
+                    prefix = "anon"
+                elif parts[0] == "excel":
+                    prefix = "gamedata/excel"
+                else:
+                    continue
+
+                index = self._index(server, version, prefix)
+                if index is None:
+                    unknown.add(f"{server}/{version}")
+                    continue
+                info = index.get(path.stem)
+                records.append(
+                    {
+                        **record,
+                        "name": info["name"] if info else None,
+                        "md5": info["md5"] if info else None,
+                        "size": info["totalSize"] if info else None,
+                        "ab_size": info.get("abSize") if info else None,
+                    }
+                )
+        return records, sorted(unknown)
+
+    def _missing(self) -> list[dict]:
+        """完整快照目录中缺少的资源"""
+        missing = []
+        for server, version, version_dir in self._version_dirs():
+            full_dir = version_dir / "full"
+            if not full_dir.is_dir() or not self._has_manifest(server, version):
+                continue
+            key = manifest_key(version, server)
+            for category_dir in sorted(p for p in full_dir.rglob("*") if p.is_dir()):
+                prefix = category_dir.relative_to(full_dir).as_posix()
+                if not any(category_dir.glob("*.zip")):
+                    continue
+                for info in self.db.ab_infos(key, prefix):
+                    path = category_dir / f"{res_name(info['name'])}.zip"
+                    if not path.exists():
+                        missing.append(
+                            {
+                                "path": path,
+                                "type": "bundle",
+                                "server": server,
+                                "version": version,
+                                "name": info["name"],
+                                "md5": info["md5"],
+                                "size": info["totalSize"],
+                            }
+                        )
+        return missing
+
+    def audit(self) -> dict:
+        """检查所有文件
+
+        Returns:
+            dict: 各类问题的文件记录，以及扫描数量、计算 md5 的字节数和耗时
+        """
+        start = time.perf_counter()
+        records, unknown = self.scan()
+        report: dict = {
+            "corrupt": [],
+            "truncated": [],
+            "orphaned": [],
+            "missing": self._missing(),
+            "unknown_versions": unknown,
+        }
+
+        to_hash: dict[tuple[int, int], list[dict]] = {}
+        for record in records:
+            if record["type"] == "partial" or record["size"] is None:
+                report["orphaned"].append(record)
+                continue
+            stat = record["path"].stat()
+            record["actual_size"] = stat.st_size
+            record["inode"] = (stat.st_dev, stat.st_ino)
+            if stat.st_size < record["size"]:
+                report["truncated"].append(record)
+            elif stat.st_size > record["size"]:
+                report["corrupt"].append(record)
+            elif full_md5(record["md5"]):
+                to_hash.setdefault(record["inode"], []).append(record)
+
+        # 同一 inode 的各个硬链接只计算一次
+        paths = [group[0]["path"] for group in to_hash.values()]
+        with ThreadPoolExecutor(self.workers) as pool:
+            digests = list(pool.map(file_md5, paths))
+            for group, digest in zip(to_hash.values(), digests, strict=True):
+                for record in group:
+                    if digest != full_md5(record["md5"]):
+                        report["corrupt"].append(record)
+
+            # 与 abInfos 不符的资源可能是从整包中取出的
+            suspects = [
+                r
+                for r in report["corrupt"] + report["truncated"]
+                if r["type"] == "bundle"
+            ]
+            verified = pool.map(
+                verify_repacked,
+                [r["path"] for r in suspects],
+                [r["name"] for r in suspects],
+                [r["ab_size"] for r in suspects],
+            )
+            repacked = {id(r) for r, ok in zip(suspects, verified, strict=True) if ok}
+        for key in ("corrupt", "truncated"):
+            report[key] = [r for r in report[key] if id(r) not in repacked]
+        report["repacked"] = len(repacked)
+
+        report["scanned"] = len(records)
+        report["hashed"] = len(paths)
+        report["bytes_hashed"] = sum(g[0]["size"] for g in to_hash.values())
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        return report
+
+    # 修复
+
+    def _remove_damaged(self, report: dict, prune: bool) -> tuple[list[dict], int]:
+        """删除损坏的文件（以及孤立文件），返回需要重新下载的记录和删除的孤立文件数"""
+        jobs = []
+        for record in report["corrupt"] + report["truncated"]:
+            path: Path = record["path"]
+            md5 = full_md5(record["md5"])
+            obj = self.store.object_path(md5) if md5 else None
+            # 与版本目录中的文件是同一个 inode 时，存储中的对象同样损坏
+            if record["type"] == "bundle" and obj and obj.exists():
+                stat = obj.stat()
+                if (stat.st_dev, stat.st_ino) == record["inode"]:
+                    obj.unlink()
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+            if record["type"] == "bundle":
+                jobs.append(record)
+        jobs += report["missing"]
+
+        pruned = 0
+        if prune:
+            for record in report["orphaned"]:
+                with contextlib.suppress(FileNotFoundError):
+                    record["path"].unlink()
+                    pruned += 1
+        return jobs, pruned
+
+    async def repair(self, report: dict, prune: bool = False) -> dict:
+        """删除损坏的文件并重新下载，可选删除孤立文件
+
+        资源存储中损坏的对象只删除，之后同步或按需读取时会重新下载。
+        """
+        jobs, pruned = await asyncio.to_thread(self._remove_damaged, report, prune)
+
+        async with ArkDownloader(journal=self.journal) as downloader:
+
+            async def fetch(record: dict) -> bool:
+                url = bundle_url(
+                    ak_assets_url[record["server"]], record["version"], record["name"]
+                )
+                try:
+                    await self.store.fetch(
+                        downloader, url, record["md5"], record["size"], record["path"]
+                    )
+                    return True
+                except (DownloadError, httpx.HTTPError) as e:
+                    print(f"重新下载{record['name']}失败：{e}")
+                    return False
+
+            results = await asyncio.gather(*(fetch(r) for r in jobs))
+
+        return {
+            "repaired": results.count(True),
+            "failed": [
+                str(r["path"]) for r, ok in zip(jobs, results, strict=True) if not ok
+            ],
+            "pruned": pruned,
+        }
+
+
+def _to_json(report: dict) -> dict:
+    result = {}
+    for key, value in report.items():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            value = [
+                {
+                    k: str(v) if isinstance(v, Path) else v
+                    for k, v in r.items()
+                    if k != "inode"
+                }
+                for r in value
+            ]
+        result[key] = value
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查下载目录中资源文件的完整性")
+    parser.add_argument("--root", type=Path, default=DOWNLOADPATH)
+    parser.add_argument("--workers", type=int, default=AUDIT_WORKERS)
+    parser.add_argument(
+        "--repair", action="store_true", help="重新下载损坏、截断和缺少的文件"
+    )
+    parser.add_argument("--prune", action="store_true", help="删除孤立文件")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整结果")
+    args = parser.parse_args()
+
+    auditor = Auditor(args.root, workers=args.workers)
+    report = auditor.audit()
+    if args.repair or args.prune:
+        report["repair"] = asyncio.run(auditor.repair(report, prune=args.prune))
+
+    if args.json:
+        print(json.dumps(_to_json(report), ensure_ascii=False, indent=2))
+        return
+
+    print(
+        f"检查 {report['scanned']} 个文件，计算 md5 {report['hashed']} 个"
+        f"（{report['bytes_hashed'] / 2**30:.2f} GB），耗时 {report['seconds']} 秒"
+    )
+    if report["repacked"]:
+        print(f"从整包中取出（按 zip 成员检查）: {report['repacked']}")
+    for key, title in (
+        ("corrupt", "损坏"),
+        ("truncated", "不完整"),
+        ("orphaned", "孤立"),
+        ("missing", "缺少"),
+    ):
+        print(f"{title}: {len(report[key])}")
+        for record in report[key]:
+            print(f"  {record['path']}")
+    if report["unknown_versions"]:
+        print(f"缺少版本文件列表，未检查: {', '.join(report['unknown_versions'])}")
+    if "repair" in report:
+        print(report["repair"])
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,9 @@ from pathlib import Path
 from PIL import Image
 
 from download_res import get_res_version
+from encoder import load_image
 from unpacker import ArkMediaUnPacker
-from util import extract_package
+from util import open_package
 
 
 def gen_avg_chararts(unpack_info: dict) -> list[Path]:
@@ -23,16 +24,37 @@ def gen_avg_chararts(unpack_info: dict) -> list[Path]:
     face_alpha_set = unpack_info["pics"]["face_alpha"]
     full_alpha_set = unpack_info["pics"]["full_alpha"]
     file_name = unpack_info["pics"]["full"][0].split("$")[0]
+    # 解包时的图片格式，生成的差分总是保存为 PNG
+    ext = unpack_info.get("image_ext", ".png")
+    # 内存模式下图片直接取自解包结果，不读取文件
+    images = unpack_info.get("images")
+    # 解包时已合并遮罩的图片，直接带有透明通道
+    merged = set(unpack_info["pics"].get("merged", []))
     result_list = []
 
+    def open_pic(path: Path) -> Image.Image:
+        if images is not None:
+            return images[path.relative_to(base_path).as_posix()]
+        return load_image(path)
+
+    def compose_base(avg_img_path: Path, avg_alpha_path) -> Image.Image:
+        avg_img = open_pic(avg_img_path)
+        base_img = Image.new("RGBA", size=avg_img.size)
+        if avg_alpha_path:
+            avg_alpha = open_pic(avg_alpha_path).convert(mode="L")
+            base_img.paste(avg_img, mask=avg_alpha)
+        else:
+            base_img.paste(avg_img)
+        return base_img
+
     for avg_type in range(type_cnt):
         avg_type_name = avg_type + 1
         # 各种路径
-        avg_img_path = base_path / "full" / f"{file_name}${avg_type_name}.png"
+        avg_img_path = base_path / "full" / f"{file_name}${avg_type_name}{ext}"
         avg_alpha_path = ""
-        if full_alpha_set:
+        if f"{file_name}${avg_type_name}" in full_alpha_set:
             avg_alpha_path = (
-                base_path / "full" / f"{file_name}${avg_type_name}[alpha].png"
+                base_path / "full" / f"{file_name}${avg_type_name}[alpha]{ext}"
             )
 
         pos_info = unpack_info["pos_info"][avg_type]
@@ -45,40 +67,35 @@ def gen_avg_chararts(unpack_info: dict) -> list[Path]:
         else:
             save_path: Path = base_path.parent.parent / "out"
 
-        if not save_path.exists():
-            save_path.mkdir()
+        save_path.mkdir(parents=True, exist_ok=True)
 
         # 确定有差分
         if face_list:
+            # 原图与遮罩只合成一次，各个差分在其副本上粘贴脸部
+            base = None
             for i in face_list:
-                if not i.endswith(f"{avg_type_name}.png"):
+                if not i.endswith(f"{avg_type_name}{ext}"):
                     continue
-                # 打开图片
-                avg_img = Image.open(avg_img_path)
-                base_img = Image.new("RGBA", size=avg_img.size)
-
-                if full_alpha_set:
-                    avg_alpha = Image.open(avg_alpha_path).convert(mode="L")
-                    base_img.paste(avg_img, mask=avg_alpha)
-                else:
-                    base_img.paste(avg_img)
+                if base is None:
+                    base = compose_base(avg_img_path, avg_alpha_path)
+                base_img = base.copy()
 
-                f = Image.open(base_path / "face" / i)
+                f = open_pic(base_path / "face" / i)
                 head = Image.new("RGBA", f.size)
 
-                if face_alpha_set:
+                if face_alpha_set and i not in merged:
                     # 脸部遮罩路径
                     f_alpha_path = ""
                     for alpha in face_alpha_set:
                         if i.startswith(alpha):
-                            f_alpha_path = base_path / "face" / f"{alpha}[alpha].png"
+                            f_alpha_path = base_path / "face" / f"{alpha}[alpha]{ext}"
                     # 没有指定遮罩的时候使用默认遮罩
                     if not f_alpha_path:
                         f_alpha_path = (
-                            base_path / "face" / f"{avg_type_name}$[alpha].png"
+                            base_path / "face" / f"{avg_type_name}$[alpha]{ext}"
                         )
 
-                    f_alpha = Image.open(f_alpha_path).convert(mode="L")
+                    f_alpha = open_pic(f_alpha_path).convert(mode="L")
                     head.paste(f, mask=f_alpha)
                 else:
                     head.paste(f)
@@ -90,38 +107,39 @@ def gen_avg_chararts(unpack_info: dict) -> list[Path]:
                     # 处理脸部差分变成全身立绘的情况
                     base_img.paste(head)
 
-                base_img.save(save_path / i, quality=100)
-                result_list.append(save_path / i)
+                out_name = f"{Path(i).stem}.png"
+                base_img.save(save_path / out_name, quality=100)
+                result_list.append(save_path / out_name)
         else:
-            avg_img = Image.open(avg_img_path)
-            base_img = Image.new("RGBA", size=avg_img.size)
-            if full_alpha_set:
-                avg_alpha = Image.open(avg_alpha_path).convert(mode="L")
-                base_img.paste(avg_img, mask=avg_alpha)
-            else:
-                base_img.paste(avg_img)
-
-            base_img.save(save_path / avg_img_path.name, quality=100)
-            result_list.append(save_path / avg_img_path.name)
+            base_img = compose_base(avg_img_path, avg_alpha_path)
+
+            out_name = f"{avg_img_path.stem}.png"
+            base_img.save(save_path / out_name, quality=100)
+            result_list.append(save_path / out_name)
     # 删除缓存文件
     shutil.rmtree(base_path)
     return result_list
 
 
-error_ls = []
-res_version = get_res_version()
+def main():
+    error_ls = []
+    res_version = get_res_version()
+
+    for p in Path(f"download/{res_version}/new/avg/characters/").glob("*.zip"):
+    # for p in Path(f"cache/download/{res_version}/new/avg/characters/").glob("*.zip"):
+        file_name = p.name
+        print(f"processing: {file_name}")
+        with open_package(p) as ab:
+            unpack_info = ArkMediaUnPacker(ab).export_avg_chararts()
+        # try:
+        gen_avg_chararts(unpack_info)
+        # except Exception as e:
+        #     error_ls.append(file_name)
+        #     print(e)
 
-for p in Path(f"download/{res_version}/new/avg/characters/").glob("*.zip"):
-# for p in Path(f"cache/download/{res_version}/new/avg/characters/").glob("*.zip"):
-    file_name = p.name
-    print(f"processing: {file_name}")
-    unpack_info = ArkMediaUnPacker(extract_package(p)).export_avg_chararts()
-    # try:
-    gen_avg_chararts(unpack_info)
-    # except Exception as e:
-    #     error_ls.append(file_name)
-    #     print(e)
+    for i in error_ls:
+        print(i)
 
-for i in error_ls:
-    print(i)
 
+if __name__ == "__main__":
+    main()
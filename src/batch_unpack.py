@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+
+from config import IMAGE_CODEC, UNPACK_JOBS, UNPACK_TIMEOUT
+from encoder import CODEC_EXT, format_stats, merge_stats
+from pipeline import export_avg_bundle, unpack_bundle
+
+
+def _work(conn: Connection):
+    """工作进程：逐个接收 (处理函数, 资源, 输出目录)，返回结果或错误信息"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func, bundle, output_path = task
+        try:
+            conn.send((True, func(bundle, output_path)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self):
+        self.conn, child = multiprocessing.Pipe()
+        # 非守护进程，解包时可以再使用进程池（如贴图的 process 解码方式）；
+        # 主进程退出后管道关闭，工作进程随之结束
+        self.process = multiprocessing.Process(target=_work, args=(child,))
+        self.process.start()
+        child.close()
+        self.bundle: Path | None = None
+        self.started = 0.0
+
+    def submit(self, func: Callable, bundle: Path, output_path: str):
+        self.bundle = bundle
+        self.started = time.perf_counter()
+        self.conn.send((func, str(bundle), output_path))
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        with contextlib.suppress(BrokenPipeError, OSError):
+            self.conn.send(None)
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class BatchUnpacker:
+    """用进程池批量解包资源文件
+
+    每个工作进程一次只处理一个资源，超时或崩溃的进程会被结束并替换，
+    不影响其余资源。结果按完成顺序返回::
+
+        unpacker = BatchUnpacker("out/", jobs=8)
+        for result in unpacker.run(Path("download").rglob("*.zip")):
+            print(result["bundle"], result["ok"])
+
+    Args:
+        output_path (str, optional): 输出目录. Defaults to "out/".
+        jobs (int | None, optional): 工作进程数，为空时等于 CPU 核数.
+        timeout (float | None, optional): 单个资源的超时（秒），为空时不限.
+        func (Callable, optional): 在工作进程中调用的处理函数
+            ``func(资源路径, 输出目录)``，返回含 ``outputs`` 的 dict，需可被 pickle.
+            默认解包并生成立绘差分.
+    """
+
+    def __init__(
+        self,
+        output_path: str = "out/",
+        jobs: int | None = UNPACK_JOBS,
+        timeout: float | None = UNPACK_TIMEOUT,
+        func: Callable[[str, str], dict] = export_avg_bundle,
+    ):
+        self.output_path = str(output_path)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.func = func
+
+    def _result(self, worker: _Worker, ok: bool, value) -> dict:
+        assert worker.bundle
+        result = {
+            "bundle": worker.bundle,
+            "ok": ok,
+            "seconds": round(time.perf_counter() - worker.started, 3),
+        }
+        if ok:
+            result.update(value)
+        else:
+            result["error"] = value
+        worker.bundle = None
+        return result
+
+    def run(self, bundles: Iterable[Path]) -> Iterator[dict]:
+        """处理所有资源
+
+        Yields:
+            dict: 每个资源的结果，``ok`` 为真时含处理函数返回的
+            ``outputs``（生成的文件）和 ``encode``（图片编码统计），否则含 ``error``
+        """
+        Path(self.output_path).mkdir(parents=True, exist_ok=True)
+        queue = deque(Path(b) for b in bundles)
+        workers = [_Worker() for _ in range(min(self.jobs, len(queue)))]
+        try:
+            while True:
+                for worker in workers:
+                    if worker.bundle is None and queue:
+                        worker.submit(self.func, queue.popleft(), self.output_path)
+                busy = [w for w in workers if w.bundle is not None]
+                if not busy:
+                    return
+
+                wait_time = None
+                if self.timeout is not None:
+                    now = time.perf_counter()
+                    deadline = min(w.started for w in busy) + self.timeout
+                    wait_time = max(0, deadline - now)
+                ready = wait([w.conn for w in busy], wait_time)
+
+                for i, worker in enumerate(workers):
+                    if worker.bundle is None:
+                        continue
+                    if worker.conn in ready:
+                        try:
+                            ok, value = worker.conn.recv()
+                        except EOFError:
+                            # 工作进程崩溃（如解码库段错误）
+                            worker.process.join(1)
+                            code = worker.process.exitcode
+                            error = f"工作进程异常退出 ({code})"
+                            yield self._result(worker, False, error)
+                            worker.kill()
+                            workers[i] = _Worker()
+                            continue
+                        yield self._result(worker, ok, value)
+                    elif (
+                        self.timeout is not None
+                        and time.perf_counter() - worker.started >= self.timeout
+                    ):
+                        error = f"超过 {self.timeout} 秒未完成"
+                        yield self._result(worker, False, error)
+                        worker.kill()
+                        workers[i] = _Worker()
+        finally:
+            for worker in workers:
+                if worker.bundle is None:
+                    worker.close()
+                else:
+                    worker.kill()
+
+
+def collect_bundles(paths: Iterable[Path]) -> list[Path]:
+    """展开参数中的目录为其中的所有 ``.zip``"""
+    bundles = []
+    for path in paths:
+        if path.is_dir():
+            bundles.extend(sorted(path.rglob("*.zip")))
+        else:
+            bundles.append(path)
+    return bundles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程批量解包资源文件")
+    parser.add_argument(
+        "paths", nargs="+", type=Path, help="资源文件或包含资源文件的目录"
+    )
+    parser.add_argument("-o", "--output", default="out/", help="输出目录")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=UNPACK_JOBS, help="工作进程数"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=UNPACK_TIMEOUT, help="单个资源的超时（秒）"
+    )
+    parser.add_argument(
+        "--unpack-only", action="store_true", help="只解包，不生成立绘差分"
+    )
+    parser.add_argument(
+        "--type", action="append", help="只处理该类型的对象，如 Texture2D，可重复"
+    )
+    parser.add_argument(
+        "--name", action="append", help="只处理名称匹配的对象（通配符），可重复"
+    )
+    parser.add_argument(
+        "--codec",
+        choices=list(CODEC_EXT),
+        default=IMAGE_CODEC,
+        help="解包图片的编码格式",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="不使用解包缓存")
+    parser.add_argument(
+        "--in-memory", action="store_true", help="生成差分时不把解包的图片写入文件"
+    )
+    parser.add_argument("--json", action="store_true", help="以 JSON 逐行输出结果")
+    args = parser.parse_args()
+
+    if args.unpack_only and args.in_memory:
+        parser.error("--in-memory 只能用于生成差分")
+
+    bundles = collect_bundles(args.paths)
+    options = {
+        "types": args.type,
+        "names": args.name,
+        "codec": args.codec,
+        "use_cache": not args.no_cache,
+    }
+    if args.unpack_only:
+        func = functools.partial(unpack_bundle, **options)
+    else:
+        func = functools.partial(export_avg_bundle, **options, in_memory=args.in_memory)
+    unpacker = BatchUnpacker(
+        args.output, jobs=args.jobs, timeout=args.timeout, func=func
+    )
+
+    start = time.perf_counter()
+    errors = []
+    encode_stats: dict = {}
+    cached = 0
+    for n, result in enumerate(unpacker.run(bundles), 1):
+        prefix = f"[{n}/{len(bundles)}] {result['bundle'].name}"
+        if args.json:
+            record = {**result, "bundle": str(result["bundle"])}
+            print(json.dumps(record, ensure_ascii=False))
+        elif result["ok"]:
+            print(f"{prefix} 完成，{result['seconds']} 秒")
+        else:
+            print(f"{prefix} 失败：{result['error']}")
+        if not result["ok"]:
+            errors.append(result["bundle"].name)
+        else:
+            merge_stats(encode_stats, result.get("encode", {}))
+            cached += bool(result.get("cached"))
+
+    if not args.json:
+        print(
+            f"共 {len(bundles)} 个，失败 {len(errors)} 个，命中缓存 {cached} 个，"
+            f"耗时 {time.perf_counter() - start:.1f} 秒"
+        )
+        for line in format_stats(encode_stats):
+            print(line)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
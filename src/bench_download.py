@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+
+from config import DOWNLOAD_MAX_CONNECTIONS, DOWNLOAD_MAX_PER_HOST
+from download_res import bundle_url
+from downloader import ArkDownloader, DownloadError
+from mock_cdn import MockCDNProcess
+
+# 场景名 -> MockCDN 参数
+SCENARIOS = {
+    "baseline": {},
+    "latency": {"latency": 0.05},
+    "throttled": {"bandwidth": 1024 * 1024},
+    "flaky": {"error_rate": 0.05},
+    "tail": {"latency": 0.02, "tail_rate": 0.05, "tail_latency": 2.0},
+}
+
+
+async def bench_scenario(
+    name: str,
+    cdn_kwargs: dict,
+    files: int,
+    file_size: int,
+    connections: int,
+    per_host: int,
+    hedge_percentile: float | None = None,
+) -> dict:
+    """在模拟服务器上下载全部资源一次，返回吞吐量、内存峰值和连接数"""
+    with MockCDNProcess(
+        files=files, file_size=file_size, **cdn_kwargs
+    ) as cdn, tempfile.TemporaryDirectory() as tmp:
+        async with ArkDownloader(
+            max_connections=connections,
+            max_per_host=per_host,
+            hedge_percentile=hedge_percentile,
+        ) as downloader:
+            base = cdn.assets_url.format(cdn.version)
+            resp = await downloader.get(f"{base}/hot_update_list.json")
+            ab_infos = resp.json()["abInfos"]
+            before = (await asyncio.to_thread(httpx.get, cdn.stats_url)).json()
+            downloader.reset_stats()
+
+            async def fetch_one(info: dict) -> bool:
+                url = bundle_url(cdn.assets_url, cdn.version, info["name"])
+                try:
+                    await downloader.fetch(
+                        url,
+                        Path(tmp) / url.rsplit("/", 1)[1],
+                        info["md5"],
+                        info["totalSize"],
+                    )
+                    return True
+                except (DownloadError, httpx.HTTPError):
+                    return False
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            results = await asyncio.gather(*(fetch_one(i) for i in ab_infos))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        after = (await asyncio.to_thread(httpx.get, cdn.stats_url)).json()
+
+    done_bytes = sum(i["totalSize"] for i, ok in zip(ab_infos, results, strict=True) if ok)
+    return {
+        "scenario": name,
+        "files": len(ab_infos),
+        "failed": results.count(False),
+        "bytes": done_bytes,
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(results.count(True) / elapsed, 1),
+        "mb_per_s": round(done_bytes / elapsed / 2**20, 2),
+        "peak_mem_mb": round(peak / 2**20, 2),
+        # 减去查询统计本身的连接
+        "connections": after["connections"] - before["connections"] - 1,
+        "requests": after["requests"] - before["requests"] - 1,
+        "server_errors": after["errors"] - before["errors"],
+        "retries": downloader.stats["retries"],
+        "hedged": downloader.stats["hedged"],
+        "hedge_wins": downloader.stats["hedge_wins"],
+    }
+
+
+def print_table(results: list[dict]):
+    columns = [
+        ("scenario", "场景"),
+        ("files", "文件"),
+        ("failed", "失败"),
+        ("seconds", "耗时(s)"),
+        ("files_per_s", "文件/s"),
+        ("mb_per_s", "MB/s"),
+        ("peak_mem_mb", "内存峰值(MB)"),
+        ("connections", "连接数"),
+        ("requests", "请求数"),
+        ("retries", "重试"),
+        ("hedged", "对冲"),
+    ]
+    print("\t".join(title for _, title in columns))
+    for r in results:
+        print("\t".join(str(r[key]) for key, _ in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="在本地模拟服务器上测试下载器性能（无需联网）"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="要运行的场景，可重复，默认运行全部",
+    )
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--file-size", type=int, default=256 * 1024)
+    parser.add_argument("--connections", type=int, default=DOWNLOAD_MAX_CONNECTIONS)
+    parser.add_argument("--per-host", type=int, default=DOWNLOAD_MAX_PER_HOST)
+    parser.add_argument(
+        "--hedge", type=float, default=None, help="对冲请求的延迟分位数，如 0.9"
+    )
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        results.append(
+            asyncio.run(
+                bench_scenario(
+                    name,
+                    SCENARIOS[name],
+                    args.files,
+                    args.file_size,
+                    args.connections,
+                    args.per_host,
+                    args.hedge,
+                )
+            )
+        )
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+    # 出现失败时返回非零，便于在 CI 中使用（注入的错误应由重试消化）
+    if any(r["failed"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import (
+    BUNDLE_CACHE_BUDGET,
+    BUNDLE_CACHE_PATH,
+    BUNDLE_CACHE_POLICY,
+    DEFAULT_SERVER,
+    ak_version_api,
+)
+from download_res import ResourceSyncer, bundle_url, get_res_version
+from downloader import ArkDownloader, full_md5
+from manifest_db import ManifestDB, manifest_key
+from util import extract_package
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    md5 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+# 淘汰顺序：lru 先淘汰最久未访问的，lfu 先淘汰访问次数最少的
+EVICTION_ORDER = {
+    "lru": "last_access",
+    "lfu": "hits, last_access",
+}
+
+
+class BundleCache:
+    """按需下载的资源缓存，总大小不超过磁盘预算
+
+    按资源名和版本号取得资源文件，本地没有时从 CDN 下载。
+    缓存以 md5 为键，不同版本中内容相同的资源共用一份（md5 不完整的 anon 资源除外）；
+    总大小超过 ``budget`` 时按 ``policy`` 淘汰旧文件::
+
+        async with BundleCache(budget=512 * 1024**2) as cache:
+            path = await cache.open_bundle("avg/characters/avg_npc_001.ab", version)
+            print(cache.stats)
+
+    返回的路径在之后的下载触发淘汰前有效（已打开的文件不受删除影响）。
+
+    Args:
+        root (Path, optional): 缓存目录.
+        budget (int, optional): 磁盘预算（字节）.
+        policy (str, optional): 淘汰策略 ``lru`` 或 ``lfu``.
+        server (str, optional): 服务器，见 ``config.ak_version_api``.
+        downloader (ArkDownloader | None, optional): 共用的下载器，为空时自动创建.
+        manifest_db (ManifestDB | None, optional): 版本文件列表数据库.
+        assets_url (str | None, optional): 资源文件地址模板，默认取服务器对应的地址.
+    """
+
+    def __init__(
+        self,
+        root: Path = BUNDLE_CACHE_PATH,
+        budget: int = BUNDLE_CACHE_BUDGET,
+        policy: str = BUNDLE_CACHE_POLICY,
+        server: str = DEFAULT_SERVER,
+        downloader: ArkDownloader | None = None,
+        manifest_db: ManifestDB | None = None,
+        assets_url: str | None = None,
+    ):
+        if policy not in EVICTION_ORDER:
+            raise ValueError(f"未知的淘汰策略: {policy}")
+
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.budget = budget
+        self.policy = policy
+        self.server = server
+        self.conn = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+        self._owns_downloader = downloader is None
+        self.downloader = downloader or ArkDownloader()
+        self._owns_manifest_db = manifest_db is None
+        # 借用同步器读取（必要时下载）版本文件列表
+        self._syncer = ResourceSyncer(
+            downloader=self.downloader,
+            manifest_db=manifest_db,
+            server=server,
+            assets_url=assets_url,
+        )
+        self._loaded_versions: set[str] = set()
+        # 同一版本的文件列表只导入一次，导入过程中其他线程不读取
+        self._load_lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Event] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_evicted": 0}
+
+    async def __aenter__(self):
+        self.downloader.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._owns_downloader:
+            await self.downloader.aclose()
+        # 未传入数据库时由同步器按需打开，随缓存一起关闭
+        if self._owns_manifest_db and self._syncer._manifest_db is not None:
+            self._syncer._manifest_db.close()
+        self.conn.close()
+
+    def object_path(self, md5: str) -> Path:
+        md5 = md5.lower()
+        return self.root / md5[:2] / f"{md5}.zip"
+
+    @property
+    def size(self) -> int:
+        row = self.conn.execute("SELECT IFNULL(SUM(size), 0) FROM entries").fetchone()
+        return row[0]
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def entry(self, name: str, version: str) -> dict:
+        """资源在该版本中的 abInfos 条目
+
+        第一次读取某版本时会下载并导入文件列表，
+        在事件循环中应通过 ``asyncio.to_thread`` 调用。
+
+        Raises:
+            KeyError: 该版本中没有此资源
+        """
+        with self._load_lock:
+            if version not in self._loaded_versions:
+                self._syncer.load_res_list(version)
+                self._loaded_versions.add(version)
+
+        info = self._syncer.manifest_db.bundle(manifest_key(version, self.server), name)
+        if info is None:
+            raise KeyError(f"{version} 中没有 {name}")
+        return info
+
+    async def open_bundle(self, name: str, version: str) -> Path:
+        """取得资源文件（与下载得到的 ``.zip`` 相同）的本地路径，未缓存时下载
+
+        Raises:
+            KeyError: 该版本中没有此资源
+            DownloadError: 下载失败
+        """
+        info = await asyncio.to_thread(self.entry, name, version)
+        # md5 不完整时（anon 资源）以资源所在的位置为键，不与其他资源共用
+        md5 = full_md5(info["md5"]) or hashlib.md5(
+            f"{self.server}/{version}/{name}".encode()
+        ).hexdigest()
+        path = self.object_path(md5)
+
+        while True:
+            if path.exists() and self._touch(md5):
+                self.stats["hits"] += 1
+                return path
+            inflight = self._inflight.get(md5)
+            if inflight is None:
+                break
+            # 同一资源正在下载，等待后按命中处理
+            await inflight.wait()
+
+        self.stats["misses"] += 1
+        done = self._inflight[md5] = asyncio.Event()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            url = bundle_url(self._syncer.assets_url, version, name)
+            await self.downloader.fetch(url, path, info["md5"], info["totalSize"])
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, 1)",
+                    (md5, path.stat().st_size, time.time()),
+                )
+            self.evict(keep=md5)
+        finally:
+            del self._inflight[md5]
+            done.set()
+        return path
+
+    async def read_bundle(self, name: str, version: str) -> bytes:
+        """取得资源内容（zip 中的 AssetBundle），可直接传给 ``ArkMediaUnPacker``"""
+        path = await self.open_bundle(name, version)
+        return await asyncio.to_thread(extract_package, path)
+
+    def _touch(self, md5: str) -> bool:
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE md5 = ?",
+                (time.time(), md5),
+            )
+        return cur.rowcount > 0
+
+    def evict(self, keep: str | None = None, budget: int | None = None) -> int:
+        """淘汰文件直到总大小不超过预算
+
+        Args:
+            keep (str | None, optional): 不淘汰的 md5（刚下载的文件）.
+            budget (int | None, optional): 本次使用的预算，默认为 ``self.budget``.
+
+        Returns:
+            int: 释放的字节数
+        """
+        budget = self.budget if budget is None else budget
+        total = self.size
+        if total <= budget:
+            return 0
+
+        freed = 0
+        rows = self.conn.execute(
+            f"SELECT md5, size FROM entries ORDER BY {EVICTION_ORDER[self.policy]}"
+        ).fetchall()
+        for md5, size in rows:
+            if total - freed <= budget:
+                break
+            if md5 == keep or md5 in self._inflight:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                self.object_path(md5).unlink()
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE md5 = ?", (md5,))
+            freed += size
+            self.stats["evictions"] += 1
+            self.stats["bytes_evicted"] += size
+        return freed
+
+    def clear(self) -> int:
+        return self.evict(budget=0)
+
+
+def open_bundle(name: str, version: str, server: str = DEFAULT_SERVER) -> Path:
+    """同步版本的 ``BundleCache.open_bundle``，使用默认的缓存目录和预算"""
+
+    async def run():
+        async with BundleCache(server=server) as cache:
+            return await cache.open_bundle(name, version)
+
+    return asyncio.run(run())
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="按需下载并缓存资源")
+    parser.add_argument(
+        "names", nargs="*", help="资源名，如 avg/characters/avg_npc_001.ab"
+    )
+    parser.add_argument("--version", help="资源版本号，默认为最新版本")
+    parser.add_argument(
+        "--server", choices=list(ak_version_api), default=DEFAULT_SERVER
+    )
+    parser.add_argument("--budget", type=int, default=BUNDLE_CACHE_BUDGET, help="字节")
+    parser.add_argument(
+        "--policy", choices=list(EVICTION_ORDER), default=BUNDLE_CACHE_POLICY
+    )
+    args = parser.parse_args()
+
+    async with BundleCache(
+        budget=args.budget, policy=args.policy, server=args.server
+    ) as cache:
+        if args.names:
+            version = args.version or get_res_version(args.server)
+            for name in args.names:
+                print(await cache.open_bundle(name, version))
+        else:
+            # 只调整到新的预算
+            cache.evict()
+        print(
+            json.dumps(
+                {**cache.stats, "size": cache.size, "entries": len(cache)},
+                ensure_ascii=False,
+            )
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
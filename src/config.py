@@ -2,6 +2,8 @@ from pathlib import Path
 
 DATAPATH = Path("data/game_data")
 DOWNLOADPATH = Path("download")
+# 历代 hot_update_list 的索引数据库
+MANIFEST_DB_PATH = DATAPATH / "manifest.db"
 
 ak_version_api = {
     "officialAndroid": "https://ak-conf.hypergryph.com/config/prod/official/Android/version",
@@ -9,14 +11,110 @@ ak_version_api = {
     "bilibili": "https://ak-conf.hypergryph.com/config/prod/b/Android/version",
 }
 
+# 各服务器资源文件所在目录，{} 为资源版本号
+ak_assets_url = {
+    "officialAndroid": "https://ak.hycdn.cn/assetbundle/official/Android/assets/{}",
+    "officialIOS": "https://ak.hycdn.cn/assetbundle/official/IOS/assets/{}",
+    "bilibili": "https://ak.hycdn.cn/assetbundle/bilibili/Android/assets/{}",
+}
+
 ak_hot_update_api = {
-    "officialAndroid": "https://ak.hycdn.cn/assetbundle/official/Android/assets/{}/hot_update_list.json",
-    "officialIOS": "https://ak.hycdn.cn/assetbundle/official/IOS/assets/{}/hot_update_list.json",
+    server: f"{url}/hot_update_list.json" for server, url in ak_assets_url.items()
 }
 
-ak_hot_update_list = (
-    "https://ak.hycdn.cn/assetbundle/official/Android/assets/{}/hot_update_list.json"
-)
+# 默认服务器；其他服务器的版本号、文件列表和下载文件放在以服务器名命名的子目录中
+DEFAULT_SERVER = "officialAndroid"
 
 github_raw_url = "https://raw.githubusercontent.com"
 
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/107.0.0.0 Safari/537.36 Edg/107.0.1418.26"
+}
+
+# 下载器设置：全局并发数、单个主机并发数、是否启用 HTTP/2（需要安装 h2）
+DOWNLOAD_MAX_CONNECTIONS = 16
+DOWNLOAD_MAX_PER_HOST = 8
+DOWNLOAD_HTTP2 = False
+DOWNLOAD_TIMEOUT = 60
+# 失败重试：最多重试次数、可重试的状态码，以及指数退避的初始和最大间隔（秒，带随机抖动）
+DOWNLOAD_RETRIES = 4
+DOWNLOAD_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+DOWNLOAD_BACKOFF = 0.5
+DOWNLOAD_BACKOFF_MAX = 30
+# 对冲请求：等待响应头超过历史首字节延迟的该分位数（如 0.95）时再发一个相同请求，
+# 取先返回者；None 为关闭。样本数不足时不对冲，等待时间不低于 MIN_DELAY 秒
+DOWNLOAD_HEDGE_PERCENTILE = None
+DOWNLOAD_HEDGE_MIN_SAMPLES = 20
+DOWNLOAD_HEDGE_MIN_DELAY = 0.2
+# 读取本地文件计算校验值时的块大小
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# 断点续传日志，以及每接收多少字节更新一次日志
+DOWNLOAD_JOURNAL = DOWNLOADPATH / "journal.json"
+DOWNLOAD_JOURNAL_FLUSH_BYTES = 8 * 1024 * 1024
+# 以 md5 为键的资源存储，各版本目录中的文件是指向这里的硬链接
+BUNDLE_STORE_PATH = DOWNLOADPATH / "objects"
+# 按需下载的资源缓存：磁盘预算（字节）和淘汰策略（lru 最近最少使用 / lfu 最少使用次数）
+BUNDLE_CACHE_PATH = DOWNLOADPATH / "cache"
+BUNDLE_CACHE_BUDGET = 2 * 1024**3
+BUNDLE_CACHE_POLICY = "lru"
+# 完整性检查的并行线程数（None 为 CPU 核数），以及不使用 mmap 时的读取块大小
+AUDIT_WORKERS = None
+AUDIT_READ_SIZE = 8 * 1024 * 1024
+# 下载优先级，数值越小越先下载；按最长匹配的类别前缀取值，"" 为默认值
+DOWNLOAD_PRIORITIES = {
+    "": 5,
+    "avg/characters": 0,
+    "avg": 1,
+    "gamedata": 1,
+    "chararts": 2,
+    "skinpack": 2,
+    "packs": 3,
+    "anon": 8,
+    "scenes": 9,
+}
+# 同一优先级内的顺序：smallest 小文件优先，largest 大文件优先
+DOWNLOAD_ORDER = "smallest"
+# 全局带宽上限（字节/秒），None 为不限速
+DOWNLOAD_BANDWIDTH_LIMIT = None
+# 单次请求的固定开销（握手、首字节延迟）折算成的字节数，用于比较按文件和按包下载的成本
+PACK_REQUEST_OVERHEAD = 512 * 1024
+
+# 历次下载的实测吞吐量，用于预估下载时间
+DOWNLOAD_HISTORY_PATH = DATAPATH / "download_history.json"
+DOWNLOAD_HISTORY_SIZE = 20
+
+# 元数据缓存：版本信息在 TTL 内直接使用缓存，过期后发送条件请求
+HTTP_CACHE_PATH = DATAPATH / "http_cache"
+VERSION_CACHE_TTL = 300
+MANIFEST_CACHE_TTL = 24 * 3600
+
+# 下载 -> 解包 -> 导出流水线：工作进程数（None 为 CPU 核数）和等待处理的资源数上限
+EXPORT_WORKERS = None
+EXPORT_QUEUE_SIZE = 32
+
+# 批量解包：工作进程数（None 为 CPU 核数）和单个资源的超时（秒，None 为不限）
+UNPACK_JOBS = None
+UNPACK_TIMEOUT = 300
+
+# 解包图片的编码：格式（png、webp 为无损 WebP、raw 为未压缩的 RGBA）、
+# PNG 压缩级别（0~9）、WebP 压缩力度（0~6）、编码线程数和等待编码的图片数上限
+IMAGE_CODEC = "png"
+IMAGE_PNG_COMPRESS_LEVEL = 6
+IMAGE_WEBP_METHOD = 4
+IMAGE_ENCODE_WORKERS = 4
+IMAGE_ENCODE_QUEUE = 8
+
+# 单个资源内的贴图解码：方式（thread 依赖解码库释放 GIL，process 使用进程池）、并发数，
+# 以及正在解码和等待保存的贴图占用内存的上限（字节）
+TEXTURE_DECODE_MODE = "thread"
+TEXTURE_DECODE_WORKERS = 4
+TEXTURE_DECODE_MAX_BYTES = 512 * 1024 * 1024
+
+# 解包结果缓存：资源内容（md5）、解包程序版本和选项都相同时直接复用上次的输出，
+# 总大小超过预算或超过最长保留时间（秒）未使用的结果会被淘汰
+UNPACK_CACHE_PATH = Path("cache") / "unpack"
+UNPACK_CACHE_BUDGET = 4 * 1024**3
+UNPACK_CACHE_MAX_AGE = 30 * 24 * 3600
@@ -0,0 +1,187 @@
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from UnityPy.classes import Texture2D
+from UnityPy.export.Texture2DConverter import parse_image_data
+
+from config import TEXTURE_DECODE_MAX_BYTES, TEXTURE_DECODE_MODE, TEXTURE_DECODE_WORKERS
+from encoder import ImageEncoder
+
+DECODE_MODES = ("thread", "process")
+
+
+class ByteBudget:
+    """限制同时占用的字节数
+
+    已占用的字节数加上申请的字节数超过上限时等待；没有其他占用时总是允许，
+    因此单个超过上限的贴图也能处理。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int):
+        with self._cond:
+            self._cond.wait_for(lambda: self.used == 0 or self.used + n <= self.limit)
+            self.used += n
+            self.peak = max(self.peak, self.used)
+
+    def release(self, n: int):
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+
+def texture_args(texture: Texture2D) -> tuple:
+    """``parse_image_data`` 的参数，外部 .resS 中的贴图数据在此读取"""
+    reader = texture.object_reader
+    return (
+        texture.get_image_data(),
+        texture.m_Width,
+        texture.m_Height,
+        texture.m_TextureFormat,
+        reader.version,
+        reader.platform,
+        getattr(texture, "m_PlatformBlob", None),
+    )
+
+
+def merge_alpha(rgb: Image.Image, alpha: Image.Image) -> Image.Image:
+    """把单独存储的遮罩贴图（``xxx[alpha]``）合并为 RGBA 图片的透明通道
+
+    遮罩按灰度取值，尺寸与原图不同时先缩放到原图大小。
+    """
+    if alpha.size != rgb.size:
+        alpha = alpha.resize(rgb.size, Image.BILINEAR)
+    pixels = np.array(rgb.convert("RGBA"))
+    pixels[..., 3] = np.asarray(alpha.convert("L"))
+    return Image.fromarray(pixels)
+
+
+class TextureDecoder:
+    """并行解码同一资源中的多个贴图，解码后交给 ``ImageEncoder`` 保存
+
+    读取对象和贴图数据共用资源文件的读取位置，只能在调用 ``submit`` 的线程中进行；
+    解码和保存在后台完成。``thread`` 方式依赖解码库（texture2ddecoder、etcpak 等）
+    解码时释放 GIL；``process`` 方式把压缩数据发送到进程池解码，
+    适用于不释放 GIL 的格式。
+
+    正在解码和等待保存的贴图（压缩数据加 RGBA 像素）不超过 ``max_bytes``，
+    达到上限时 ``submit`` 会阻塞。
+
+    Args:
+        mode (str, optional): 解码方式，``thread`` 或 ``process``.
+        workers (int, optional): 同时解码的贴图数.
+        max_bytes (int, optional): 占用内存的上限（字节）.
+    """
+
+    def __init__(
+        self,
+        mode: str = TEXTURE_DECODE_MODE,
+        workers: int = TEXTURE_DECODE_WORKERS,
+        max_bytes: int = TEXTURE_DECODE_MAX_BYTES,
+    ):
+        if mode not in DECODE_MODES:
+            raise ValueError(f"未知的解码方式: {mode}")
+
+        self.mode = mode
+        self._threads = ThreadPoolExecutor(workers, thread_name_prefix="decode")
+        self._procs = ProcessPoolExecutor(workers) if mode == "process" else None
+        self._budget = ByteBudget(max_bytes)
+        self._lock = threading.Lock()
+        self.stats = {
+            "textures": 0,
+            "pixels": 0,
+            "seconds": 0.0,
+            "merged": 0,
+            "peak_bytes": 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _decode(self, args: tuple) -> Image.Image:
+        if self._procs:
+            return self._procs.submit(parse_image_data, *args).result()
+        return parse_image_data(*args)
+
+    def _run(
+        self,
+        args: tuple,
+        alpha_args: tuple | None,
+        size: int,
+        encoder: ImageEncoder | None,
+        out_file: Path | None,
+    ) -> Path | Image.Image:
+        try:
+            start = time.perf_counter()
+            image = self._decode(args)
+            pixels = image.width * image.height
+            if alpha_args:
+                alpha = self._decode(alpha_args)
+                pixels += alpha.width * alpha.height
+                image = merge_alpha(image, alpha)
+                del alpha
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.stats["textures"] += 2 if alpha_args else 1
+                self.stats["pixels"] += pixels
+                self.stats["seconds"] += seconds
+                self.stats["merged"] += bool(alpha_args)
+            if encoder is None:
+                return image
+            # 保存完成后才释放内存额度
+            return encoder.submit(image, out_file).result()
+        finally:
+            self._budget.release(size)
+
+    def submit(
+        self,
+        texture: Texture2D,
+        encoder: ImageEncoder | None = None,
+        out_file: Path | None = None,
+        alpha: Texture2D | None = None,
+    ) -> Future:
+        """提交一个贴图
+
+        传入 ``encoder`` 时 Future 在保存到 ``out_file`` 后给出输出路径；
+        否则给出解码得到的图片，此时内存额度在解码完成后即释放，图片由调用方持有。
+        传入 ``alpha`` 时一并解码该遮罩贴图，合并为原图的透明通道
+        （见 ``merge_alpha``）。
+        """
+        args = texture_args(texture)
+        size = len(args[0]) + texture.m_Width * texture.m_Height * 4
+        alpha_args = None
+        if alpha is not None:
+            alpha_args = texture_args(alpha)
+            size += len(alpha_args[0]) + alpha.m_Width * alpha.m_Height * 4
+        self._budget.acquire(size)
+        try:
+            return self._threads.submit(
+                self._run,
+                args,
+                alpha_args,
+                size,
+                encoder,
+                Path(out_file) if out_file else None,
+            )
+        except BaseException:
+            self._budget.release(size)
+            raise
+
+    def close(self):
+        """等待所有贴图解码完成"""
+        self._threads.shutdown(wait=True)
+        if self._procs:
+            self._procs.shutdown(wait=True)
+        self.stats["peak_bytes"] = self._budget.peak
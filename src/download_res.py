@@ -1,215 +1,785 @@
+import argparse
 import asyncio
+import functools
 import json
+import threading
+import zipfile
+from collections.abc import Awaitable, Callable
+from pathlib import Path
 
-import aiofiles
 import httpx
 from ruamel.yaml import YAML
 
-from config import DATAPATH, DOWNLOADPATH, ak_hot_update_list, ak_version_api
-from util import get_data
+from config import (
+    DATAPATH,
+    DEFAULT_SERVER,
+    DOWNLOAD_BANDWIDTH_LIMIT,
+    DOWNLOAD_ORDER,
+    DOWNLOADPATH,
+    MANIFEST_CACHE_TTL,
+    VERSION_CACHE_TTL,
+    ak_assets_url,
+    ak_version_api,
+)
+from downloader import ArkDownloader, DownloadError, ProgressHook
+from http_cache import MetadataCache
+from journal import DownloadJournal
+from manifest import ManifestIndex, diff_manifests
+from manifest_db import ManifestDB, manifest_key
+from pack_planner import extract_pack_members, plan_fetch
+from scheduler import DownloadScheduler, Listener, cli_progress
+from store import BundleStore
+from throughput import ThroughputHistory
+
+# 资源下载完成后的回调，参数为文件路径和资源类别
+BundleHook = Callable[[Path, str], Awaitable[None]]
 
 yaml = YAML(pure=True)
-
-
-def diff(old_set: list[dict[str, str]], new_set: list[dict[str, str]]):
-    # check new
-    set1 = [i["name"] for i in old_set]
-    set2 = [i["name"] for i in new_set]
-    check_new_set = [i for i in set2 if i not in set1]
-
-    # check update
-    set1 = [json.dumps(i) for i in old_set]
-    set2 = [json.dumps(i) for i in new_set]
-    check_update_set = [json.loads(i)["name"] for i in set2 if i not in set1]
-    check_update_set = [i for i in check_update_set if i not in check_new_set]
-
-    return {"new": check_new_set, "update": check_update_set}
-
-
-async def download_ark_res(resVersion: str, res_type: str, resName: str, dl_path: str):
-    res_url = f"https://ak.hycdn.cn/assetbundle/official/Android/assets/{resVersion}/{res_type.replace('/','_')}_{resName}.dat"
-
-    out_path = DOWNLOADPATH / resVersion / dl_path
+metadata_cache = MetadataCache()
+
+# 剧情背景和 CG, 干员立绘, 干员时装, 立绘差分, 活动 UI 资源
+res_type_list = [
+    "avg/imgs",
+    "avg/bg",
+    "avg/items",
+    "chararts",
+    "skinpack",
+    "avg/characters",
+    # "ui/gacha",
+    "ui/activity",
+    "activity",
+    # "gamedata/story"
+]
+
+excel_res_list = [
+    "character_table",
+    "battle_equip_table",
+    "uniequip_table",
+    "gacha_table",
+    "item_table",
+    "activity_table",
+]
+
+
+def res_name(name: str) -> str:
+    """资源名去掉目录和扩展名
+
+    如 ``avg/characters/avg_npc_001.ab`` -> ``avg_npc_001``
+    """
+    return name.split("/")[-1][:-3]
+
+
+def bundle_url(assets_url: str, version: str, name: str) -> str:
+    """资源的下载地址
+
+    如 ``avg/characters/avg_npc_001.ab`` ->
+    ``<assets_url>/avg_characters_avg_npc_001.dat``，
+    扩展名长度不限（anon 资源的扩展名不是 ``.ab``）。
+    """
+    stem = Path(name).with_suffix("").as_posix().replace("/", "_")
+    return f"{assets_url.format(version)}/{stem}.dat"
+
+
+def server_path(root: Path, server: str) -> Path:
+    """默认服务器的文件保持原有位置，其他服务器放在以服务器名命名的子目录中"""
+    return root if server == DEFAULT_SERVER else root / server
+
+
+async def download_ark_res(
+    downloader: ArkDownloader,
+    resVersion: str,
+    res_type: str,
+    resName: str,
+    dl_path: str,
+    md5: str | None = None,
+    size: int | None = None,
+    store: BundleStore | None = None,
+    on_progress: ProgressHook | None = None,
+    assets_url: str | None = None,
+    server: str = DEFAULT_SERVER,
+) -> bool:
+    res_url = bundle_url(
+        assets_url or ak_assets_url[server], resVersion, f"{res_type}/{resName}.ab"
+    )
+
+    out_path = server_path(DOWNLOADPATH, server) / resVersion / dl_path
 
     out_path.mkdir(parents=True, exist_ok=True)
 
     out_file = out_path / f"{resName}.zip"
     if out_file.exists():
         print(f"{dl_path}/{resName}.zip 已存在")
-        return
+        return True
 
-    resp = await get_data(res_url)
-    if resp.status_code == 200:
-        async with aiofiles.open(out_file, "wb") as wf:
-            await wf.write(resp.content)
-            print(f"{dl_path}/{resName}.zip 下载成功")
-    else:
-        print(f"下载{resName}时出错：", resp.status_code)
+    try:
+        if md5 and store:
+            fetched = await store.fetch(
+                downloader, res_url, md5, size, out_file, on_progress
+            )
+            if not fetched:
+                print(f"{dl_path}/{resName}.zip 已链接到本地存储")
+                return True
+        else:
+            await downloader.fetch(res_url, out_file, md5, size, on_progress)
+        print(f"{dl_path}/{resName}.zip 下载成功")
+        return True
+    except (DownloadError, httpx.HTTPError) as e:
+        print(f"下载{resName}时出错：", e)
         print(res_url)
+        return False
+
+
+async def download_ark_anon(
+    downloader: ArkDownloader,
+    resVersion: str,
+    resName: str,
+    md5: str | None = None,
+    size: int | None = None,
+    store: BundleStore | None = None,
+    on_progress: ProgressHook | None = None,
+    assets_url: str | None = None,
+    server: str = DEFAULT_SERVER,
+) -> bool:
+    res_url = bundle_url(
+        assets_url or ak_assets_url[server], resVersion, f"anon/{resName}.bin"
+    )
+
+    out_path = server_path(DOWNLOADPATH, server) / resVersion / "anon"
+    out_path.mkdir(parents=True, exist_ok=True)
+    out_file = out_path / f"{resName}.zip"
+    if out_file.exists():
+        print(f"anon/{resName}.zip 已存在")
+        return True
+
+    try:
+        if md5 and store:
+            fetched = await store.fetch(
+                downloader, res_url, md5, size, out_file, on_progress
+            )
+            if not fetched:
+                print(f"anon/{resName}.zip 已链接到本地存储")
+                return True
+        else:
+            await downloader.fetch(res_url, out_file, md5, size, on_progress)
+        print(f"anon/{resName}.zip 下载成功")
+        return True
+    except (DownloadError, httpx.HTTPError) as e:
+        print(f"下载{resName}时出错：", e)
+        print(res_url)
+        return False
 
 
 # 获取版本号
 
 
-def get_local_res_version():
-    with open(DATAPATH / "resVersion.yaml") as file:
+def get_local_res_version(server: str = DEFAULT_SERVER) -> str | None:
+    """读取本地版本号，从未同步过时返回 None"""
+    version_file = server_path(DATAPATH, server) / "resVersion.yaml"
+    if not version_file.exists():
+        print(f"{server} 尚无本地版本")
+        return None
+    with open(version_file) as file:
         old_res_version = yaml.load(file)["currentVersion"]
     print(f"本地版本号{old_res_version}")
     return old_res_version
 
 
-def get_res_version():
-    print("获取最新版本信息...")
-    res_version = httpx.get(ak_version_api["officialAndroid"]).json()["resVersion"]
-    print(f"最新版本号：{res_version}")
-    return res_version
-
-
-old_res_version = get_local_res_version()
-res_version = get_res_version()
-
-
-def check_res_list():
-    curr_ver_info = {}
-    curr_ver_file = DATAPATH / "hot_update_list" / f"{res_version}.json"
-    # 检查本地是否有缓存的版本文件列表
-    if curr_ver_file.exists():
-        with open(curr_ver_file) as file:
-            curr_ver_info = json.load(file)
-    else:
-        print("下载版本文件列表...")
-        # 获取文件列表
-        curr_ver_info = httpx.get(ak_hot_update_list.format(res_version)).json()
-        print("下载完成.")
-
-        with open(curr_ver_file, "w") as file:
-            json.dump(curr_ver_info, file)
-
-    return curr_ver_info["abInfos"]
-
-
-def parse_res_list(ab_infos: list, res_type_list):
-    res_data = {}
-
-    for item in ab_infos:
-        name = item["name"]
-        for path in res_type_list:
-            if name.startswith(f"{path}/"):
-                if not res_data.get(path):
-                    res_data[path] = []
-                res_data[path].append({"name": name, "hash": item["hash"]})
-    return res_data
-
-
-async def dl_excel():
-    excel_res_list = [
-        "character_table",
-        "battle_equip_table",
-        "uniequip_table",
-        "gacha_table",
-        "item_table",
-        "activity_table",
-    ]
-    dl_list = []
-    curr_res_list = check_res_list()
-    for item in curr_res_list:
-        name = item["name"]
-        for n in excel_res_list:
-            if name.startswith(f"gamedata/excel/{n}"):
-                dl_list.append(
-                    download_ark_res(
-                        res_version, "gamedata/excel", name.split("/")[-1][:-3], "excel"
-                    )
-                )
-    await asyncio.gather(*dl_list)
-
-
-async def download_ark_anon(resVersion: str, resName: str):
-    res_url = f"https://ak.hycdn.cn/assetbundle/official/Android/assets/{resVersion}/anon_{resName}.dat"
-
-    out_path = DOWNLOADPATH / resVersion / "anon"
-    out_path.mkdir(parents=True, exist_ok=True)
-    out_file = out_path / f"{resName}.zip"
-    if out_file.exists():
-        print(f"anon/{resName}.zip 已存在")
-        return
-
-    resp = await get_data(res_url)
-    if resp.status_code == 200:
-        async with aiofiles.open(out_file, "wb") as wf:
-            await wf.write(resp.content)
-            print(f"anon/{resName}.zip 下载成功")
-    else:
-        print(f"下载{resName}时出错：", resp.status_code)
-        print(res_url)
-
+def save_local_res_version(res_version: str, server: str = DEFAULT_SERVER):
+    version_file = server_path(DATAPATH, server) / "resVersion.yaml"
+    version_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(version_file, "w") as file:
+        yaml.dump({"currentVersion": res_version}, file)
 
-async def dl_anon():
-    dl_list = []
-    curr_res_list = check_res_list()
-    for item in curr_res_list:
-        name = item["name"]
-        if name.startswith("anon"):
 
-            dl_list.append(download_ark_anon(res_version,  name.split("/")[-1][:-4]))
-    await asyncio.gather(*dl_list)
+def get_res_version(server: str = DEFAULT_SERVER, force: bool = False):
+    """获取最新版本号，VERSION_CACHE_TTL 秒内重复调用直接使用缓存
 
+    Args:
+        server (str, optional): 服务器，见 ``config.ak_version_api``.
+        force (bool, optional): 忽略缓存有效期，向服务器确认. Defaults to False.
+    """
+    print("获取最新版本信息...")
+    res_version = metadata_cache.get_json(
+        ak_version_api[server], VERSION_CACHE_TTL, force=force
+    )["resVersion"]
+    print(f"{server} 最新版本号：{res_version}")
+    return res_version
 
-async def dl_res():
-    if old_res_version == res_version:
-        print("当前版本已是最新.")
-        return
 
-    old_res_ver_file = DATAPATH / "hot_update_list" / f"{old_res_version}.json"
-    if not old_res_ver_file.exists():
-        old_ver_info = httpx.get(ak_hot_update_list.format(old_res_version)).json()
-        with open(old_res_ver_file, "w") as file:
-            json.dump(old_ver_info, file)
-    with open(old_res_ver_file) as file:
-        old_ver_info = json.load(file)
-
-    curr_res_list = check_res_list()
-    old_res_list = old_ver_info["abInfos"]
-
-    # 剧情背景和 CG, 干员立绘, 干员时装, 立绘差分, 活动 UI 资源
-    res_type_list = [
-        "avg/imgs",
-        "avg/bg",
-        "avg/items",
-        "chararts",
-        "skinpack",
-        "avg/characters",
-        # "ui/gacha",
-        "ui/activity",
-        "activity",
-        # "gamedata/story"
-    ]
-
-    curr_res = parse_res_list(curr_res_list, res_type_list)
-    old_res = parse_res_list(old_res_list, res_type_list)
-
-    dl_list = []
-    # 所有有修改的文件列表
-    for res_type in res_type_list:
-        diff_data = diff(old_res[res_type], curr_res[res_type])
-
-        download_new_list = [i.split("/")[-1][:-3] for i in diff_data["new"]]
-        download_update_list = [i.split("/")[-1][:-3] for i in diff_data["update"]]
-
-        for resName in download_new_list:
-            dl_list.append(
-                download_ark_res(res_version, res_type, resName, "new/" + res_type)
+class ResourceSyncer:
+    """资源同步器
+
+    导入本模块不会产生任何网络请求或下载，所有操作都需要显式调用::
+
+        async with ResourceSyncer() as syncer:
+            syncer.check_version()
+            await syncer.sync_categories()
+            await syncer.sync_anon()
+
+    Args:
+        res_types (list[str], optional): 需要同步的资源类别. Defaults to res_type_list.
+        downloader (ArkDownloader | None, optional): 共用的下载器，为空时自动创建.
+        store (BundleStore | None, optional): 资源存储，为空时使用默认位置.
+        manifest_db (ManifestDB | None, optional): 版本文件列表数据库，为空时按需打开.
+        order (str, optional): 同一优先级内的下载顺序，见 ``DownloadScheduler``.
+        bandwidth_limit (float | None, optional): 全局带宽上限（字节/秒）.
+        listeners (list[Listener] | None, optional): 下载进度事件监听函数.
+        on_bundle (BundleHook | None, optional): 每个资源下载完成后调用，
+            参数为文件路径和资源类别，见 ``pipeline.ExportPipeline``.
+        server (str, optional): 服务器，见 ``config.ak_version_api``. 多个服务器可以共用
+            下载器和资源存储同时同步，见 ``sync_servers``.
+        assets_url (str | None, optional): 资源文件地址模板，默认取服务器对应的地址，
+            测试时可指向 ``mock_cdn``.
+        history (ThroughputHistory | None, optional): 下载吞吐量历史，为空时按需读取.
+    """
+
+    def __init__(
+        self,
+        res_types: list[str] = res_type_list,
+        downloader: ArkDownloader | None = None,
+        store: BundleStore | None = None,
+        manifest_db: ManifestDB | None = None,
+        order: str = DOWNLOAD_ORDER,
+        bandwidth_limit: float | None = DOWNLOAD_BANDWIDTH_LIMIT,
+        listeners: list[Listener] | None = None,
+        on_bundle: BundleHook | None = None,
+        server: str = DEFAULT_SERVER,
+        assets_url: str | None = None,
+        history: ThroughputHistory | None = None,
+    ):
+        self.res_types = res_types
+        self._owns_downloader = downloader is None
+        self.downloader = downloader or ArkDownloader(journal=DownloadJournal())
+        self.store = store or BundleStore()
+        self._manifest_db = manifest_db
+        self._history = history
+        self.order = order
+        self.bandwidth_limit = bandwidth_limit
+        self.listeners = listeners or []
+        self.on_bundle = on_bundle
+        self.server = server
+        self.assets_url = assets_url or ak_assets_url[server]
+        self.root = server_path(DOWNLOADPATH, server)
+        self.scheduler: DownloadScheduler | None = None
+        self._cancelled = threading.Event()
+
+        self.local_version: str | None = None
+        self.res_version: str | None = None
+
+    async def __aenter__(self):
+        self.downloader.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.downloader.aclose()
+
+    @property
+    def manifest_db(self) -> ManifestDB:
+        if self._manifest_db is None:
+            self._manifest_db = ManifestDB()
+        return self._manifest_db
+
+    @property
+    def history(self) -> ThroughputHistory:
+        if self._history is None:
+            self._history = ThroughputHistory()
+        return self._history
+
+    def check_version(self) -> tuple[str, str]:
+        """获取本地和最新版本号
+
+        Returns:
+            tuple[str | None, str]: (本地版本号, 最新版本号)，
+            从未同步过时本地版本号为 None
+        """
+        self.local_version = get_local_res_version(self.server)
+        self.res_version = get_res_version(self.server)
+        return self.local_version, self.res_version
+
+    def _ensure_version(self):
+        if self.res_version is None:
+            self.check_version()
+
+    def load_res_list(self, version: str) -> list[dict]:
+        """从数据库读取某版本的资源列表，尚未入库时从本地缓存或服务器获取并导入"""
+        db = self.manifest_db
+        key = manifest_key(version, self.server)
+        if not db.has_version(key):
+            list_dir = server_path(DATAPATH / "hot_update_list", self.server)
+            ver_file = list_dir / f"{version}.json"
+            # 检查本地是否有缓存的版本文件列表
+            if ver_file.exists():
+                with open(ver_file, encoding="utf8") as file:
+                    db.ingest(json.load(file), key)
+            else:
+                print("下载版本文件列表...")
+                # 获取文件列表，内容直接保存为本地缓存文件
+                ver_info = metadata_cache.get_json(
+                    f"{self.assets_url.format(version)}/hot_update_list.json",
+                    MANIFEST_CACHE_TTL,
+                    body_path=ver_file,
+                )
+                print("下载完成.")
+                db.ingest(ver_info, key)
+
+        return db.ab_infos(key)
+
+    def check_res_list(self) -> list[dict]:
+        self._ensure_version()
+        assert self.res_version
+        return self.load_res_list(self.res_version)
+
+    def plan(self) -> dict[str, dict]:
+        """比较本地版本和最新版本，返回各类别需要下载的资源
+
+        Returns:
+            dict[str, dict]: 见 ``manifest.diff_manifests``，版本相同时为空；
+            从未同步过时所有资源都视为新增
+        """
+        self._ensure_version()
+        assert self.res_version
+        if self.local_version == self.res_version:
+            return {}
+
+        curr_res = ManifestIndex(self.check_res_list())
+        old_res = ManifestIndex(
+            self.load_res_list(self.local_version) if self.local_version else []
+        )
+        return diff_manifests(old_res, curr_res, self.res_types)
+
+    def _out_file(self, info: dict, dl_path: str) -> Path:
+        assert self.res_version
+        return self.root / self.res_version / dl_path / f"{res_name(info['name'])}.zip"
+
+    def _is_local(self, info: dict, dl_path: str) -> bool:
+        return self._out_file(info, dl_path).exists() or self.store.has(info["md5"])
+
+    def cancel(self):
+        """取消当前同步中的下载，可在其他线程中调用
+
+        取消只对正在进行的同步有效，下一次同步开始时清除。
+        """
+        self._cancelled.set()
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+
+    def _new_scheduler(self) -> DownloadScheduler:
+        self.scheduler = DownloadScheduler(
+            order=self.order,
+            bandwidth_limit=self.bandwidth_limit,
+            workers=self.downloader.max_connections,
+            listeners=self.listeners,
+        )
+        if self._cancelled.is_set():
+            self.scheduler.cancel()
+        return self.scheduler
+
+    async def _run(self, scheduler: DownloadScheduler) -> dict:
+        """执行下载任务，返回调度器的统计
+
+        下载器由本同步器创建时，同时返回并打印下载器的重试、对冲和失败统计；
+        共用的下载器由创建者汇总（见 ``sync_servers``）。
+        """
+        if self._owns_downloader:
+            self.downloader.reset_stats()
+        stats = await scheduler.run()
+        self.history.record(
+            scheduler.bytes_transferred, scheduler.elapsed, self.server
+        )
+        if not self._owns_downloader:
+            return stats
+
+        print(self.downloader.summary())
+        return {**stats, **self.downloader.stats}
+
+    def _plan_packs(self, jobs: list[tuple[dict, str, str]]) -> list[dict]:
+        """选出改为整包下载的包，见 ``pack_planner.plan_fetch``"""
+        assert self.res_version
+        # 本地已有的资源只需链接，不参与成本估算
+        pending = [
+            info for info, _, dl_path in jobs if not self._is_local(info, dl_path)
+        ]
+        pack_infos = self.manifest_db.pack_infos(
+            manifest_key(self.res_version, self.server)
+        )
+        fetch_plan = plan_fetch(pending, pack_infos)
+        fetch_packs = fetch_plan["packs"]
+        if fetch_packs:
+            print(
+                f"按文件下载 {len(fetch_plan['files'])} 个资源，"
+                f"按包下载 {len(fetch_packs)} 个包"
+                f"（预计 {fetch_plan['cost'] / 2**20:.1f} MB，"
+                f"逐个下载为 {fetch_plan['per_file_cost'] / 2**20:.1f} MB）"
             )
-
-        for resName in download_update_list:
-            dl_list.append(
-                download_ark_res(res_version, res_type, resName, "update/" + res_type)
+        return fetch_packs
+
+    async def _download_entries(
+        self, jobs: list[tuple[dict, str, str]], use_packs: bool = True
+    ) -> dict:
+        """下载资源列表
+
+        Args:
+            jobs (list[tuple[dict, str, str]]): (abInfos 条目, 资源类别, 保存目录)
+            use_packs (bool, optional): 需要下载的资源集中在某个包里时改为整包下载.
+                Defaults to True.
+
+        Returns:
+            dict: 调度器统计的完成、失败、取消数量
+        """
+        jobs_by_name = {job[0]["name"]: job for job in jobs}
+        fetch_packs = []
+        if use_packs:
+            fetch_packs = await asyncio.to_thread(self._plan_packs, jobs)
+
+        scheduler = self._new_scheduler()
+        packed = {i["name"] for p in fetch_packs for i in p["entries"]}
+        for info, res_type, dl_path in jobs:
+            if info["name"] not in packed:
+                scheduler.add(
+                    f"{dl_path}/{res_name(info['name'])}.zip",
+                    res_type,
+                    info["totalSize"],
+                    functools.partial(self._download_one, info, res_type, dl_path),
+                )
+        for p in fetch_packs:
+            pack_jobs = [jobs_by_name[i["name"]] for i in p["entries"]]
+            scheduler.add(
+                f"packs/{p['pack']['name']}.dat",
+                "packs",
+                p["pack"]["totalSize"],
+                functools.partial(self._download_pack, p["pack"], pack_jobs),
+            )
+        return await self._run(scheduler)
+
+    async def _download_one(
+        self,
+        info: dict,
+        res_type: str,
+        dl_path: str,
+        on_progress: ProgressHook | None = None,
+    ) -> bool:
+        assert self.res_version
+        ok = await download_ark_res(
+            self.downloader,
+            self.res_version,
+            res_type,
+            res_name(info["name"]),
+            dl_path,
+            info["md5"],
+            info["totalSize"],
+            self.store,
+            on_progress,
+            self.assets_url,
+            self.server,
+        )
+        if ok and self.on_bundle:
+            await self.on_bundle(self._out_file(info, dl_path), res_type)
+        return ok
+
+    async def _download_pack(
+        self,
+        pack: dict,
+        jobs: list[tuple[dict, str, str]],
+        on_progress: ProgressHook | None = None,
+    ) -> bool:
+        """整包下载并取出其中需要的资源，缺失或校验失败的资源改为逐个下载
+
+        取出的资源重新打包保存（见 ``pack_planner.extract_pack_members``），
+        内容与 abInfos 中的 md5 不同，因此不放入资源存储。
+        """
+        assert self.res_version
+        pack_url = f"{self.assets_url.format(self.res_version)}/{pack['name']}.dat"
+        pack_file = self.root / self.res_version / "packs" / f"{pack['name']}.dat"
+        pack_file.parent.mkdir(parents=True, exist_ok=True)
+        targets = [(info, self._out_file(info, dl_path)) for info, _, dl_path in jobs]
+
+        try:
+            # packInfos 中的 md5 为空，totalSize 也不一定等于文件大小，因此不校验整包；
+            # 取出的每个成员由 zip 的 CRC 和 abSize 校验
+            await self.downloader.fetch(pack_url, pack_file, on_progress=on_progress)
+            print(f"packs/{pack['name']}.dat 下载成功")
+            missing = set(
+                await asyncio.to_thread(extract_pack_members, pack_file, targets)
+            )
+            pack_file.unlink()
+        except (DownloadError, httpx.HTTPError, zipfile.BadZipFile) as e:
+            print(f"下载包{pack['name']}时出错：", e)
+            missing = {info["name"] for info, _ in targets}
+
+        if self.on_bundle:
+            for info, res_type, dl_path in jobs:
+                if info["name"] not in missing:
+                    await self.on_bundle(self._out_file(info, dl_path), res_type)
+
+        results = await asyncio.gather(
+            *(
+                self._download_one(info, res_type, dl_path)
+                for info, res_type, dl_path in jobs
+                if info["name"] in missing
+            )
+        )
+        return all(results)
+
+    def _category_jobs(self) -> list[tuple[dict, str, str]]:
+        """差分同步需要的资源：所选类别中新增和更新的文件"""
+        jobs = []
+        for res_type, diff_data in self.plan().items():
+            for kind in ("new", "update"):
+                for info in diff_data[kind]:
+                    jobs.append((info, res_type, f"{kind}/{res_type}"))
+        return jobs
+
+    def _full_jobs(self) -> list[tuple[dict, str, str]]:
+        """完整快照需要的资源：所选类别中的所有文件"""
+        curr_res = ManifestIndex(self.check_res_list())
+        jobs = []
+        for res_type in self.res_types:
+            for info in curr_res.select(res_type):
+                jobs.append((info, res_type, f"full/{res_type}"))
+        return jobs
+
+    def dry_run(self, full: bool = False, use_packs: bool = True) -> dict:
+        """预估同步的下载量和耗时，不下载任何资源
+
+        Args:
+            full (bool, optional): 预估完整快照（``sync_full``），否则预估差分同步.
+                Defaults to False.
+            use_packs (bool, optional): 与实际同步一样考虑整包下载. Defaults to True.
+
+        Returns:
+            dict: 各类别（categories）和总计（total）的资源数与字节数，
+            其中 bytes 为下载大小（totalSize），ab_bytes 为解压后大小（abSize），
+            cached_* 为本地已有（版本目录或资源存储中）的部分；
+            transfer_bytes 为考虑整包下载后实际需要传输的字节数，
+            eta 为按历史吞吐量估算的秒数，没有历史时为 None
+        """
+        self._ensure_version()
+        jobs = self._full_jobs() if full else self._category_jobs()
+
+        keys = (
+            "bundles",
+            "bytes",
+            "ab_bytes",
+            "cached_bundles",
+            "cached_bytes",
+            "fetch_bundles",
+            "fetch_bytes",
+        )
+        categories: dict[str, dict] = {}
+        pending = []
+        for info, res_type, dl_path in jobs:
+            summary = categories.setdefault(res_type, dict.fromkeys(keys, 0))
+            summary["bundles"] += 1
+            summary["bytes"] += info["totalSize"]
+            summary["ab_bytes"] += info.get("abSize") or 0
+            if self._is_local(info, dl_path):
+                summary["cached_bundles"] += 1
+                summary["cached_bytes"] += info["totalSize"]
+            else:
+                summary["fetch_bundles"] += 1
+                summary["fetch_bytes"] += info["totalSize"]
+                pending.append(info)
+        total = {k: sum(c[k] for c in categories.values()) for k in keys}
+
+        pack_infos = []
+        if use_packs and pending:
+            assert self.res_version
+            pack_infos = self.manifest_db.pack_infos(
+                manifest_key(self.res_version, self.server)
             )
+        fetch_plan = plan_fetch(pending, pack_infos)
+        transfer_bytes = fetch_plan["file_bytes"] + fetch_plan["pack_bytes"]
+        return {
+            "server": self.server,
+            "local_version": self.local_version,
+            "res_version": self.res_version,
+            "mode": "full" if full else "categories",
+            "categories": categories,
+            "total": total,
+            "packs": len(fetch_plan["packs"]),
+            "transfer_bytes": transfer_bytes,
+            "throughput": self.history.throughput(),
+            "eta": self.history.eta(transfer_bytes),
+        }
+
+    async def sync_categories(self, use_packs: bool = True) -> dict:
+        """下载所选类别中新增和更新的资源，全部成功后更新本地版本号"""
+        self._cancelled.clear()
+        # 获取版本号和文件列表、写入数据库都是阻塞操作，在线程中进行，
+        # 不影响同时同步的其他服务器的下载
+        await asyncio.to_thread(self._ensure_version)
+        if self.local_version == self.res_version:
+            print("当前版本已是最新.")
+            return {}
+        assert self.res_version
+
+        jobs = await asyncio.to_thread(self._category_jobs)
+        stats = await self._download_entries(jobs, use_packs)
+        if stats["files_failed"] or stats["files_cancelled"]:
+            # 保留旧版本号，下次运行时重新比较并续传
+            print(
+                f"有 {stats['files_failed']} 个文件下载失败，"
+                f"{stats['files_cancelled']} 个文件已取消，本地版本号未更新"
+            )
+        else:
+            save_local_res_version(self.res_version, self.server)
+            self.local_version = self.res_version
+        return stats
+
+    async def sync_full(self, use_packs: bool = True) -> dict:
+        """下载当前版本所选类别的完整快照到 ``<resVersion>/full``
+
+        md5 未变化的资源直接从本地存储硬链接，不会重复下载；
+        冷启动时大部分资源会以整包的方式下载。
+        """
+        self._cancelled.clear()
+        jobs = await asyncio.to_thread(self._full_jobs)
+        return await self._download_entries(jobs, use_packs)
+
+    async def sync_anon(self) -> dict:
+        self._cancelled.clear()
+        curr_res = ManifestIndex(await asyncio.to_thread(self.check_res_list))
+        assert self.res_version
+
+        scheduler = self._new_scheduler()
+        for item in curr_res.select("anon"):
+            resName = item["name"].split("/")[-1][:-4]
+            scheduler.add(
+                f"anon/{resName}.zip",
+                "anon",
+                item["totalSize"],
+                functools.partial(
+                    download_ark_anon,
+                    self.downloader,
+                    self.res_version,
+                    resName,
+                    item["md5"],
+                    item["totalSize"],
+                    self.store,
+                    assets_url=self.assets_url,
+                    server=self.server,
+                ),
+            )
+        return await self._run(scheduler)
+
+    async def sync_excel(self) -> dict:
+        self._cancelled.clear()
+        curr_res = ManifestIndex(await asyncio.to_thread(self.check_res_list))
+        assert self.res_version
+
+        scheduler = self._new_scheduler()
+        for item in curr_res.select("gamedata/excel"):
+            name = item["name"]
+            for n in excel_res_list:
+                if name.startswith(f"gamedata/excel/{n}"):
+                    scheduler.add(
+                        f"excel/{res_name(name)}.zip",
+                        "gamedata/excel",
+                        item["totalSize"],
+                        functools.partial(
+                            download_ark_res,
+                            self.downloader,
+                            self.res_version,
+                            "gamedata/excel",
+                            res_name(name),
+                            "excel",
+                            item["md5"],
+                            item["totalSize"],
+                            self.store,
+                            assets_url=self.assets_url,
+                            server=self.server,
+                        ),
+                    )
+        return await self._run(scheduler)
+
+
+async def sync_servers(
+    servers: list[str],
+    res_types: list[str] = res_type_list,
+    anon: bool = False,
+    listeners: list[Listener] | None = None,
+    full: bool = False,
+) -> dict[str, dict]:
+    """同时同步多个服务器
+
+    所有服务器共用一个下载器（连接池和并发限制）和一个资源存储，
+    md5 相同的资源只下载一次，其余服务器直接硬链接。
+
+    Args:
+        servers (list[str]): 服务器列表，见 ``config.ak_version_api``
+        res_types (list[str], optional): 需要同步的资源类别. Defaults to res_type_list.
+        anon (bool, optional): 是否同时同步 anon 资源. Defaults to False.
+        listeners (list[Listener] | None, optional): 下载进度事件监听函数.
+        full (bool, optional): 下载完整快照（``sync_full``）而不是差分.
+            Defaults to False.
+
+    Returns:
+        dict[str, dict]: 服务器 -> 下载统计
+    """
+    store = BundleStore()
+    manifest_db = ManifestDB()
+    history = ThroughputHistory()
+    async with ArkDownloader(journal=DownloadJournal()) as downloader:
+        syncers = [
+            ResourceSyncer(
+                res_types,
+                downloader,
+                store,
+                manifest_db,
+                listeners=listeners,
+                server=server,
+                history=history,
+            )
+            for server in servers
+        ]
+        await asyncio.gather(*(asyncio.to_thread(s.check_version) for s in syncers))
+
+        async def run(syncer: ResourceSyncer) -> dict:
+            if full:
+                stats = await syncer.sync_full()
+            else:
+                stats = await syncer.sync_categories()
+            if anon:
+                await syncer.sync_anon()
+            return stats
+
+        results = await asyncio.gather(*(run(s) for s in syncers))
+        print(downloader.summary())
+    return dict(zip(servers, results, strict=True))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="同步游戏资源")
+    parser.add_argument(
+        "--server",
+        action="append",
+        choices=list(ak_version_api),
+        help=f"要同步的服务器，可重复，默认 {DEFAULT_SERVER}",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="只输出预估的下载量和耗时（JSON），不下载",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="同步（或预估）完整快照而不是差分"
+    )
+    args = parser.parse_args()
+    servers = args.server or [DEFAULT_SERVER]
+
+    if args.dry_run:
+        result = [ResourceSyncer(server=s).dry_run(full=args.full) for s in servers]
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
 
-    await asyncio.gather(*dl_list)
-    with open(DATAPATH / "resVersion.yaml", "w") as file:
-        yaml.dump({"currentVersion": res_version}, file)
+    # 多个服务器的进度交替显示会互相覆盖，只在同步单个服务器时显示进度条
+    listeners = [cli_progress] if len(servers) == 1 else None
+    results = await sync_servers(
+        servers, anon=True, listeners=listeners, full=args.full
+    )
+    for server, stats in results.items():
+        print(server, stats or "已是最新")
 
 
-asyncio.run(dl_res())
-asyncio.run(dl_anon())
+if __name__ == "__main__":
+    asyncio.run(main())
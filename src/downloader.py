@@ -0,0 +1,482 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import random
+import re
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import aiofiles
+import httpx
+
+from config import (
+    DOWNLOAD_BACKOFF,
+    DOWNLOAD_BACKOFF_MAX,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_HEDGE_MIN_DELAY,
+    DOWNLOAD_HEDGE_MIN_SAMPLES,
+    DOWNLOAD_HEDGE_PERCENTILE,
+    DOWNLOAD_HTTP2,
+    DOWNLOAD_MAX_CONNECTIONS,
+    DOWNLOAD_MAX_PER_HOST,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_RETRY_STATUSES,
+    DOWNLOAD_TIMEOUT,
+    HEADERS,
+)
+from journal import DownloadJournal
+
+
+class DownloadError(Exception):
+    """下载失败（状态码错误、大小或校验值不符）"""
+
+
+class RetryableError(DownloadError):
+    """可重试的错误（服务器暂时不可用、限流等）"""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DownloadCancelled(Exception):
+    """下载被取消，已下载的部分保留用于续传"""
+
+
+def full_md5(md5: str | None) -> str | None:
+    """md5 为完整的 32 位十六进制值时返回其小写形式，否则返回 None
+
+    hot_update_list 中 anon 资源的 md5 只有 4 位（不同文件可能相同），整包的 md5 为空，
+    这些值既不能用于校验，也不能作为内容寻址的键。
+    """
+    if md5 and re.fullmatch(r"[0-9a-fA-F]{32}", md5):
+        return md5.lower()
+    return None
+
+
+# 下载进度回调，参数为该文件已接收的字节数；可在其中限速或抛出 DownloadCancelled
+ProgressHook = Callable[[int], Awaitable[None]]
+
+
+class ArkDownloader:
+    """所有下载共用的下载器
+
+    持有一个长期存在的 httpx.AsyncClient（连接复用、可选 HTTP/2），
+    并通过信号量限制全局和单个主机的并发请求数。
+
+    可重试的状态码和网络错误会按指数退避（带随机抖动）重试；
+    设置 ``hedge_percentile`` 后，等待响应头的时间超过历史首字节延迟的该分位数时，
+    在有空闲连接名额的情况下再发一个相同请求，使用先返回的一个。
+    重试和对冲的次数记录在 ``stats`` 中。
+
+    用法::
+
+        async with ArkDownloader() as downloader:
+            resp = await downloader.get(url)
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DOWNLOAD_MAX_CONNECTIONS,
+        max_per_host: int = DOWNLOAD_MAX_PER_HOST,
+        http2: bool = DOWNLOAD_HTTP2,
+        timeout: float = DOWNLOAD_TIMEOUT,
+        headers: dict[str, str] | None = None,
+        journal: DownloadJournal | None = None,
+        retries: int = DOWNLOAD_RETRIES,
+        backoff: float = DOWNLOAD_BACKOFF,
+        backoff_max: float = DOWNLOAD_BACKOFF_MAX,
+        retry_statuses: set[int] = DOWNLOAD_RETRY_STATUSES,
+        hedge_percentile: float | None = DOWNLOAD_HEDGE_PERCENTILE,
+    ):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.http2 = http2
+        self.timeout = timeout
+        self.headers = headers or HEADERS
+        self.journal = journal
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+        self.hedge_percentile = hedge_percentile
+        self.client: httpx.AsyncClient | None = None
+
+        self._global_limit = asyncio.Semaphore(max_connections)
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+        # 最近的首字节延迟，用于计算对冲阈值
+        self._ttfb: deque[float] = deque(maxlen=500)
+        self.reset_stats()
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def open(self):
+        if self.client is not None:
+            return
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("未安装 h2，HTTP/2 已禁用")
+                http2 = False
+
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            http2=http2,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        host_limit = self._host_limits.get(host)
+        if host_limit is None:
+            host_limit = self._host_limits[host] = asyncio.Semaphore(
+                self.max_per_host
+            )
+        return host_limit
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str):
+        """占用一个全局并发名额和一个对应主机的并发名额"""
+        async with self._host_limit(url), self._global_limit:
+            yield
+
+    def reset_stats(self):
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "errors": 0,
+            "reasons": Counter(),
+        }
+
+    def summary(self) -> str:
+        """本次运行的请求、重试和失败统计"""
+        stats = self.stats
+        text = (
+            f"请求 {stats['requests']} 次，重试 {stats['retries']} 次，"
+            f"对冲 {stats['hedged']} 次（胜出 {stats['hedge_wins']} 次），"
+            f"最终失败 {stats['errors']} 个"
+        )
+        if stats["reasons"]:
+            reasons = "，".join(f"{k} x{v}" for k, v in stats["reasons"].most_common())
+            text += f"\n重试原因：{reasons}"
+        return text
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # 完全抖动：在 [0, min(上限, 初始间隔 * 2^n)] 中随机取值，避免同时重试
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2**attempt))
+        if isinstance(error, RetryableError) and error.retry_after:
+            delay = max(delay, min(error.retry_after, self.backoff_max))
+        return delay
+
+    async def _retrying(self, url: str, attempt: Callable[[], Awaitable]):
+        """执行 ``attempt``，遇到可重试的错误时等待后重试"""
+        n = 0
+        while True:
+            try:
+                return await attempt()
+            except (RetryableError, httpx.TransportError) as e:
+                reason = (
+                    str(e).split(":")[0]
+                    if isinstance(e, RetryableError)
+                    else type(e).__name__
+                )
+                self.stats["reasons"][reason] += 1
+                if n >= self.retries:
+                    self.stats["errors"] += 1
+                    raise
+                delay = self._backoff(n, e)
+                n += 1
+                self.stats["retries"] += 1
+                print(f"{reason}，{delay:.1f} 秒后重试（{n}/{self.retries}）: {url}")
+                await asyncio.sleep(delay)
+            except (DownloadError, httpx.HTTPError):
+                self.stats["errors"] += 1
+                raise
+
+    def _check_status(self, resp: httpx.Response):
+        if resp.status_code in self.retry_statuses:
+            retry_after = resp.headers.get("Retry-After", "")
+            raise RetryableError(
+                f"状态码 {resp.status_code}: {resp.url}",
+                float(retry_after) if retry_after.isdigit() else None,
+            )
+
+    def hedge_delay(self) -> float | None:
+        """发出对冲请求前等待的秒数，样本不足或未启用时为 None"""
+        if self.hedge_percentile is None:
+            return None
+        if len(self._ttfb) < DOWNLOAD_HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self._ttfb)
+        index = min(int(len(samples) * self.hedge_percentile), len(samples) - 1)
+        return max(samples[index], DOWNLOAD_HEDGE_MIN_DELAY)
+
+    async def _send(
+        self, url: str, headers: dict | None, stack: contextlib.AsyncExitStack
+    ) -> httpx.Response:
+        """发送请求并等待响应头，必要时发出对冲请求
+
+        对冲请求与普通请求一样占用全局和主机的并发名额，只在两者都有空闲时发出，
+        名额在 ``stack`` 关闭时归还。
+        """
+        assert self.client
+        client = self.client
+        self.stats["requests"] += 1
+        start = time.monotonic()
+        request = client.build_request("GET", url, headers=headers)
+        tasks = [asyncio.create_task(client.send(request, stream=True))]
+        winner = None
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                host_limit = self._host_limit(url)
+                if (
+                    not tasks[0].done()
+                    and not host_limit.locked()
+                    and not self._global_limit.locked()
+                ):
+                    # 名额空闲时获取不会等待，两个名额之间不会被其他请求抢占
+                    await stack.enter_async_context(host_limit)
+                    await stack.enter_async_context(self._global_limit)
+                    self.stats["hedged"] += 1
+                    tasks.append(
+                        asyncio.create_task(
+                            client.send(
+                                client.build_request("GET", url, headers=headers),
+                                stream=True,
+                            )
+                        )
+                    )
+
+            pending = set(tasks)
+            error: BaseException | None = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+            if winner is None:
+                assert error
+                raise error
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                    with contextlib.suppress(BaseException):
+                        await task
+                elif not task.cancelled() and task.exception() is None:
+                    await task.result().aclose()
+
+        self._ttfb.append(time.monotonic() - start)
+        if winner is not tasks[0]:
+            self.stats["hedge_wins"] += 1
+        return winner.result()
+
+    @contextlib.asynccontextmanager
+    async def _stream(self, url: str, headers: dict | None = None):
+        async with contextlib.AsyncExitStack() as stack:
+            resp = await self._send(url, headers, stack)
+            try:
+                yield resp
+            finally:
+                await resp.aclose()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """GET 请求，可重试的状态码和网络错误会自动重试
+
+        重试次数用完时仍返回最后一次的响应，由调用方检查状态码。
+        """
+        self.open()
+        assert self.client
+        last: httpx.Response | None = None
+
+        async def attempt():
+            nonlocal last
+            self.stats["requests"] += 1
+            async with self.slot(url):
+                last = await self.client.get(url, **kwargs)
+            self._check_status(last)
+            return last
+
+        try:
+            return await self._retrying(url, attempt)
+        except RetryableError:
+            assert last is not None
+            return last
+
+    async def fetch(
+        self,
+        url: str,
+        out_file: Path,
+        md5: str | None = None,
+        size: int | None = None,
+        on_progress: ProgressHook | None = None,
+    ):
+        """流式下载文件
+
+        数据分块写入同目录的 ``.part`` 文件，全部接收并通过大小和 md5 校验后
+        再原子地重命名为 ``out_file``，因此 ``out_file`` 存在即代表文件完整。
+        设置了下载日志时，中断留下的 ``.part`` 文件会通过 HTTP Range 续传。
+
+        Args:
+            url (str): 下载地址
+            out_file (Path): 保存路径
+            md5 (str | None, optional): 期望的 md5，为空或不是完整的 md5
+                （见 ``full_md5``）时只校验大小. Defaults to None.
+            size (int | None, optional): 期望的文件大小. Defaults to None.
+            on_progress (ProgressHook | None, optional): 每收到一块数据后调用.
+
+        Raises:
+            DownloadError: 状态码错误，或大小、md5 与期望值不符
+                （已重试过的错误为 RetryableError）
+            DownloadCancelled: on_progress 取消了下载
+        """
+        self.open()
+        md5 = full_md5(md5)
+        await self._retrying(
+            url, lambda: self._fetch_once(url, out_file, md5, size, on_progress)
+        )
+
+    async def _fetch_once(
+        self,
+        url: str,
+        out_file: Path,
+        md5: str | None,
+        size: int | None,
+        on_progress: ProgressHook | None,
+    ):
+        assert self.client
+
+        part_file = out_file.with_name(out_file.name + ".part")
+        digest = hashlib.md5()
+        received = await asyncio.to_thread(
+            self._resume_offset, part_file, out_file, url, md5, size
+        )
+        if received:
+            # 已有部分需要先计入 md5
+            await asyncio.to_thread(_update_digest, digest, part_file)
+        elif self.journal is not None:
+            self.journal.start(out_file, url, md5, size)
+
+        try:
+            if on_progress is not None:
+                await on_progress(received)
+
+            if size is None or received < size:
+                headers = {"Range": f"bytes={received}-"} if received else None
+                async with self.slot(url), self._stream(url, headers) as resp:
+                    self._check_status(resp)
+                    if received and resp.status_code == 206:
+                        mode = "ab"
+                    elif resp.status_code == 200:
+                        # 服务器不支持 Range 时从头下载
+                        mode = "wb"
+                        received = 0
+                        digest = hashlib.md5()
+                    else:
+                        raise DownloadError(f"状态码 {resp.status_code}: {url}")
+
+                    async with aiofiles.open(part_file, mode) as wf:
+                        async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            digest.update(chunk)
+                            received += len(chunk)
+                            await wf.write(chunk)
+                            if self.journal is not None:
+                                self.journal.update(out_file, received)
+                            if on_progress is not None:
+                                await on_progress(received)
+
+            if size is not None and received != size:
+                raise DownloadError(f"文件大小不符（{received}/{size}）: {url}")
+            if md5 and digest.hexdigest() != md5:
+                raise DownloadError(f"md5 校验失败: {url}")
+        except RetryableError:
+            self._keep(part_file, out_file)
+            raise
+        except DownloadError:
+            # 内容有误的部分文件不能用于续传
+            self._discard(part_file, out_file)
+            raise
+        except BaseException:
+            self._keep(part_file, out_file)
+            raise
+
+        os.replace(part_file, out_file)
+        if self.journal is not None:
+            self.journal.finish(out_file)
+
+    def _resume_offset(
+        self,
+        part_file: Path,
+        out_file: Path,
+        url: str,
+        md5: str | None,
+        size: int | None,
+    ) -> int:
+        """返回可续传的字节数，不可续传时返回 0"""
+        if self.journal is None or not part_file.exists():
+            return 0
+
+        entry = self.journal.get(out_file)
+        received = part_file.stat().st_size
+        if (
+            entry is None
+            or received == 0
+            or entry["md5"] != md5
+            or entry["size"] != size
+            or (size is not None and received > size)
+        ):
+            return 0
+
+        print(f"续传 {out_file.name}（已下载 {received} 字节）")
+        return received
+
+    def _keep(self, part_file: Path, out_file: Path):
+        """保留部分文件供重试或下次运行续传（没有下载日志时无法续传）"""
+        if self.journal is None:
+            self._discard(part_file, out_file)
+        else:
+            self.journal.save()
+
+    def _discard(self, part_file: Path, out_file: Path):
+        with contextlib.suppress(OSError):
+            part_file.unlink()
+        if self.journal is not None:
+            self.journal.finish(out_file)
+
+
+def _update_digest(digest, file_path: Path):
+    with open(file_path, "rb") as file:
+        while chunk := file.read(DOWNLOAD_CHUNK_SIZE):
+            digest.update(chunk)
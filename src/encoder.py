@@ -0,0 +1,154 @@
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from config import (
+    IMAGE_CODEC,
+    IMAGE_ENCODE_QUEUE,
+    IMAGE_ENCODE_WORKERS,
+    IMAGE_PNG_COMPRESS_LEVEL,
+    IMAGE_WEBP_METHOD,
+)
+
+# 编码格式 -> 扩展名
+CODEC_EXT = {"png": ".png", "webp": ".webp", "raw": ".rgba"}
+
+# raw 格式的文件头：魔数、宽、高，之后是 RGBA 像素
+RAW_HEADER = struct.Struct("<4sII")
+RAW_MAGIC = b"RGBA"
+
+
+def load_image(path: Path) -> Image.Image:
+    """打开解包得到的图片，支持 ``CODEC_EXT`` 中的所有格式"""
+    path = Path(path)
+    if path.suffix != CODEC_EXT["raw"]:
+        return Image.open(path)
+
+    with open(path, "rb") as file:
+        magic, width, height = RAW_HEADER.unpack(file.read(RAW_HEADER.size))
+        if magic != RAW_MAGIC:
+            raise ValueError(f"{path} 不是 raw 格式的图片")
+        return Image.frombytes("RGBA", (width, height), file.read())
+
+
+def merge_stats(total: dict, stats: dict) -> dict:
+    """合并各次运行（或各进程）的编码统计，``total`` 会被修改"""
+    for codec, s in stats.items():
+        t = total.setdefault(
+            codec, {"images": 0, "pixels": 0, "bytes": 0, "seconds": 0.0}
+        )
+        for key in t:
+            t[key] += s[key]
+    return total
+
+
+def format_stats(stats: dict) -> list[str]:
+    """每种格式一行：图片数、输出大小、每像素字节数和单线程吞吐量"""
+    lines = []
+    for codec, s in stats.items():
+        mpix = s["pixels"] / 1e6
+        lines.append(
+            f"{codec}: {s['images']} 张，{s['bytes'] / 2**20:.1f} MB，"
+            f"{s['bytes'] / max(s['pixels'], 1):.2f} 字节/像素，"
+            f"{mpix / max(s['seconds'], 1e-9):.1f} 百万像素/秒（单线程）"
+        )
+    return lines
+
+
+class ImageEncoder:
+    """在线程池中编码并保存图片，与对象解码同时进行
+
+    Pillow 编码时会释放 GIL，因此多个线程可以并行压缩。
+    等待编码的图片数不超过 ``queue_size``，达到上限时 ``submit`` 会阻塞，
+    避免解码出的图片在内存中积压。Pillow 保存图片时会修改图片对象的状态，
+    提交后不要再修改，也不要同时提交同一个对象::
+
+        with ImageEncoder("webp") as encoder:
+            encoder.submit(texture.image, out_dir / f"{texture.m_Name}{encoder.ext}")
+        print(format_stats(encoder.stats))
+
+    Args:
+        codec (str, optional): 编码格式，见 ``CODEC_EXT``.
+        workers (int, optional): 编码线程数.
+        queue_size (int, optional): 已提交但尚未完成的图片数上限.
+        png_compress_level (int, optional): PNG 压缩级别（0~9）.
+        webp_method (int, optional): WebP 压缩力度（0~6），越大越慢、文件越小.
+    """
+
+    def __init__(
+        self,
+        codec: str = IMAGE_CODEC,
+        workers: int = IMAGE_ENCODE_WORKERS,
+        queue_size: int = IMAGE_ENCODE_QUEUE,
+        png_compress_level: int = IMAGE_PNG_COMPRESS_LEVEL,
+        webp_method: int = IMAGE_WEBP_METHOD,
+    ):
+        if codec not in CODEC_EXT:
+            raise ValueError(f"未知的编码格式: {codec}")
+
+        self.codec = codec
+        self.ext = CODEC_EXT[codec]
+        self.png_compress_level = png_compress_level
+        self.webp_method = webp_method
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="encode")
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self.stats: dict[str, dict] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _save(self, image: Image.Image, out_file: Path) -> int:
+        if self.codec == "png":
+            image.save(out_file, "PNG", compress_level=self.png_compress_level)
+        elif self.codec == "webp":
+            # exact：保留透明像素的 RGB，遮罩图片分开存储时需要
+            image.save(
+                out_file, "WEBP", lossless=True, method=self.webp_method, exact=True
+            )
+        else:
+            rgba = image.convert("RGBA")
+            with open(out_file, "wb") as file:
+                file.write(RAW_HEADER.pack(RAW_MAGIC, *rgba.size))
+                file.write(rgba.tobytes())
+        return out_file.stat().st_size
+
+    def _encode(self, image: Image.Image, out_file: Path) -> Path:
+        try:
+            start = time.thread_time()
+            size = self._save(image, out_file)
+            seconds = time.thread_time() - start
+            stats = {
+                "images": 1,
+                "pixels": image.width * image.height,
+                "bytes": size,
+                "seconds": seconds,
+            }
+            with self._lock:
+                merge_stats(self.stats, {self.codec: stats})
+            return out_file
+        finally:
+            self._slots.release()
+
+    def submit(self, image: Image.Image, out_file: Path) -> Future:
+        """提交一张图片，返回的 Future 在保存完成后给出输出路径
+
+        ``out_file`` 应使用 ``self.ext`` 作为扩展名。
+        """
+        self._slots.acquire()
+        try:
+            return self._pool.submit(self._encode, image, Path(out_file))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def close(self):
+        """等待所有图片保存完成"""
+        self._pool.shutdown(wait=True)
@@ -9,12 +9,20 @@ import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
 from pathlib import Path
-from typing import Optional
 import sys
 
-# 导入各个功能模块
-from src import download_res, unpacker, avg_export, avg_gen_face, audio, config
-from src.util import extract_package
+# 各功能模块之间使用 src 目录下的平级导入
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# 导入各个功能模块（均不会在导入时访问网络）
+import audio
+import avg_export
+import avg_gen_face
+import config
+import download_res
+import unpacker
+from batch_unpack import BatchUnpacker
+from scheduler import format_eta
 
 
 class ArkToolsGUI:
@@ -43,6 +51,9 @@ class ArkToolsGUI:
         self.notebook = ttk.Notebook(main_container)
         self.notebook.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
 
+        # 正在进行的下载，停止下载时使用
+        self.download_syncer: download_res.ResourceSyncer | None = None
+
         # 创建各个标签页
         self.create_download_tab()
         self.create_unpacker_tab()
@@ -73,6 +84,9 @@ class ArkToolsGUI:
         ttk.Label(version_frame, textvariable=self.latest_version_var).grid(row=1, column=1, sticky=tk.W, pady=2, padx=(10, 0))
 
         ttk.Button(version_frame, text="检查更新", command=self.check_version).grid(row=0, column=2, rowspan=2, padx=(20, 0))
+        ttk.Button(
+            version_frame, text="预估下载量", command=self.estimate_download
+        ).grid(row=0, column=3, rowspan=2, padx=(10, 0))
 
         # 下载选项框架
         options_frame = ttk.LabelFrame(tab, text="下载选项", padding="10")
@@ -88,12 +102,15 @@ class ArkToolsGUI:
         self.download_btn = ttk.Button(button_frame, text="开始下载", command=self.start_download, state=tk.DISABLED)
         self.download_btn.grid(row=0, column=0, padx=5)
 
-        ttk.Button(button_frame, text="停止下载", command=self.stop_download, state=tk.DISABLED).grid(row=0, column=1, padx=5)
+        self.stop_btn = ttk.Button(
+            button_frame, text="停止下载", command=self.stop_download, state=tk.DISABLED
+        )
+        self.stop_btn.grid(row=0, column=1, padx=5)
 
         ttk.Button(button_frame, text="刷新文件列表", command=self.refresh_download_list).grid(row=0, column=2, padx=5)
 
         # 进度条
-        self.download_progress = ttk.Progressbar(tab, mode='indeterminate')
+        self.download_progress = ttk.Progressbar(tab, mode='determinate', maximum=100)
         self.download_progress.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
 
         # 创建PanedWindow来分割文件列表和日志
@@ -404,7 +421,7 @@ class ArkToolsGUI:
         api_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
 
         ttk.Label(api_frame, text="服务器:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.api_server_var = tk.StringVar(value="officialAndroid")
+        self.api_server_var = tk.StringVar(value=config.DEFAULT_SERVER)
         server_combo = ttk.Combobox(api_frame, textvariable=self.api_server_var, width=30, state="readonly")
         server_combo['values'] = list(config.ak_version_api.keys())
         server_combo.grid(row=0, column=1, sticky=tk.W, padx=(10, 0), pady=5)
@@ -444,8 +461,10 @@ class ArkToolsGUI:
     def use_current_version_path(self):
         """使用当前版本的下载目录"""
         try:
-            res_version = download_res.get_res_version()
-            default_path = config.DOWNLOADPATH / res_version / "new" / "avg" / "characters"
+            server = self.api_server_var.get()
+            res_version = download_res.get_res_version(server)
+            server_root = download_res.server_path(config.DOWNLOADPATH, server)
+            default_path = server_root / res_version / "new" / "avg" / "characters"
             if default_path.exists():
                 self.unpack_input_var.set(str(default_path))
                 self.log_message(self.unpack_log, f"已设置为当前版本目录: {default_path}")
@@ -525,21 +544,14 @@ class ArkToolsGUI:
 
         def check_thread():
             try:
-                # 获取最新版本（这是普通函数，不是异步函数）
-                latest = download_res.get_res_version()
+                # 获取设置中所选服务器的最新版本（这是普通函数，不是异步函数）
+                server = self.api_server_var.get()
+                latest = download_res.get_res_version(server)
                 self.latest_version_var.set(latest)
 
                 # 获取本地版本
-                res_version_file = config.DATAPATH / "resVersion.yaml"
-                if res_version_file.exists():
-                    import ruamel.yaml
-                    yaml = ruamel.yaml.YAML()
-                    with open(res_version_file, encoding="utf8") as f:
-                        data = yaml.load(f)
-                        local = data.get("currentVersion", "未知")
-                        self.local_version_var.set(local)
-                else:
-                    self.local_version_var.set("无")
+                local = download_res.get_local_res_version(server)
+                self.local_version_var.set(local or "无")
 
                 self.log_message(self.download_log, f"本地版本: {self.local_version_var.get()}")
                 self.log_message(self.download_log, f"最新版本: {latest}")
@@ -561,19 +573,46 @@ class ArkToolsGUI:
     def start_download(self):
         """开始下载资源"""
         self.log_message(self.download_log, "开始下载资源...")
-        self.download_progress.start()
+        self.download_progress.config(value=0)
         self.download_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
         self.status_bar.config(text="正在下载资源...")
 
+        download_all = self.download_all_var.get()
+        server = self.api_server_var.get()
+
+        async def run_sync():
+            async with download_res.ResourceSyncer(
+                listeners=[self.on_download_event], server=server
+            ) as syncer:
+                self.download_syncer = syncer
+                syncer.check_version()
+                # 勾选"下载所有资源"时下载完整快照
+                if download_all:
+                    return await syncer.sync_full()
+                return await syncer.sync_categories()
+
         def download_thread():
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
+                stats = asyncio.run(run_sync())
 
-                # 调用下载函数
-                loop.run_until_complete(download_res.dl_res())
-
-                self.log_message(self.download_log, "资源下载完成！")
+                if stats and stats["files_cancelled"]:
+                    self.log_message(
+                        self.download_log,
+                        f"下载已停止，{stats['files_cancelled']} 个文件未完成",
+                    )
+                elif stats and stats["files_failed"]:
+                    self.log_message(
+                        self.download_log,
+                        f"下载结束，{stats['files_failed']} 个文件失败",
+                    )
+                else:
+                    self.log_message(self.download_log, "资源下载完成！")
+                if stats:
+                    self.log_message(
+                        self.download_log,
+                        f"重试 {stats['retries']} 次，对冲请求 {stats['hedged']} 次",
+                    )
                 self.log_message(self.download_log, "正在刷新文件列表...")
                 self.status_bar.config(text="下载完成")
 
@@ -584,14 +623,77 @@ class ArkToolsGUI:
                 self.log_message(self.download_log, f"下载时出错: {e}")
                 self.status_bar.config(text="下载失败")
             finally:
-                self.download_progress.stop()
+                self.download_syncer = None
                 self.download_btn.config(state=tk.NORMAL)
+                self.stop_btn.config(state=tk.DISABLED)
 
         threading.Thread(target=download_thread, daemon=True).start()
 
+    def on_download_event(self, event: dict):
+        """下载进度事件（在下载线程中调用，界面更新交给主线程）"""
+        if event["type"] == "progress":
+            total = event["bytes_total"] or 1
+            percent = min(event["bytes_done"] / total * 100, 100)
+            text = (
+                f"正在下载 {event['files_done']}/{event['files_total']} "
+                f"{percent:.1f}% {self.format_size(event['speed'])}/s "
+                f"剩余 {format_eta(event['eta'])}"
+            )
+            self.root.after(0, lambda: (
+                self.download_progress.config(value=percent),
+                self.status_bar.config(text=text),
+            ))
+        elif event["type"] == "file" and event["state"] == "failed":
+            self.root.after(
+                0, self.log_message, self.download_log, f"下载失败: {event['name']}"
+            )
+
+    def estimate_download(self):
+        """预估下载量和耗时（不下载）"""
+        self.log_message(self.download_log, "正在预估下载量...")
+        self.status_bar.config(text="正在预估下载量...")
+        download_all = self.download_all_var.get()
+        server = self.api_server_var.get()
+
+        def estimate_thread():
+            try:
+                syncer = download_res.ResourceSyncer(server=server)
+                plan = syncer.dry_run(full=download_all)
+                for category, c in plan["categories"].items():
+                    self.log_message(
+                        self.download_log,
+                        f"{category}: "
+                        f"{c['fetch_bundles']}/{c['bundles']} 个文件需下载，"
+                        f"{self.format_size(c['fetch_bytes'])}"
+                        f"（本地已有 {self.format_size(c['cached_bytes'])}）",
+                    )
+
+                total = plan["total"]
+                eta = "无历史数据" if plan["eta"] is None else format_eta(plan["eta"])
+                self.log_message(
+                    self.download_log,
+                    f"总计 {total['fetch_bundles']} 个文件，"
+                    f"需传输 {self.format_size(plan['transfer_bytes'])}"
+                    f"（其中整包 {plan['packs']} 个），"
+                    f"解压后 {self.format_size(total['ab_bytes'])}，"
+                    f"预计耗时 {eta}",
+                )
+                self.status_bar.config(text="预估完成")
+            except Exception as e:
+                self.log_message(self.download_log, f"预估下载量时出错: {e}")
+                self.status_bar.config(text="预估失败")
+
+        threading.Thread(target=estimate_thread, daemon=True).start()
+
     def stop_download(self):
         """停止下载"""
-        self.log_message(self.download_log, "停止下载功能尚未实现")
+        if self.download_syncer is None:
+            return
+        self.download_syncer.cancel()
+        self.stop_btn.config(state=tk.DISABLED)
+        self.log_message(
+            self.download_log, "正在停止下载，进行中的文件会保留续传进度..."
+        )
 
     # 功能方法 - 资源解包
     def start_unpack(self):
@@ -624,26 +726,20 @@ class ArkToolsGUI:
                 success_count = 0
                 error_list = []
 
-                for zip_file in zip_files:
-                    try:
-                        self.log_message(self.unpack_log, f"处理: {zip_file.name}")
-
-                        # 1. 解压ZIP获取asset bundle字节数据
-                        ab_bytes = extract_package(zip_file)
-
-                        # 2. 使用UnityPy解包
-                        unpacker_obj = unpacker.ArkMediaUnPacker(ab_bytes, str(output_dir))
-                        unpack_info = unpacker_obj.export_avg_chararts()
-
-                        # 3. 生成立绘差分
-                        result_files = avg_export.gen_avg_chararts(unpack_info)
-
-                        self.log_message(self.unpack_log, f"  生成 {len(result_files)} 张图片")
+                # 多进程解包并生成立绘差分，按完成顺序记录结果
+                for result in BatchUnpacker(str(output_dir)).run(zip_files):
+                    name = result["bundle"].name
+                    if result["ok"]:
+                        n_outputs = len(result["outputs"])
+                        self.log_message(
+                            self.unpack_log, f"{name}: 生成 {n_outputs} 张图片"
+                        )
                         success_count += 1
-
-                    except Exception as e:
-                        error_list.append(zip_file.name)
-                        self.log_message(self.unpack_log, f"  错误: {e}")
+                    else:
+                        error_list.append(name)
+                        self.log_message(
+                            self.unpack_log, f"{name}: 错误: {result['error']}"
+                        )
 
                 self.log_message(self.unpack_log, f"\n解包完成！成功: {success_count}, 失败: {len(error_list)}")
                 if error_list:
@@ -814,7 +910,7 @@ class ArkToolsGUI:
         """重置设置"""
         self.data_path_var.set(str(config.DATAPATH))
         self.download_path_var.set(str(config.DOWNLOADPATH))
-        self.api_server_var.set("officialAndroid")
+        self.api_server_var.set(config.DEFAULT_SERVER)
         messagebox.showinfo("提示", "设置已重置为默认值")
         self.status_bar.config(text="设置已重置")
 
@@ -882,8 +978,13 @@ class ArkToolsGUI:
                 file_count = 0
                 total_size = 0
 
-                # 递归扫描所有文件
+                # 递归扫描所有文件（跳过资源存储目录，其中的文件已链接到各版本目录；
+                # 以及按需下载的缓存目录）
+                cache_dirs = {config.BUNDLE_STORE_PATH, config.BUNDLE_CACHE_PATH}
                 for file_path in download_path.rglob("*.zip"):
+                    if cache_dirs & set(file_path.parents):
+                        continue
+
                     # 获取文件信息
                     stat = file_path.stat()
                     file_size = stat.st_size
@@ -892,6 +993,9 @@ class ArkToolsGUI:
                     # 确定文件类型（新文件/更新）
                     relative_path = file_path.relative_to(download_path)
                     parts = relative_path.parts
+                    # 非默认服务器的文件在以服务器名命名的子目录中
+                    if parts and parts[0] in config.ak_version_api:
+                        parts = parts[1:]
 
                     file_type = "未知"
                     directory = str(relative_path.parent)
@@ -905,6 +1009,8 @@ class ArkToolsGUI:
                             file_type = "匿名"
                         elif parts[1] == "excel":
                             file_type = "数据表"
+                        elif parts[1] == "full":
+                            file_type = "完整快照"
 
                     # 添加到Treeview
                     self.download_tree.insert(
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from config import DOWNLOAD_TIMEOUT, HEADERS, HTTP_CACHE_PATH
+
+
+class MetadataCache:
+    """版本信息、文件列表等小型元数据的 HTTP 缓存
+
+    在 TTL 内重复请求直接返回本地结果；过期后带上 ETag / Last-Modified
+    发送条件请求，服务器返回 304 时只刷新时间戳，不再传输响应内容。
+    可以在多个线程中同时使用。
+    """
+
+    def __init__(self, root: Path = HTTP_CACHE_PATH):
+        self.root = Path(root)
+        self.index_file = self.root / "index.json"
+        self._index: dict[str, dict] | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def index(self) -> dict[str, dict]:
+        if self._index is None:
+            self._index = {}
+            if self.index_file.exists():
+                try:
+                    with open(self.index_file, encoding="utf8") as file:
+                        self._index = json.load(file)
+                except (OSError, ValueError):
+                    print("HTTP 缓存索引已损坏，将重新建立")
+        return self._index
+
+    def _save_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf8") as file:
+            json.dump(self.index, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.index_file)
+
+    def _default_body_path(self, url: str) -> Path:
+        return self.root / f"{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+    def get_json(
+        self,
+        url: str,
+        ttl: float,
+        body_path: Path | None = None,
+        force: bool = False,
+    ):
+        """获取 JSON，优先使用缓存
+
+        Args:
+            url (str): 请求地址
+            ttl (float): 缓存有效秒数，期间不发送任何请求
+            body_path (Path | None, optional): 响应内容的保存位置，默认保存在缓存目录.
+            force (bool, optional): 忽略 TTL，立即向服务器确认. Defaults to False.
+        """
+        with self._lock:
+            # 复制一份，其他线程更新索引时不受影响
+            entry = self.index.get(url)
+            entry = dict(entry) if entry else None
+        cached_body = Path(entry["body"]) if entry else None
+        if cached_body is not None and not cached_body.exists():
+            entry = cached_body = None
+
+        if entry and not force and time.time() - entry["fetched_at"] < ttl:
+            return _load(cached_body)
+
+        headers = dict(HEADERS)
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        resp = httpx.get(
+            url, headers=headers, timeout=DOWNLOAD_TIMEOUT, follow_redirects=True
+        )
+        if resp.status_code == 304 and entry:
+            with self._lock:
+                self.index[url] = {**entry, "fetched_at": time.time()}
+                self._save_index()
+            return _load(cached_body)
+        resp.raise_for_status()
+
+        body_path = Path(body_path or self._default_body_path(url))
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = body_path.with_name(body_path.name + ".tmp")
+        with open(tmp_file, "wb") as file:
+            file.write(resp.content)
+        os.replace(tmp_file, body_path)
+
+        with self._lock:
+            self.index[url] = {
+                "body": body_path.as_posix(),
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self._save_index()
+        return resp.json()
+
+
+def _load(body_path):
+    with open(body_path, "rb") as file:
+        return json.loads(file.read())
@@ -0,0 +1,66 @@
+import json
+import os
+from pathlib import Path
+
+from config import DOWNLOAD_JOURNAL, DOWNLOAD_JOURNAL_FLUSH_BYTES
+
+
+class DownloadJournal:
+    """记录下载中文件的日志
+
+    每个未完成的文件以保存路径为键，记录下载地址、期望的 md5 与大小以及已接收的字节数。
+    进程中断后，下载器据此判断 ``.part`` 文件能否用 HTTP Range 续传。
+    """
+
+    def __init__(self, path: Path = DOWNLOAD_JOURNAL):
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        self._unsaved_bytes = 0
+
+        if self.path.exists():
+            try:
+                with open(self.path, encoding="utf8") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError):
+                print(f"下载日志 {self.path} 已损坏，将重新记录")
+
+    @staticmethod
+    def key(out_file: Path) -> str:
+        return Path(out_file).as_posix()
+
+    def get(self, out_file: Path) -> dict | None:
+        return self.entries.get(self.key(out_file))
+
+    def start(
+        self, out_file: Path, url: str, md5: str | None, size: int | None, received=0
+    ):
+        self.entries[self.key(out_file)] = {
+            "url": url,
+            "md5": md5,
+            "size": size,
+            "received": received,
+        }
+        self.save()
+
+    def update(self, out_file: Path, received: int):
+        entry = self.entries.get(self.key(out_file))
+        if entry is None:
+            return
+
+        self._unsaved_bytes += received - entry["received"]
+        entry["received"] = received
+        # 每接收一定字节数才落盘一次，避免频繁写文件
+        if self._unsaved_bytes >= DOWNLOAD_JOURNAL_FLUSH_BYTES:
+            self.save()
+
+    def finish(self, out_file: Path):
+        if self.entries.pop(self.key(out_file), None) is not None:
+            self.save()
+
+    def save(self):
+        self._unsaved_bytes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf8") as file:
+            json.dump(self.entries, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+
+class ManifestIndex:
+    """hot_update_list 中 abInfos 的索引
+
+    构建时一次性生成按文件名和按目录前缀的哈希表，
+    之后的查找和按类别筛选都不需要再遍历整个列表。
+    """
+
+    def __init__(self, ab_infos: list[dict]):
+        self.by_name: dict[str, dict] = {}
+        self.by_prefix: dict[str, list[str]] = defaultdict(list)
+
+        for info in ab_infos:
+            name = info["name"]
+            self.by_name[name] = info
+
+            # 为每一级父目录建立索引，如 avg/characters/a.ab -> avg, avg/characters
+            end = name.find("/")
+            while end != -1:
+                self.by_prefix[name[:end]].append(name)
+                end = name.find("/", end + 1)
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __contains__(self, name: str):
+        return name in self.by_name
+
+    def get(self, name: str) -> dict | None:
+        return self.by_name.get(name)
+
+    def names(self, prefix: str | None = None) -> list[str]:
+        """返回 ``prefix/`` 目录下所有资源名，prefix 为空时返回全部"""
+        if prefix is None:
+            return list(self.by_name)
+        return self.by_prefix.get(prefix.rstrip("/"), [])
+
+    def select(self, prefix: str | None = None) -> list[dict]:
+        return [self.by_name[n] for n in self.names(prefix)]
+
+
+def category_of(name: str) -> str:
+    """资源所属的顶层目录，如 ``avg/bg/a.ab`` -> ``avg``"""
+    return name.split("/", 1)[0] if "/" in name else ""
+
+
+def is_changed(old: dict, new: dict) -> bool:
+    return old.get("hash") != new.get("hash") or old.get("md5") != new.get("md5")
+
+
+def diff_names(old: ManifestIndex, new: ManifestIndex, names_old, names_new):
+    """比较两组资源名，返回新增、更新和删除的条目以及大小变化"""
+    old_set = set(names_old)
+    new_set = set(names_new)
+
+    added = [new.by_name[n] for n in names_new if n not in old_set]
+    updated = [
+        new.by_name[n]
+        for n in names_new
+        if n in old_set and is_changed(old.by_name[n], new.by_name[n])
+    ]
+    removed = [old.by_name[n] for n in names_old if n not in new_set]
+
+    size_delta = (
+        sum(i["totalSize"] for i in added)
+        + sum(i["totalSize"] - old.by_name[i["name"]]["totalSize"] for i in updated)
+        - sum(i["totalSize"] for i in removed)
+    )
+
+    return {
+        "new": added,
+        "update": updated,
+        "removed": removed,
+        "fetch_bytes": sum(i["totalSize"] for i in added + updated),
+        "size_delta": size_delta,
+    }
+
+
+def diff_manifests(
+    old: ManifestIndex, new: ManifestIndex, prefixes: list[str] | None = None
+) -> dict[str, dict]:
+    """按类别比较两个版本的资源列表
+
+    Args:
+        old (ManifestIndex): 旧版本索引
+        new (ManifestIndex): 新版本索引
+        prefixes (list[str] | None, optional): 要比较的目录前缀，
+            为空时比较全部资源并按顶层目录分组. Defaults to None.
+
+    Returns:
+        dict[str, dict]: 类别 ->
+        ``{"new", "update", "removed", "fetch_bytes", "size_delta"}``，
+            其中 new/update/removed 为 abInfos 条目列表
+    """
+    if prefixes is not None:
+        return {
+            p: diff_names(old, new, old.names(p), new.names(p)) for p in prefixes
+        }
+
+    groups_old: dict[str, list[str]] = defaultdict(list)
+    groups_new: dict[str, list[str]] = defaultdict(list)
+    for n in old.by_name:
+        groups_old[category_of(n)].append(n)
+    for n in new.by_name:
+        groups_new[category_of(n)].append(n)
+
+    return {
+        c: diff_names(old, new, groups_old.get(c, []), groups_new.get(c, []))
+        for c in sorted(groups_old.keys() | groups_new.keys())
+    }
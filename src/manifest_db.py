@@ -0,0 +1,363 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import DATAPATH, DEFAULT_SERVER, MANIFEST_DB_PATH
+from manifest import category_of
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version_id TEXT PRIMARY KEY,
+    manifest_name TEXT,
+    manifest_version TEXT,
+    ingested_at INTEGER,
+    server TEXT
+);
+CREATE TABLE IF NOT EXISTS bundles (
+    version_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    hash TEXT,
+    md5 TEXT,
+    total_size INTEGER,
+    ab_size INTEGER,
+    thash TEXT,
+    pid TEXT,
+    cid INTEGER,
+    cat INTEGER,
+    PRIMARY KEY (version_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bundles_name ON bundles (name, version_id);
+CREATE INDEX IF NOT EXISTS bundles_md5 ON bundles (md5);
+CREATE TABLE IF NOT EXISTS packs (
+    version_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT,
+    md5 TEXT,
+    total_size INTEGER,
+    ab_size INTEGER,
+    cid INTEGER,
+    PRIMARY KEY (version_id, name)
+) WITHOUT ROWID;
+"""
+
+# abInfos 字段与数据库列的对应关系
+AB_FIELDS = {
+    "name": "name",
+    "hash": "hash",
+    "md5": "md5",
+    "totalSize": "total_size",
+    "abSize": "ab_size",
+    "thash": "thash",
+    "pid": "pid",
+    "cid": "cid",
+    "cat": "cat",
+}
+PACK_FIELDS = {
+    "name": "name",
+    "hash": "hash",
+    "md5": "md5",
+    "totalSize": "total_size",
+    "abSize": "ab_size",
+    "cid": "cid",
+}
+
+AB_COLUMNS = ", ".join(AB_FIELDS.values())
+PACK_COLUMNS = ", ".join(PACK_FIELDS.values())
+INSERT_BUNDLE = (
+    f"INSERT INTO bundles (version_id, category, {AB_COLUMNS}) "
+    f"VALUES (?, ?{', ?' * len(AB_FIELDS)})"
+)
+INSERT_PACK = (
+    f"INSERT INTO packs (version_id, {PACK_COLUMNS}) "
+    f"VALUES (?{', ?' * len(PACK_FIELDS)})"
+)
+
+
+def manifest_key(version: str, server: str) -> str:
+    """版本文件列表在数据库中的键，不同服务器的版本号可能相同"""
+    return version if server == DEFAULT_SERVER else f"{server}/{version}"
+
+
+def key_server(key: str) -> str:
+    """``manifest_key`` 的键所属的服务器"""
+    return key.split("/")[0] if "/" in key else DEFAULT_SERVER
+
+
+class ManifestDB:
+    """历代 hot_update_list 的本地 SQLite 数据库
+
+    每个版本的文件列表只解析一次并写入数据库，之后的版本比较、
+    资源首次出现版本、各类别更新量统计等查询都不再需要读取 JSON。
+
+    各服务器的版本（键见 ``manifest_key``）保存在同一个数据库中，
+    按版本先后比较的查询只在同一服务器的版本之间进行。
+    """
+
+    def __init__(self, path: Path = MANIFEST_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        # 多个服务器同时同步时在各自的线程中写入，写入的事务不能交错
+        self._write_lock = threading.Lock()
+        self._migrate()
+
+    def _migrate(self):
+        """为旧数据库补充 server 列，已有的版本按键推断服务器"""
+        columns = {r["name"] for r in self.conn.execute("PRAGMA table_info(versions)")}
+        with self.conn:
+            if "server" not in columns:
+                self.conn.execute("ALTER TABLE versions ADD COLUMN server TEXT")
+            rows = self.conn.execute(
+                "SELECT version_id FROM versions WHERE server IS NULL"
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE versions SET server = ? WHERE version_id = ?",
+                [(key_server(r[0]), r[0]) for r in rows],
+            )
+
+    def close(self):
+        self.conn.close()
+
+    # 写入
+
+    def has_version(self, version: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM versions WHERE version_id = ?", (version,)
+        ).fetchone()
+        return row is not None
+
+    def ingest(self, info: dict, version: str | None = None):
+        """写入一个版本的 hot_update_list
+
+        Args:
+            info (dict): hot_update_list.json 的内容
+            version (str | None, optional): 版本的键（见 ``manifest_key``），
+                默认取 ``versionId``. Defaults to None.
+        """
+        version = version or info["versionId"]
+        ab_rows = [
+            (version, category_of(i["name"]), *(i.get(k) for k in AB_FIELDS))
+            for i in info["abInfos"]
+        ]
+        pack_rows = [
+            (version, *(i.get(k) for k in PACK_FIELDS))
+            for i in info.get("packInfos", [])
+        ]
+
+        with self._write_lock, self.conn:
+            self.conn.execute("DELETE FROM bundles WHERE version_id = ?", (version,))
+            self.conn.execute("DELETE FROM packs WHERE version_id = ?", (version,))
+            self.conn.executemany(INSERT_BUNDLE, ab_rows)
+            self.conn.executemany(INSERT_PACK, pack_rows)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO versions "
+                "(version_id, manifest_name, manifest_version, ingested_at, server) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    version,
+                    info.get("manifestName"),
+                    info.get("manifestVersion"),
+                    int(time.time()),
+                    key_server(version),
+                ),
+            )
+
+    def ingest_file(self, file_path: Path):
+        with open(file_path, encoding="utf8") as file:
+            self.ingest(json.load(file), Path(file_path).stem)
+
+    def ingest_dir(self, dir_path: Path = DATAPATH / "hot_update_list") -> list[str]:
+        """写入目录中尚未入库的所有版本，返回新写入的版本号"""
+        ingested = []
+        for file_path in sorted(Path(dir_path).glob("*.json")):
+            if not self.has_version(file_path.stem):
+                print(f"导入版本文件列表 {file_path.name}")
+                self.ingest_file(file_path)
+                ingested.append(file_path.stem)
+        return ingested
+
+    # 读取
+
+    def versions(self, server: str | None = None) -> list[str]:
+        """已入库的版本，``server`` 为空时包括所有服务器"""
+        rows = self.conn.execute(
+            "SELECT version_id FROM versions WHERE :server IS NULL OR server = :server "
+            "ORDER BY server, version_id",
+            {"server": server},
+        )
+        return [r[0] for r in rows]
+
+    def ab_infos(self, version: str, prefix: str | None = None) -> list[dict]:
+        """以 hot_update_list 中 abInfos 的格式返回某版本的资源列表"""
+        sql = f"SELECT {AB_COLUMNS} FROM bundles WHERE version_id = ?"
+        params: tuple = (version,)
+        if prefix:
+            # name 前缀查询可以走主键索引
+            sql += " AND name >= ? AND name < ?"
+            params += (f"{prefix}/", f"{prefix}0")
+        sql += " ORDER BY cid"
+        return [_to_info(r, AB_FIELDS) for r in self.conn.execute(sql, params)]
+
+    def bundle(self, version: str, name: str) -> dict | None:
+        """某版本中一个资源的 abInfos 条目，不存在时返回 None"""
+        row = self.conn.execute(
+            f"SELECT {AB_COLUMNS} FROM bundles WHERE version_id = ? AND name = ?",
+            (version, name),
+        ).fetchone()
+        return _to_info(row, AB_FIELDS) if row else None
+
+    def pack_infos(self, version: str) -> list[dict]:
+        sql = f"SELECT {PACK_COLUMNS} FROM packs WHERE version_id = ? ORDER BY cid"
+        return [_to_info(r, PACK_FIELDS) for r in self.conn.execute(sql, (version,))]
+
+    # 查询
+
+    def diff(self, old: str, new: str) -> dict[str, list[dict]]:
+        """比较两个版本，返回新增、更新和删除的资源
+
+        每项包含 name、category、total_size 以及 size_delta（相对旧版本的大小变化）。
+        """
+        changed_sql = """
+            SELECT n.name, n.category, n.total_size,
+                   n.total_size - IFNULL(o.total_size, 0) AS size_delta,
+                   o.name IS NULL AS is_new
+            FROM bundles n
+            LEFT JOIN bundles o ON o.version_id = :old AND o.name = n.name
+            WHERE n.version_id = :new
+              AND (o.name IS NULL OR o.hash IS NOT n.hash OR o.md5 IS NOT n.md5)
+            ORDER BY n.name
+        """
+        removed_sql = """
+            SELECT o.name, o.category, o.total_size, -o.total_size AS size_delta
+            FROM bundles o
+            LEFT JOIN bundles n ON n.version_id = :new AND n.name = o.name
+            WHERE o.version_id = :old AND n.name IS NULL
+            ORDER BY o.name
+        """
+        params = {"old": old, "new": new}
+        result: dict[str, list[dict]] = {"new": [], "update": [], "removed": []}
+        for r in self.conn.execute(changed_sql, params):
+            row = dict(r)
+            result["new" if row.pop("is_new") else "update"].append(row)
+        result["removed"] = [dict(r) for r in self.conn.execute(removed_sql, params)]
+        return result
+
+    def first_seen(self, name: str, server: str = DEFAULT_SERVER) -> str | None:
+        """资源在某服务器上第一次出现的版本"""
+        row = self.conn.execute(
+            """
+            SELECT MIN(b.version_id) FROM bundles b
+            JOIN versions v ON v.version_id = b.version_id
+            WHERE b.name = ? AND v.server = ?
+            """,
+            (name, server),
+        ).fetchone()
+        return row[0]
+
+    def md5_size(self, md5: str) -> int | None:
+        """任一版本中 md5 为该值的资源大小，没有任何版本引用时返回 None"""
+        row = self.conn.execute(
+            "SELECT total_size FROM bundles WHERE md5 = ? LIMIT 1", (md5,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def history(self, name: str, server: str | None = None) -> list[dict]:
+        """资源在各版本中 md5 发生变化的记录，各服务器分别比较
+
+        ``server`` 为空时包括所有服务器。
+        """
+        rows = self.conn.execute(
+            """
+            SELECT server, version_id, hash, md5, total_size FROM (
+                SELECT v.server, b.version_id, b.hash, b.md5, b.total_size,
+                       LAG(b.md5) OVER (
+                           PARTITION BY v.server ORDER BY b.version_id
+                       ) AS prev_md5
+                FROM bundles b
+                JOIN versions v ON v.version_id = b.version_id
+                WHERE b.name = :name AND (:server IS NULL OR v.server = :server)
+            ) WHERE prev_md5 IS NULL OR prev_md5 IS NOT md5
+            ORDER BY server, version_id
+            """,
+            {"name": name, "server": server},
+        )
+        return [dict(r) for r in rows]
+
+    def category_bytes(self, server: str | None = None) -> list[dict]:
+        """同一服务器相邻两个已入库版本之间，每个类别新增和更新的资源数量与字节数
+
+        ``server`` 为空时包括所有服务器。
+        """
+        rows = self.conn.execute(
+            """
+            WITH v AS (
+                SELECT server, version_id,
+                       LAG(version_id) OVER (
+                           PARTITION BY server ORDER BY version_id
+                       ) AS prev
+                FROM versions
+                WHERE :server IS NULL OR server = :server
+            )
+            SELECT v.server, v.version_id, n.category,
+                   COUNT(*) AS bundles, SUM(n.total_size) AS bytes
+            FROM v
+            JOIN bundles n ON n.version_id = v.version_id
+            LEFT JOIN bundles o ON o.version_id = v.prev AND o.name = n.name
+            WHERE v.prev IS NOT NULL
+              AND (o.name IS NULL OR o.hash IS NOT n.hash OR o.md5 IS NOT n.md5)
+            GROUP BY v.server, v.version_id, n.category
+            ORDER BY v.server, v.version_id, bytes DESC
+            """,
+            {"server": server},
+        )
+        return [dict(r) for r in rows]
+
+
+def _to_info(row: sqlite3.Row, fields: dict[str, str]) -> dict:
+    # 与原始 JSON 一致，省略为空的字段
+    return {k: row[c] for k, c in fields.items() if row[c] is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询历代资源列表")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    parser.add_argument(
+        "--server",
+        help="只查询该服务器；first-seen 默认为默认服务器，其余默认为所有服务器",
+    )
+    sub.add_parser("ingest", help="导入 hot_update_list 目录中的新版本")
+    sub.add_parser("versions", help="列出已导入的版本")
+    p = sub.add_parser("diff", help="比较两个版本")
+    p.add_argument("old")
+    p.add_argument("new")
+    p = sub.add_parser("first-seen", help="资源首次出现的版本")
+    p.add_argument("name")
+    p = sub.add_parser("history", help="资源的变更历史")
+    p.add_argument("name")
+    sub.add_parser("category-bytes", help="各版本每个类别的更新量")
+    args = parser.parse_args()
+
+    db = ManifestDB()
+    if args.cmd == "ingest":
+        result = db.ingest_dir()
+    elif args.cmd == "versions":
+        result = db.versions(args.server)
+    elif args.cmd == "diff":
+        result = db.diff(args.old, args.new)
+    elif args.cmd == "first-seen":
+        result = db.first_seen(args.name, args.server or DEFAULT_SERVER)
+    elif args.cmd == "history":
+        result = db.history(args.name, args.server)
+    else:
+        result = db.category_bytes(args.server)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# 默认生成的资源类别
+MOCK_CATEGORIES = ["avg/characters", "avg/imgs", "chararts", "skinpack", "activity"]
+
+
+def _dat_name(name: str) -> str:
+    return f"{Path(name).with_suffix('').as_posix().replace('/', '_')}.dat"
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def build_fixture(
+    version: str = "mock-version",
+    files: int = 64,
+    file_size: int = 256 * 1024,
+    seed: int = 0,
+    pack_files: int = 0,
+    anon_files: int = 4,
+) -> tuple[dict, dict[str, bytes]]:
+    """生成假的资源列表和资源文件
+
+    与真实资源一样，每个 ``.dat`` 是只含一个成员（资源本身，压缩存储）的 zip，
+    abInfos 中的 ``md5``、``totalSize`` 为 ``.dat`` 的值，
+    ``abSize`` 为成员解压后的大小。
+    成员内容为随机字节（不可压缩），大小在 ``file_size`` 的 0.5~1.5 倍之间。
+
+    ``pack_files`` 大于 0 时，每连续 ``pack_files`` 个资源另外打成一个包
+    （``lpack_mock<序号>.dat``），包中直接存放各个资源（而不是它们的 ``.dat``），
+    与真实的 packInfos 一样 ``hash``、``md5`` 为空。
+
+    另外生成 ``anon_files`` 个 anon 资源（``anon/<32 位十六进制>.bin``），与真实资源一样
+    ``hash`` 和 ``md5`` 只有 4 位，且最后两个相同。
+
+    Returns:
+        tuple[dict, dict[str, bytes]]: (hot_update_list, 文件名 -> .dat 内容)
+    """
+    rng = random.Random(seed)
+    ab_infos = []
+    payloads = {}
+    contents = {}
+    for i in range(files):
+        category = MOCK_CATEGORIES[i % len(MOCK_CATEGORIES)]
+        name = f"{category}/mock_{i:05d}.ab"
+        size = max(1, int(file_size * rng.uniform(0.5, 1.5)))
+        contents[name] = rng.randbytes(size)
+
+        data = _zip({name: contents[name]})
+        payloads[_dat_name(name)] = data
+        ab_infos.append(
+            {
+                "name": name,
+                "hash": hashlib.md5(name.encode() + version.encode()).hexdigest(),
+                "md5": hashlib.md5(data).hexdigest(),
+                "totalSize": len(data),
+                "abSize": size,
+                "cid": i,
+            }
+        )
+
+    for i in range(anon_files):
+        name = f"anon/{rng.randbytes(16).hex()}.bin"
+        size = max(1, int(file_size * rng.uniform(0.5, 1.5)))
+        data = _zip({name: rng.randbytes(size)})
+        short_md5 = hashlib.md5(data).hexdigest()[:4]
+        if i == anon_files - 1 and i > 0:
+            short_md5 = ab_infos[-1]["md5"]
+
+        payloads[_dat_name(name)] = data
+        ab_infos.append(
+            {
+                "name": name,
+                "hash": short_md5,
+                "md5": short_md5,
+                "totalSize": len(data),
+                "abSize": size,
+                "cid": len(ab_infos),
+                "cat": 1,
+                "meta": 1,
+            }
+        )
+
+    pack_infos = []
+    for start in range(0, files, pack_files) if pack_files else ():
+        pack_name = f"lpack_mock{len(pack_infos):03d}"
+        members = ab_infos[start : start + pack_files]
+        for info in members:
+            info["pid"] = pack_name
+        data = _zip({info["name"]: contents[info["name"]] for info in members})
+
+        payloads[f"{pack_name}.dat"] = data
+        pack_infos.append(
+            {
+                "name": pack_name,
+                "hash": "",
+                "md5": "",
+                "totalSize": len(data),
+                "abSize": 0,
+                "cid": len(ab_infos) + len(pack_infos),
+            }
+        )
+
+    hot_update_list = {
+        "versionId": version,
+        "abInfos": ab_infos,
+        "manifestName": "mock.idx",
+        "manifestVersion": "mock",
+        "packInfos": pack_infos,
+    }
+    return hot_update_list, payloads
+
+
+class MockCDN:
+    """本地模拟的版本接口和资源服务器，用于离线测试和性能测试
+
+    提供的地址（``base_url`` 为 ``http://127.0.0.1:<port>``）：
+
+    - ``/version``：``{"resVersion", "clientVersion"}``
+    - ``/assets/<version>/hot_update_list.json``
+    - ``/assets/<version>/<资源>.dat``，支持 Range
+    - ``/__stats``：连接数、请求数、注入的错误数和发送的字节数
+
+    Args:
+        version (str, optional): 资源版本号.
+        files (int, optional): 资源文件数.
+        file_size (int, optional): 平均资源大小（字节）.
+        latency (float, optional): 每个请求返回前的延迟（秒）.
+        bandwidth (float | None, optional): 单个连接的带宽上限（字节/秒）.
+        error_rate (float, optional): 资源请求返回 ``error_status`` 的概率.
+        error_status (int, optional): 注入的错误状态码，如 503、429.
+        tail_rate (float, optional): 资源请求额外延迟 ``tail_latency`` 秒的概率，
+            模拟慢节点.
+        tail_latency (float, optional): 长尾请求的额外延迟（秒）.
+        range_support (bool, optional): 是否支持 Range，不支持时总是返回完整内容.
+        seed (int, optional): 随机种子，相同参数生成相同的文件.
+        pack_files (int, optional): 每个包中的资源数，为 0 时不生成包，
+            见 ``build_fixture``.
+        anon_files (int, optional): anon 资源数，见 ``build_fixture``.
+    """
+
+    def __init__(
+        self,
+        version: str = "mock-version",
+        files: int = 64,
+        file_size: int = 256 * 1024,
+        latency: float = 0.0,
+        bandwidth: float | None = None,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        tail_rate: float = 0.0,
+        tail_latency: float = 0.0,
+        range_support: bool = True,
+        seed: int = 0,
+        pack_files: int = 0,
+        anon_files: int = 4,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.version = version
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.range_support = range_support
+        self.hot_update_list, self.payloads = build_fixture(
+            version, files, file_size, seed, pack_files, anon_files
+        )
+        self.list_body = json.dumps(self.hot_update_list).encode()
+        self.version_body = json.dumps(
+            {"resVersion": version, "clientVersion": "0.0.0"}
+        ).encode()
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "errors": 0, "bytes_sent": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def version_url(self) -> str:
+        return f"{self.base_url}/version"
+
+    @property
+    def assets_url(self) -> str:
+        """与 ``config.ak_assets_url`` 中各服务器格式相同的地址模板"""
+        return f"{self.base_url}/assets/{{}}"
+
+    def start(self) -> "MockCDN":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _handler_class(self):
+        cdn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # 保持连接，连接数才能反映客户端的连接复用情况
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                cdn._count("connections")
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                cdn._count("requests")
+                path = urlsplit(self.path).path
+                if cdn.latency:
+                    time.sleep(cdn.latency)
+
+                if path == "/__stats":
+                    with cdn._lock:
+                        body = json.dumps(cdn.stats).encode()
+                    return self._send(200, body, "application/json")
+                if path == "/version":
+                    return self._send_json(cdn.version_body)
+
+                prefix = f"/assets/{cdn.version}/"
+                if not path.startswith(prefix):
+                    return self._send(404, b"")
+                name = path[len(prefix) :]
+                if name == "hot_update_list.json":
+                    return self._send_json(cdn.list_body)
+
+                data = cdn.payloads.get(name)
+                if data is None:
+                    return self._send(404, b"")
+                if cdn.error_rate and cdn._roll(cdn.error_rate):
+                    cdn._count("errors")
+                    return self._send(cdn.error_status, b"")
+                if cdn.tail_rate and cdn._roll(cdn.tail_rate):
+                    time.sleep(cdn.tail_latency)
+
+                start = 0
+                m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if cdn.range_support and m and int(m[1]) < len(data):
+                    start = int(m[1])
+                    end = int(m[2]) + 1 if m[2] else len(data)
+                    headers = {
+                        "Content-Range": f"bytes {start}-{end - 1}/{len(data)}"
+                    }
+                    return self._send(
+                        206,
+                        memoryview(data)[start:end],
+                        "application/octet-stream",
+                        headers,
+                    )
+                self._send(200, memoryview(data), "application/octet-stream")
+
+            def _send_json(self, body: bytes):
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", headers={"ETag": etag})
+                self._send(200, body, "application/json", {"ETag": etag})
+
+            def _send(self, status, body, content_type="text/plain", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if cdn.range_support:
+                    self.send_header("Accept-Ranges", "bytes")
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if status == 304:
+                    return
+
+                # 按带宽上限分块发送
+                chunk = 64 * 1024
+                if cdn.bandwidth:
+                    chunk = max(1024, min(chunk, int(cdn.bandwidth / 20)))
+                try:
+                    for i in range(0, len(body), chunk):
+                        part = body[i : i + chunk]
+                        self.wfile.write(part)
+                        cdn._count("bytes_sent", len(part))
+                        if cdn.bandwidth:
+                            time.sleep(len(part) / cdn.bandwidth)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+        return Handler
+
+
+def _serve(kwargs: dict, conn):
+    with MockCDN(**kwargs) as cdn:
+        conn.send(cdn.base_url)
+        conn.recv()
+
+
+class MockCDNProcess:
+    """在子进程中运行 ``MockCDN``，避免服务器占用测试进程的 CPU 和内存统计
+
+    参数与 ``MockCDN`` 相同，统计数据通过 ``/__stats`` 获取::
+
+        with MockCDNProcess(files=128, latency=0.05) as cdn:
+            url = f"{cdn.assets_url.format(cdn.version)}/..."
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.version = kwargs.get("version", "mock-version")
+        self.base_url = ""
+        self._conn = None
+        self._process: multiprocessing.Process | None = None
+
+    @property
+    def version_url(self) -> str:
+        return f"{self.base_url}/version"
+
+    @property
+    def assets_url(self) -> str:
+        return f"{self.base_url}/assets/{{}}"
+
+    @property
+    def stats_url(self) -> str:
+        return f"{self.base_url}/__stats"
+
+    def start(self) -> "MockCDNProcess":
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.kwargs, child), daemon=True
+        )
+        self._process.start()
+        self.base_url = self._conn.recv()
+        return self
+
+    def stop(self):
+        assert self._process
+        assert self._conn
+        self._conn.send(None)
+        self._process.join(5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的资源服务器")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--version", default="mock-version")
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--file-size", type=int, default=256 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0, help="秒")
+    parser.add_argument("--bandwidth", type=float, default=None, help="单连接字节/秒")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="秒")
+    parser.add_argument("--no-range", action="store_true")
+    args = parser.parse_args()
+
+    cdn = MockCDN(
+        version=args.version,
+        files=args.files,
+        file_size=args.file_size,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        range_support=not args.no_range,
+        port=args.port,
+    )
+    print(f"版本接口：{cdn.version_url}")
+    print(f"资源地址：{cdn.assets_url}")
+    try:
+        cdn.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cdn.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
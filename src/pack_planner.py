@@ -0,0 +1,125 @@
+import shutil
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+
+from config import DOWNLOAD_CHUNK_SIZE, PACK_REQUEST_OVERHEAD
+
+
+def plan_fetch(
+    entries: list[dict],
+    pack_infos: list[dict],
+    request_overhead: int = PACK_REQUEST_OVERHEAD,
+) -> dict:
+    """为需要下载的资源选择按文件下载还是按包（packInfos）下载
+
+    每次请求的固定开销（握手、首字节延迟等）折算为 ``request_overhead`` 字节，
+    对每个包比较“逐个下载其中需要的文件”和“下载整个包”的估算成本，取较小者。
+
+    Args:
+        entries (list[dict]): 需要下载的 abInfos 条目
+        pack_infos (list[dict]): 当前版本的 packInfos
+        request_overhead (int, optional): 单次请求的开销.
+            Defaults to PACK_REQUEST_OVERHEAD.
+
+    Returns:
+        dict: ``{"files": [...], "packs": [{"pack": ..., "entries": [...]}],
+        "file_bytes", "pack_bytes", "cost", "per_file_cost"}``
+    """
+    packs = {p["name"]: p for p in pack_infos}
+    groups: dict[str, list[dict]] = defaultdict(list)
+    files = []
+
+    for info in entries:
+        pid = info.get("pid")
+        if pid in packs and packs[pid].get("totalSize"):
+            groups[pid].append(info)
+        else:
+            files.append(info)
+
+    plan_packs = []
+    for pid, group in groups.items():
+        file_cost = sum(i["totalSize"] for i in group) + len(group) * request_overhead
+        pack_cost = packs[pid]["totalSize"] + request_overhead
+        if pack_cost < file_cost:
+            plan_packs.append({"pack": packs[pid], "entries": group})
+        else:
+            files.extend(group)
+
+    file_bytes = sum(i["totalSize"] for i in files)
+    pack_bytes = sum(p["pack"]["totalSize"] for p in plan_packs)
+    return {
+        "files": files,
+        "packs": plan_packs,
+        "file_bytes": file_bytes,
+        "pack_bytes": pack_bytes,
+        "cost": file_bytes
+        + pack_bytes
+        + (len(files) + len(plan_packs)) * request_overhead,
+        "per_file_cost": sum(i["totalSize"] for i in entries)
+        + len(entries) * request_overhead,
+    }
+
+
+def extract_pack_members(
+    pack_file: Path, targets: list[tuple[dict, Path]]
+) -> list[str]:
+    """从下载的包中取出需要的资源，每个资源单独保存为一个 zip
+
+    包中的成员是资源本身（``.ab`` 等），与按文件下载得到的 ``.dat`` 中的唯一成员相同。
+    取出的成员重新打包为只有一个成员的 zip（不做二次压缩），``util.extract_package``
+    可以直接读取；因此文件的 md5 和大小与 abInfos 中的 ``md5``、``totalSize`` 不同，
+    改为校验成员大小与 ``abSize`` 一致，读取时 zipfile 会校验 CRC。
+
+    Args:
+        pack_file (Path): 包文件
+        targets (list[tuple[dict, Path]]): (abInfos 条目, 保存路径)
+
+    Returns:
+        list[str]: 包中找不到或校验失败的资源名，需要逐个下载
+    """
+    failed = []
+    with zipfile.ZipFile(pack_file) as pack:
+        members = {i.filename: i for i in pack.infolist()}
+        for info, out_file in targets:
+            member = members.get(info["name"])
+            size = info.get("abSize")
+            if member is None or (size is not None and member.file_size != size):
+                failed.append(info["name"])
+                continue
+
+            out_file.parent.mkdir(parents=True, exist_ok=True)
+            part_file = out_file.with_name(out_file.name + ".part")
+            zinfo = zipfile.ZipInfo(member.filename, member.date_time)
+            zinfo.file_size = member.file_size
+            try:
+                with pack.open(member) as src, zipfile.ZipFile(
+                    part_file, "w", zipfile.ZIP_STORED
+                ) as dst, dst.open(zinfo, "w") as wf:
+                    shutil.copyfileobj(src, wf, DOWNLOAD_CHUNK_SIZE)
+            except zipfile.BadZipFile as e:
+                # CRC 不符
+                print(f"包中的 {info['name']} 已损坏：{e}")
+                part_file.unlink()
+                failed.append(info["name"])
+                continue
+            part_file.replace(out_file)
+    return failed
+
+
+def verify_repacked(path: Path, name: str, ab_size: int | None) -> bool:
+    """检查 ``extract_pack_members`` 重新打包的资源是否完整
+
+    只有一个名为 ``name`` 的成员，解压后大小等于 ``ab_size``（已知时），且 CRC 正确。
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            members = zf.infolist()
+            return (
+                len(members) == 1
+                and members[0].filename == name
+                and ab_size in (None, members[0].file_size)
+                and zf.testzip() is None
+            )
+    except (OSError, zipfile.BadZipFile):
+        return False
@@ -0,0 +1,243 @@
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from avg_export import gen_avg_chararts
+from config import (
+    EXPORT_QUEUE_SIZE,
+    EXPORT_WORKERS,
+    IMAGE_CODEC,
+    IMAGE_PNG_COMPRESS_LEVEL,
+    IMAGE_WEBP_METHOD,
+)
+from download_res import ResourceSyncer
+from encoder import ImageEncoder, format_stats, merge_stats
+from scheduler import cli_progress
+from unpack_cache import UnpackCache
+from unpacker import ArkMediaUnPacker
+from util import open_package
+
+
+def _unpack(
+    bundle: str,
+    output_path: str,
+    types: list[str] | None,
+    names: list[str] | None,
+    codec: str,
+    use_cache: bool,
+    in_memory: bool = False,
+) -> dict:
+    """解包资源，相同内容和选项的资源直接使用解包缓存
+
+    内存模式下图片不写入文件，因此未命中时不保存到缓存。
+    """
+    cache = key = None
+    if use_cache:
+        cache = UnpackCache()
+        options = {
+            "types": sorted(types) if types else None,
+            "names": names,
+            "codec": codec,
+            "png_compress_level": IMAGE_PNG_COMPRESS_LEVEL,
+            "webp_method": IMAGE_WEBP_METHOD,
+        }
+        key = cache.key(cache.bundle_md5(Path(bundle)), options)
+        if (result := cache.load(key, output_path)) is not None:
+            cache.close()
+            return result
+
+    with ImageEncoder(codec) as encoder, open_package(Path(bundle)) as ab:
+        unpacker = ArkMediaUnPacker(ab, output_path, encoder, in_memory=in_memory)
+        result = unpacker.export_avg_chararts(types, names)
+
+    if cache and key:
+        if not in_memory:
+            cache.save(key, result)
+            cache.evict()
+        cache.close()
+    return result
+
+
+def export_avg_bundle(
+    bundle: str,
+    output_path: str,
+    types: list[str] | None = None,
+    names: list[str] | None = None,
+    codec: str = IMAGE_CODEC,
+    use_cache: bool = True,
+    in_memory: bool = False,
+) -> dict:
+    """解包一个 avg/characters 资源并生成人物差分（在工作进程中运行）
+
+    ``types`` 和 ``names`` 用于只处理部分对象，见 ``ArkMediaUnPacker.iter_objects``；
+    ``codec`` 为解包图片的编码格式，见 ``encoder.CODEC_EXT``；
+    ``use_cache`` 为真时使用 ``UnpackCache``；
+    ``in_memory`` 为真时解包的图片不写入文件，直接在内存中生成差分.
+
+    Returns:
+        dict: ``outputs`` 为生成图片的路径，``encode`` 为图片编码统计，
+        ``cached`` 表示是否使用了解包缓存
+    """
+    unpack_info = _unpack(
+        bundle, output_path, types, names, codec, use_cache, in_memory
+    )
+    outputs = [str(p) for p in gen_avg_chararts(unpack_info)]
+    return {
+        "outputs": outputs,
+        "encode": unpack_info["encode"],
+        "cached": unpack_info.get("cached", False),
+    }
+
+
+def unpack_bundle(
+    bundle: str,
+    output_path: str,
+    types: list[str] | None = None,
+    names: list[str] | None = None,
+    codec: str = IMAGE_CODEC,
+    use_cache: bool = True,
+) -> dict:
+    """只解包资源中的图片和音频（在工作进程中运行）
+
+    Returns:
+        dict: ``outputs`` 为解包目录，``encode`` 为图片编码统计，
+        ``cached`` 表示是否使用了解包缓存
+    """
+    unpack_info = _unpack(bundle, output_path, types, names, codec, use_cache)
+    return {
+        "outputs": [str(unpack_info["output_path"])],
+        "encode": unpack_info["encode"],
+        "cached": unpack_info.get("cached", False),
+    }
+
+
+# 资源类别 -> 处理函数，未列出的类别只解包
+EXPORTERS = {"avg/characters": export_avg_bundle}
+
+
+class ExportPipeline:
+    """下载 -> 解包 -> 导出流水线
+
+    作为 ``ResourceSyncer`` 的 ``on_bundle`` 使用，每下载完成一个所选类别的资源，
+    就交给进程池解包和导出，与其余资源的下载同时进行::
+
+        async with (
+            ExportPipeline() as pipeline,
+            ResourceSyncer(on_bundle=pipeline.submit) as syncer,
+        ):
+            await syncer.sync_categories()
+
+    等待处理的资源数不超过 ``queue_size``，队列满时 ``submit`` 会等待，
+    下载因此暂停，避免解包跟不上时积压。
+
+    Args:
+        output_path (str, optional): 输出目录. Defaults to "out/".
+        categories (list[str], optional): 需要处理的资源类别（前缀匹配）.
+        workers (int | None, optional): 工作进程数，为空时等于 CPU 核数.
+        queue_size (int, optional): 已提交但尚未完成的资源数上限.
+    """
+
+    def __init__(
+        self,
+        output_path: str = "out/",
+        categories: list[str] | None = None,
+        workers: int | None = EXPORT_WORKERS,
+        queue_size: int = EXPORT_QUEUE_SIZE,
+    ):
+        self.output_path = output_path
+        self.categories = categories or list(EXPORTERS)
+        self.workers = workers
+        self.queue_size = queue_size
+
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._pending: set[asyncio.Future] = set()
+        self.outputs: list[str] = []
+        self.errors: list[str] = []
+        self.encode_stats: dict = {}
+
+    async def __aenter__(self):
+        self._pool = ProcessPoolExecutor(self.workers)
+        self._slots = asyncio.Semaphore(self.queue_size)
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self.join()
+        finally:
+            assert self._pool
+            self._pool.shutdown(cancel_futures=exc[0] is not None)
+            self._pool = None
+
+    def wants(self, category: str) -> bool:
+        return any(
+            category == c or category.startswith(f"{c}/") for c in self.categories
+        )
+
+    def _exporter(self, category: str):
+        for prefix, func in EXPORTERS.items():
+            if category == prefix or category.startswith(f"{prefix}/"):
+                return func
+        return unpack_bundle
+
+    async def submit(self, bundle: Path, category: str):
+        """提交一个已下载完成的资源，不属于所选类别时忽略"""
+        if not self.wants(category):
+            return
+        assert self._pool, "请在 async with 中使用 ExportPipeline"
+        assert self._slots, "请在 async with 中使用 ExportPipeline"
+
+        await self._slots.acquire()
+        fut = asyncio.get_running_loop().run_in_executor(
+            self._pool, self._exporter(category), str(bundle), self.output_path
+        )
+        self._pending.add(fut)
+        fut.add_done_callback(lambda f: self._on_done(f, bundle))
+
+    def _on_done(self, fut: Future, bundle: Path):
+        assert self._slots
+        self._pending.discard(fut)
+        self._slots.release()
+        if fut.cancelled():
+            return
+        if e := fut.exception():
+            print(f"处理{bundle.name}时出错：{e}")
+            self.errors.append(bundle.name)
+        else:
+            print(f"{bundle.name} 处理完成")
+            result = fut.result()
+            self.outputs.extend(result["outputs"])
+            merge_stats(self.encode_stats, result["encode"])
+
+    async def join(self) -> dict:
+        """等待已提交的资源全部处理完
+
+        Returns:
+            dict: 生成的文件数、出错的资源和图片编码统计
+        """
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        return {
+            "outputs": len(self.outputs),
+            "errors": list(self.errors),
+            "encode": self.encode_stats,
+        }
+
+
+async def main():
+    async with ExportPipeline() as pipeline, ResourceSyncer(
+        on_bundle=pipeline.submit, listeners=[cli_progress]
+    ) as syncer:
+        syncer.check_version()
+        await syncer.sync_categories()
+        stats = await pipeline.join()
+
+    print(f"共生成 {stats['outputs']} 个文件")
+    for line in format_stats(stats["encode"]):
+        print(line)
+    for name in stats["errors"]:
+        print(name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
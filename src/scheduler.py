@@ -0,0 +1,285 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from config import DOWNLOAD_MAX_CONNECTIONS, DOWNLOAD_PRIORITIES
+from downloader import DownloadCancelled, ProgressHook
+
+# 任务的执行函数，接收进度回调，返回是否成功
+JobRunner = Callable[[ProgressHook], Awaitable[bool]]
+# 进度事件监听函数
+Listener = Callable[[dict], None]
+
+
+class RateLimiter:
+    """令牌桶限速，所有下载共享同一个带宽上限"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def consume(self, n: int):
+        async with self._lock:
+            now = time.monotonic()
+            refill = (now - self.updated) * self.rate
+            self.tokens = min(self.rate, self.tokens + refill)
+            self.updated = now
+            self.tokens -= n
+            if self.tokens < 0:
+                await asyncio.sleep(-self.tokens / self.rate)
+
+
+def get_priority(category: str, priorities: dict[str, int]) -> int:
+    """按最长匹配的目录前缀取优先级，数值越小越先下载"""
+    best, best_len = priorities.get("", 5), 0
+    for prefix, priority in priorities.items():
+        matched = category == prefix or category.startswith(f"{prefix}/")
+        if matched and len(prefix) > best_len:
+            best, best_len = priority, len(prefix)
+    return best
+
+
+class DownloadScheduler:
+    """下载调度器
+
+    按优先级类别和文件大小排序下载任务，可选全局限速和协作式取消，
+    并以字典形式发出进度事件，供 GUI 和命令行进度条使用：
+
+    - ``{"type": "file", "name", "category", "size", "state"}``：
+      state 为 queued / running / done / failed / cancelled
+    - ``{"type": "progress", "bytes_done", "bytes_total", "files_done",
+      "files_failed", "files_total", "speed", "eta"}``：定时汇总，speed 单位为字节/秒
+
+    Args:
+        order (str, optional): 同一优先级内 ``smallest`` 小文件优先
+            或 ``largest`` 大文件优先.
+        priorities (dict[str, int] | None, optional): 类别前缀 -> 优先级.
+        bandwidth_limit (float | None, optional): 全局带宽上限（字节/秒）.
+        workers (int, optional): 同时运行的任务数.
+        listeners (list[Listener] | None, optional): 进度事件监听函数.
+    """
+
+    def __init__(
+        self,
+        order: str = "smallest",
+        priorities: dict[str, int] | None = None,
+        bandwidth_limit: float | None = None,
+        workers: int = DOWNLOAD_MAX_CONNECTIONS,
+        listeners: list[Listener] | None = None,
+        report_interval: float = 0.5,
+    ):
+        if order not in ("smallest", "largest"):
+            raise ValueError(f"未知的排序方式: {order}")
+
+        self.order = order
+        self.priorities = DOWNLOAD_PRIORITIES if priorities is None else priorities
+        self.bandwidth_limit = bandwidth_limit
+        self.workers = workers
+        self.listeners = listeners or []
+        self.report_interval = report_interval
+
+        self.jobs: list[dict] = []
+        self._cancelled = threading.Event()
+        self._limiter: RateLimiter | None = None
+        self._received: dict[int, int] = {}
+        self._transferred = 0
+        self._samples: deque[tuple[float, int]] = deque(maxlen=20)
+        self.elapsed = 0.0
+        self.stats = {"files_done": 0, "files_failed": 0, "files_cancelled": 0}
+
+    def add(self, name: str, category: str, size: int, run: JobRunner):
+        """添加任务
+
+        Args:
+            name (str): 任务名（用于显示）
+            category (str): 资源类别，决定优先级
+            size (int): 预计字节数
+            run (JobRunner): 执行函数
+        """
+        job = {
+            "id": len(self.jobs),
+            "name": name,
+            "category": category,
+            "size": size or 0,
+            "priority": get_priority(category, self.priorities),
+            "run": run,
+            "state": "queued",
+        }
+        self.jobs.append(job)
+
+    def cancel(self):
+        """取消尚未完成的下载，可在其他线程中调用"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def bytes_total(self) -> int:
+        return sum(j["size"] for j in self.jobs)
+
+    @property
+    def bytes_done(self) -> int:
+        return sum(self._received.values())
+
+    @property
+    def bytes_transferred(self) -> int:
+        """实际从网络接收的字节数，不含已存在或续传的部分"""
+        return self._transferred
+
+    def _emit(self, event: dict):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"进度监听出错：{e}")
+
+    def _set_state(self, job: dict, state: str):
+        job["state"] = state
+        self._emit(
+            {
+                "type": "file",
+                "name": job["name"],
+                "category": job["category"],
+                "size": job["size"],
+                "state": state,
+            }
+        )
+
+    def progress(self) -> dict:
+        # 速度只按实际从网络接收的字节计算，不含已存在或续传的部分
+        now = time.monotonic()
+        done = self.bytes_done
+        self._samples.append((now, self._transferred))
+        t0, b0 = self._samples[0]
+        speed = (self._transferred - b0) / (now - t0) if now > t0 else 0.0
+        remaining = max(self.bytes_total - done, 0)
+        return {
+            "type": "progress",
+            "bytes_done": done,
+            "bytes_total": self.bytes_total,
+            "files_done": self.stats["files_done"],
+            "files_failed": self.stats["files_failed"],
+            "files_total": len(self.jobs),
+            "speed": speed,
+            "eta": remaining / speed if speed > 0 else None,
+        }
+
+    def _hook(self, job: dict) -> ProgressHook:
+        async def on_progress(received: int):
+            if self._cancelled.is_set():
+                raise DownloadCancelled(job["name"])
+
+            last = self._received.get(job["id"])
+            self._received[job["id"]] = received
+            if last is None:
+                # 第一次回调是续传前已有的字节数
+                return
+            if received < last:
+                # 重试时从头（或从续传位置）重新下载：已完成的进度回退，
+                # 之前接收的字节确实经过了网络，保留在 bytes_transferred 中
+                return
+
+            delta = received - last
+            if delta > 0:
+                self._transferred += delta
+                if self._limiter is not None:
+                    await self._limiter.consume(delta)
+
+        return on_progress
+
+    async def _worker(self, queue: deque):
+        while queue and not self._cancelled.is_set():
+            job = queue.popleft()
+            self._set_state(job, "running")
+            try:
+                ok = await job["run"](self._hook(job))
+            except DownloadCancelled:
+                self.stats["files_cancelled"] += 1
+                self._set_state(job, "cancelled")
+                continue
+            except Exception as e:
+                print(f"{job['name']} 出错：{e}")
+                ok = False
+
+            if ok:
+                # 已存在或从本地存储链接的文件没有进度回调，按完成计入
+                self._received[job["id"]] = max(
+                    self._received.get(job["id"], 0), job["size"]
+                )
+                self.stats["files_done"] += 1
+                self._set_state(job, "done")
+            else:
+                self.stats["files_failed"] += 1
+                self._set_state(job, "failed")
+
+    async def _reporter(self):
+        while True:
+            self._emit(self.progress())
+            await asyncio.sleep(self.report_interval)
+
+    async def run(self) -> dict:
+        """执行所有任务
+
+        Returns:
+            dict: 完成、失败、取消的任务数
+        """
+        if self.bandwidth_limit:
+            self._limiter = RateLimiter(self.bandwidth_limit)
+
+        sign = 1 if self.order == "smallest" else -1
+        queue = deque(
+            sorted(self.jobs, key=lambda j: (j["priority"], sign * j["size"]))
+        )
+        for job in queue:
+            self._set_state(job, "queued")
+
+        reporter = asyncio.create_task(self._reporter())
+        start = time.monotonic()
+        try:
+            await asyncio.gather(
+                *(self._worker(queue) for _ in range(max(1, self.workers)))
+            )
+        finally:
+            self.elapsed = time.monotonic() - start
+            reporter.cancel()
+
+        # 取消后未开始的任务
+        for job in queue:
+            self.stats["files_cancelled"] += 1
+            self._set_state(job, "cancelled")
+        self._emit(self.progress())
+        return dict(self.stats)
+
+
+def format_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def cli_progress(event: dict):
+    """命令行进度条监听函数"""
+    if event["type"] != "progress":
+        return
+
+    total = event["bytes_total"] or 1
+    ratio = min(event["bytes_done"] / total, 1.0)
+    bar = "#" * int(ratio * 30)
+    sys.stdout.write(
+        f"\r[{bar:<30}] {ratio * 100:5.1f}% "
+        f"{event['files_done']}/{event['files_total']} "
+        f"{event['speed'] / 2**20:6.2f} MB/s ETA {format_eta(event['eta'])}"
+    )
+    if event["files_done"] + event["files_failed"] >= event["files_total"]:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import os
+import shutil
+from pathlib import Path
+
+from config import BUNDLE_STORE_PATH
+from downloader import ArkDownloader, ProgressHook, full_md5
+
+
+class BundleStore:
+    """以 manifest 中的 md5 为键的内容寻址存储
+
+    每个资源文件只在 ``objects/<md5 前两位>/<md5>.zip`` 保存一份，
+    各版本目录下的文件都是指向它的硬链接（文件系统不支持时退化为复制），
+    因此 md5 没有变化的资源在不同版本、不同服务器之间不会重复下载和占用空间。
+    多个服务器同时同步时，同一个 md5 正在下载的对象只下载一次，其余请求等待其完成。
+
+    md5 不完整的资源（anon 资源只有 4 位，见 ``downloader.full_md5``）不放入存储，
+    直接下载到版本目录中的路径。
+    """
+
+    def __init__(self, root: Path = BUNDLE_STORE_PATH):
+        self.root = Path(root)
+        self._inflight: dict[str, asyncio.Event] = {}
+
+    def object_path(self, md5: str) -> Path:
+        md5 = md5.lower()
+        return self.root / md5[:2] / f"{md5}.zip"
+
+    def has(self, md5: str) -> bool:
+        return full_md5(md5) is not None and self.object_path(md5).exists()
+
+    def link(self, md5: str, dest: Path):
+        """把存储中的对象放到 ``dest``"""
+        src = self.object_path(md5)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            dest.unlink()
+
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+
+    async def fetch(
+        self,
+        downloader: ArkDownloader,
+        url: str,
+        md5: str,
+        size: int | None,
+        dest: Path,
+        on_progress: ProgressHook | None = None,
+    ) -> bool:
+        """确保对象存在于存储中并链接到 ``dest``
+
+        Returns:
+            bool: 是否实际发生了下载
+        """
+        if full_md5(md5) is None:
+            await downloader.fetch(url, dest, None, size, on_progress)
+            return True
+
+        obj = self.object_path(md5)
+        key = md5.lower()
+        downloaded = False
+        while not obj.exists():
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                # 其他服务器正在下载相同内容，失败时再由自己的地址下载
+                await inflight.wait()
+                continue
+
+            done = self._inflight[key] = asyncio.Event()
+            try:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                await downloader.fetch(url, obj, md5, size, on_progress)
+                downloaded = True
+            finally:
+                del self._inflight[key]
+                done.set()
+
+        self.link(md5, dest)
+        return downloaded
@@ -0,0 +1,65 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from config import DOWNLOAD_HISTORY_PATH, DOWNLOAD_HISTORY_SIZE
+
+# 太短的下载受连接建立等固定开销影响大，不计入历史
+MIN_RECORD_BYTES = 1024 * 1024
+MIN_RECORD_SECONDS = 1.0
+
+
+class ThroughputHistory:
+    """历次下载实测吞吐量，用于估计下载时间
+
+    每次同步结束后记录实际从网络接收的字节数和耗时，只保留最近
+    ``DOWNLOAD_HISTORY_SIZE`` 次。
+    """
+
+    def __init__(
+        self, path: Path = DOWNLOAD_HISTORY_PATH, size: int = DOWNLOAD_HISTORY_SIZE
+    ):
+        self.path = Path(path)
+        self.size = size
+        self.records: list[dict] = []
+
+        if self.path.exists():
+            try:
+                with open(self.path, encoding="utf8") as file:
+                    self.records = json.load(file)
+            except (OSError, ValueError):
+                print(f"下载历史 {self.path} 已损坏，将重新记录")
+
+    def record(self, received: int, seconds: float, server: str | None = None):
+        if received < MIN_RECORD_BYTES or seconds < MIN_RECORD_SECONDS:
+            return
+
+        self.records.append(
+            {
+                "time": int(time.time()),
+                "bytes": received,
+                "seconds": round(seconds, 3),
+                "server": server,
+            }
+        )
+        self.records = self.records[-self.size :]
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf8") as file:
+            json.dump(self.records, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
+
+    def throughput(self) -> float | None:
+        """最近几次下载的平均吞吐量（字节/秒），没有历史时为 None"""
+        seconds = sum(r["seconds"] for r in self.records)
+        if not seconds:
+            return None
+        return sum(r["bytes"] for r in self.records) / seconds
+
+    def eta(self, n_bytes: int) -> float | None:
+        speed = self.throughput()
+        return n_bytes / speed if speed else None
@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from config import UNPACK_CACHE_BUDGET, UNPACK_CACHE_MAX_AGE, UNPACK_CACHE_PATH
+from unpacker import UNPACKER_VERSION, make_output_dir
+from util import file_md5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    md5 TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# 不写入缓存的 result 字段：输出目录每次不同，统计只属于当次运行
+TRANSIENT_KEYS = ("output_path", "encode", "decode")
+
+
+def _link_tree(src: Path, dst: Path) -> int:
+    """把 ``src`` 下的文件硬链接到 ``dst``（跨文件系统时复制），返回总字节数"""
+    size = 0
+    for file in src.rglob("*"):
+        if not file.is_file():
+            continue
+        target = dst / file.relative_to(src)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(file, target)
+        except OSError:
+            shutil.copy2(file, target)
+        size += target.stat().st_size
+    return size
+
+
+class UnpackCache:
+    """解包结果缓存
+
+    以资源内容的 md5、``UNPACKER_VERSION`` 和解包选项为键，保存解包输出的文件和
+    ``result`` 中的元数据（``pics``、``pos_info``、``audios`` 等）::
+
+        cache = UnpackCache()
+        key = cache.key(cache.bundle_md5(bundle), options)
+        if (result := cache.load(key, "out/")) is None:
+            result = ArkMediaUnPacker(...).export_avg_chararts()
+            cache.save(key, result)
+
+    命中时把缓存的文件硬链接到新的解包目录，保存时同样是硬链接。删除解包目录或其中的
+    文件不影响缓存，但文件与缓存共用同一份数据，不能原地修改，需要修改时先删除再写入新文件。
+    多个进程可以共用同一个缓存目录。
+
+    Args:
+        root (Path, optional): 缓存目录.
+        budget (int, optional): 磁盘预算（字节）.
+        max_age (float, optional): 超过该时间（秒）未使用的结果会被淘汰.
+    """
+
+    def __init__(
+        self,
+        root: Path = UNPACK_CACHE_PATH,
+        budget: int = UNPACK_CACHE_BUDGET,
+        max_age: float = UNPACK_CACHE_MAX_AGE,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.budget = budget
+        self.max_age = max_age
+        self.conn = sqlite3.connect(self.root / "index.db", timeout=30)
+        self.conn.executescript(SCHEMA)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_evicted": 0}
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def key(bundle_md5: str, options: dict) -> str:
+        payload = json.dumps(
+            {
+                "md5": bundle_md5.lower(),
+                "version": UNPACKER_VERSION,
+                "options": options,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def bundle_md5(self, path: Path) -> str:
+        """资源文件的 md5，按路径、大小和修改时间记住计算结果，文件未变化时不再读取"""
+        path = Path(path).resolve()
+        stat = path.stat()
+        row = self.conn.execute(
+            "SELECT md5 FROM digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (str(path), stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row:
+            return row[0]
+
+        md5 = file_md5(path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, md5),
+            )
+        return md5
+
+    def prune_digests(self) -> int:
+        """删除已不存在的文件的 md5 记录，返回删除的条数"""
+        rows = self.conn.execute("SELECT path FROM digests").fetchall()
+        gone = [r for r in rows if not Path(r[0]).exists()]
+        with self.conn:
+            self.conn.executemany("DELETE FROM digests WHERE path = ?", gone)
+        return len(gone)
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    @property
+    def size(self) -> int:
+        row = self.conn.execute("SELECT IFNULL(SUM(size), 0) FROM entries").fetchone()
+        return row[0]
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _touch(self, key: str) -> bool:
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        return cur.rowcount > 0
+
+    def load(self, key: str, output_path: str | Path) -> dict | None:
+        """取出缓存的结果，文件链接到 ``output_path`` 下新的解包目录
+
+        Returns:
+            dict | None: 与 ``export_avg_chararts`` 相同的结果（``cached`` 为真），
+            未缓存时为 None
+        """
+        entry = self.entry_path(key)
+        if not entry.exists() or not self._touch(key):
+            self.stats["misses"] += 1
+            return None
+
+        out = None
+        try:
+            with open(entry / "result.json", encoding="utf8") as file:
+                meta = json.load(file)
+            out = make_output_dir(output_path)
+            _link_tree(entry / "files", out)
+        except (OSError, ValueError):
+            # 其他进程正在淘汰该结果，或缓存已损坏
+            if out:
+                shutil.rmtree(out, ignore_errors=True)
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return {**meta, "output_path": out, "encode": {}, "decode": {}, "cached": True}
+
+    def save(self, key: str, result: dict):
+        """保存一次解包的结果，需在解包目录被修改或删除之前调用"""
+        entry = self.entry_path(key)
+        if entry.exists():
+            self._touch(key)
+            return
+
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp_", dir=self.root))
+        try:
+            size = _link_tree(Path(result["output_path"]), tmp / "files")
+            meta = {k: v for k, v in result.items() if k not in TRANSIENT_KEYS}
+            with open(tmp / "result.json", "w", encoding="utf8") as file:
+                json.dump(meta, file, ensure_ascii=False)
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(tmp, entry)
+        except OSError:
+            # 其他进程已保存同一结果
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, size, now, now),
+            )
+
+    def _remove(self, key: str, size: int):
+        shutil.rmtree(self.entry_path(key), ignore_errors=True)
+        with self.conn:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.stats["evictions"] += 1
+        self.stats["bytes_evicted"] += size
+
+    def evict(self, budget: int | None = None, max_age: float | None = None) -> int:
+        """淘汰过期的结果，再按最久未使用淘汰直到总大小不超过预算
+
+        Returns:
+            int: 释放的字节数
+        """
+        budget = self.budget if budget is None else budget
+        max_age = self.max_age if max_age is None else max_age
+
+        freed = 0
+        expired = self.conn.execute(
+            "SELECT key, size FROM entries WHERE last_access < ?",
+            (time.time() - max_age,),
+        ).fetchall()
+        for key, size in expired:
+            self._remove(key, size)
+            freed += size
+
+        total = self.size
+        if total <= budget:
+            return freed
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total <= budget:
+                break
+            self._remove(key, size)
+            total -= size
+            freed += size
+        return freed
+
+    def clear(self) -> int:
+        return self.evict(budget=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看和清理解包结果缓存")
+    parser.add_argument("--budget", type=int, default=UNPACK_CACHE_BUDGET, help="字节")
+    parser.add_argument(
+        "--max-age", type=float, default=UNPACK_CACHE_MAX_AGE, help="秒"
+    )
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    args = parser.parse_args()
+
+    cache = UnpackCache(budget=args.budget, max_age=args.max_age)
+    with contextlib.closing(cache):
+        freed = cache.clear() if args.clear else cache.evict()
+        cache.prune_digests()
+        print(
+            json.dumps(
+                {"entries": len(cache), "size": cache.size, "freed": freed},
+                ensure_ascii=False,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,225 @@
 import contextlib
+import fnmatch
 import json
+import tempfile
 import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Any
 
 import UnityPy
 from natsort import natsorted
-from UnityPy.classes import AudioClip, MonoBehaviour, Sprite, Texture2D
+from PIL import Image
+from UnityPy.classes import AudioClip, Sprite, Texture2D
+from UnityPy.files import ObjectReader
+from UnityPy.helpers.TypeTreeNode import TypeTreeNode
 
+from decoder import TextureDecoder
+from encoder import ImageEncoder
 
-class ArkMediaUnPacker:
-    def __init__(self, input_file: str | bytes, output_path: str = "out/"):
-        self.env = UnityPy.load(input_file)
+# 解包输出（文件和 result 的内容）发生变化时递增，使旧的解包缓存失效
+UNPACKER_VERSION = 2
 
-        self.output_path = Path(output_path) / f"unpack_{int(time.time())}"
 
-        if not self.output_path.exists():
-            self.output_path.mkdir(parents=True)
+def make_output_dir(output_path: str | Path) -> Path:
+    """在 ``output_path`` 下创建新的解包目录"""
+    # 多个进程同时解包时目录名不能只靠时间戳区分
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=f"unpack_{int(time.time())}_", dir=output_path))
+
+
+class ArkMediaUnPacker:
+    def __init__(
+        self,
+        input_file: str | bytes | memoryview,
+        output_path: str = "out/",
+        encoder: ImageEncoder | None = None,
+        decoder: TextureDecoder | None = None,
+        in_memory: bool = False,
+    ):
+        self.env = UnityPy.load(input_file)
+        # 图片只解码到内存（result["images"]），不编码保存
+        self.in_memory = in_memory
+        # 贴图在后台解码、在编码线程池中保存，未传入时使用默认设置并在导出结束后关闭
+        self._owns_encoder = encoder is None
+        self.encoder = encoder or ImageEncoder()
+        self._owns_decoder = decoder is None
+        self.decoder = decoder or TextureDecoder()
+        # (保存或解码完成的 Future, 是否为立绘原图（Sprite 为 None）, 输出路径,
+        # 是否合并了遮罩)，按提交顺序记录结果
+        self._pending_pics: list[tuple[Future, bool | None, Path, bool]] = []
+        # 同时存在 xxx 和 xxx[alpha] 两个贴图的 xxx，及先读到、等待另一半的贴图
+        self._alpha_pairs: set[str] = set()
+        self._held_textures: dict[str, Texture2D] = {}
+
+        self.output_path = make_output_dir(output_path)
 
         self.result = {
             "output_path": self.output_path,
             "type_cnt": 0,
-            "pics": {"full": [], "face": [], "full_alpha": [], "face_alpha": []},
+            # merged：已把遮罩贴图合并为透明通道的图片
+            "pics": {
+                "full": [],
+                "face": [],
+                "full_alpha": [],
+                "face_alpha": [],
+                "merged": [],
+            },
             "pos_info": [],
             "audios": [],
+            "image_ext": self.encoder.ext,
         }
+        if in_memory:
+            # 相对解包目录的路径（如 full/xxx.png）-> 图片，与保存到文件时的路径相同
+            self.result["images"] = {}
+        # (类型树根节点 id, 字段) -> (根节点, 截断后的类型树)
+        self._field_nodes: dict[
+            tuple[int, tuple[str, ...]], tuple[TypeTreeNode, TypeTreeNode]
+        ] = {}
+
+    def peek_name(self, obj: ObjectReader) -> str | None:
+        """只读取对象的名称，不解码其余内容（如图片数据）"""
+        with contextlib.suppress(Exception):
+            return obj.peek_name()
+        return None
+
+    def iter_objects(
+        self, types: Iterable[str] | None = None, names: Iterable[str] | None = None
+    ) -> Iterator[ObjectReader]:
+        """按类型和名称筛选对象，筛选过程不解码对象
+
+        Args:
+            types (Iterable[str] | None, optional): 类型名，如 ``Texture2D``.
+                默认为可处理的所有类型.
+            names (Iterable[str] | None, optional): 名称的通配符模式，
+                如 ``avg_npc_001*``. 默认不限.
+        """
+        types = set(types or self.methods)
+        patterns = list(names) if names is not None else None
+        for obj in self.env.objects:
+            if obj.type.name not in types:
+                continue
+            if patterns is not None:
+                name = self.peek_name(obj)
+                if name is None:
+                    continue
+                if not any(fnmatch.fnmatchcase(name, p) for p in patterns):
+                    continue
+            yield obj
+
+    def read_fields(self, obj: ObjectReader, *fields: str) -> dict[str, Any]:
+        """只读取对象类型树中的部分顶层字段
+
+        对象数据按类型树顺序存储，因此只解析到所需字段中最靠后的一个为止，
+        其后的字段（如大数组）不会被读取.
 
-    def save_Texture2D(self, data: Texture2D):
+        Returns:
+            dict[str, Any]: 字段名 -> 值，类型树中没有的字段不包含在内
+        """
+        # 类型树保存在资源文件中，在 env 的生命周期内不会变化
+        node = obj._get_typetree_node()
+        key = (id(node), fields)
+        if key not in self._field_nodes:
+            indices = [i for i, c in enumerate(node.m_Children) if c.m_Name in fields]
+            if not indices:
+                return {}
+            subtree = TypeTreeNode(
+                node.m_Level,
+                node.m_Type,
+                node.m_Name,
+                node.m_ByteSize,
+                node.m_Version,
+                node.m_Children[: max(indices) + 1],
+            )
+            self._field_nodes[key] = (node, subtree)
+
+        tree = obj.parse_as_dict(self._field_nodes[key][1], check_read=False)
+        return {f: tree[f] for f in fields if f in tree}
+
+    def save_Texture2D(self, obj: ObjectReader):
         """保存素材图片（立绘差分的原始和遮罩图片、CG、插图等）
 
         Args:
-            data (_type_): Texture2D
+            obj (ObjectReader): Texture2D
         """
+        data: Texture2D = obj.read()
 
         if not self.output_path.exists():
             self.output_path.mkdir()
 
-        if data.m_Width != 0:
-            pic_type = 1
-            if data.m_Name.startswith("avg"):
-                img_path = self.output_path / "full"
-            else:
-                img_path = self.output_path / "face"
-                pic_type = 0
-
-            if not img_path.exists():
-                img_path.mkdir()
+        if data.m_Width == 0:
+            return
+
+        base = data.m_Name.removesuffix("[alpha]")
+        if base not in self._alpha_pairs:
+            self._submit_texture(data)
+            return
+
+        # 原图和遮罩都读取后一起解码，遮罩合并为原图的透明通道，不单独保存
+        held = self._held_textures.pop(base, None)
+        if held is None or held.m_Name == data.m_Name:
+            if held is not None:
+                self._submit_texture(held)
+            self._held_textures[base] = data
+            return
+        rgb, alpha = (data, held) if data.m_Name == base else (held, data)
+        self._submit_texture(rgb, alpha)
+
+    def _find_alpha_pairs(self, names: Iterable[str] | None):
+        """找出原图和遮罩贴图成对出现的名称（只读取名称）"""
+        tex_names = {
+            self.peek_name(obj) for obj in self.iter_objects(["Texture2D"], names)
+        }
+        self._alpha_pairs = {
+            n.removesuffix("[alpha]")
+            for n in tex_names
+            if n and n.endswith("[alpha]") and n.removesuffix("[alpha]") in tex_names
+        }
 
-            out_file = img_path / f"{data.m_Name}.png"
+    def _submit_texture(self, data: Texture2D, alpha: Texture2D | None = None):
+        """提交贴图解码和保存，``alpha`` 为需要合并的遮罩贴图"""
+        pic_type = 1
+        if data.m_Name.startswith("avg"):
+            img_path = self.output_path / "full"
+        else:
+            img_path = self.output_path / "face"
+            pic_type = 0
 
-            try:
-                data.image.save(out_file)
+        if not img_path.exists() and not self.in_memory:
+            img_path.mkdir()
 
-                if pic_type:
-                    if not out_file.name.endswith("[alpha].png"):
-                        self.result["pics"]["full"].append(out_file.name)
-                        self.result["type_cnt"] += 1
-                    else:
-                        self.result["pics"]["full_alpha"].append(
-                            out_file.name.replace("[alpha].png", "")
-                        )
-                else:
-                    if not out_file.name.endswith("[alpha].png"):
-                        self.result["pics"]["face"].append(out_file.name)
-                    else:
-                        self.result["pics"]["face_alpha"].append(
-                            out_file.name.replace("[alpha].png", "")
-                        )
+        out_file = img_path / f"{data.m_Name}{self.encoder.ext}"
 
-            except Exception:
-                pass
+        try:
+            if self.in_memory:
+                fut = self.decoder.submit(data, alpha=alpha)
+            else:
+                fut = self.decoder.submit(data, self.encoder, out_file, alpha)
+        except Exception:
+            return
+        self._pending_pics.append((fut, bool(pic_type), out_file, alpha is not None))
+
+    def _store_image(self, out_file: Path, image: Image.Image):
+        self.result["images"][out_file.relative_to(self.output_path).as_posix()] = image
+
+    def _record_pic(self, out_file: Path, full: bool):
+        """记录保存成功的素材图片"""
+        key = "full" if full else "face"
+        if not out_file.stem.endswith("[alpha]"):
+            self.result["pics"][key].append(out_file.name)
+            if full:
+                self.result["type_cnt"] += 1
+        else:
+            self.result["pics"][f"{key}_alpha"].append(out_file.stem[: -len("[alpha]")])
 
-    def save_Sprite(self, data: Sprite):
+    def save_Sprite(self, obj: ObjectReader):
         """保存Sprite图片
 
         Args:
-            data (_type_): Sprite
+            obj (ObjectReader): Sprite
         """
+        data: Sprite = obj.read()
 
         if not self.output_path.exists():
             self.output_path.mkdir()
@@ -84,20 +227,25 @@ class ArkMediaUnPacker:
         if data.m_Name.startswith("avg"):
             img_path = self.output_path / "full"
 
-            if not img_path.exists():
+            if not img_path.exists() and not self.in_memory:
                 img_path.mkdir()
 
-            out_file = img_path / f"{data.m_Name}_sprite.png"
+            out_file = img_path / f"{data.m_Name}_sprite{self.encoder.ext}"
 
             with contextlib.suppress(Exception):
-                data.image.save(out_file)
+                if self.in_memory:
+                    self._store_image(out_file, data.image)
+                else:
+                    fut = self.encoder.submit(data.image, out_file)
+                    self._pending_pics.append((fut, None, out_file, False))
 
-    def save_AudioClip(self, data: AudioClip):
+    def save_AudioClip(self, obj: ObjectReader):
         """保存音频文件（BGM、语音、音效等）
 
         Args:
-            data (_type_): AudioClip
+            obj (ObjectReader): AudioClip
         """
+        data: AudioClip = obj.read()
 
         if not self.output_path.exists():
             self.output_path.mkdir()
@@ -126,14 +274,14 @@ class ArkMediaUnPacker:
             # 如果解包失败，尝试使用默认的wav格式
             print(f"Error saving AudioClip {data.m_Name}: {e}")
 
-    def get_pos_info(self, mono: MonoBehaviour):
+    def get_pos_info(self, obj: ObjectReader):
         """获取差分图像的变形参数
 
         Args:
-            mono (_type_): MonoBehaviour
+            obj (ObjectReader): MonoBehaviour
         """
 
-        if spriteGroups := mono.object_reader.read_typetree().get("spriteGroups"):
+        if spriteGroups := self.read_fields(obj, "spriteGroups").get("spriteGroups"):
             for p in spriteGroups:
                 self.result["pos_info"].append(
                     {
@@ -151,21 +299,49 @@ class ArkMediaUnPacker:
         "AudioClip": save_AudioClip,
     }
 
-    def export_avg_chararts(self) -> dict[str, Any]:
+    def export_avg_chararts(
+        self, types: Iterable[str] | None = None, names: Iterable[str] | None = None
+    ) -> dict[str, Any]:
         """获取剧情立绘差分的原始图片、遮罩图片和差分图像的变形参数
 
+        Args:
+            types (Iterable[str] | None, optional): 只处理这些类型的对象，
+                见 ``iter_objects``.
+            names (Iterable[str] | None, optional): 只处理名称匹配的对象，
+                见 ``iter_objects``.
+
         Returns:
             Dict[str, Any]: _description_
         """
-        for obj in self.env.objects:
-            func = self.methods.get(obj.type.name)
-
-            if not func:
-                # print('Unknown type:' + type_name)
-                continue
-
-            assert func
-            func(self, obj.read())
+        # 未选中的对象只在筛选时读取名称，不解码
+        try:
+            if types is None or "Texture2D" in types:
+                self._find_alpha_pairs(names)
+
+            for obj in self.iter_objects(types, names):
+                self.methods[obj.type.name](self, obj)
+            # 另一半没有被处理（如宽度为 0）的贴图单独保存
+            for data in self._held_textures.values():
+                self._submit_texture(data)
+            self._held_textures.clear()
+
+            for fut, full, out_file, merged in self._pending_pics:
+                with contextlib.suppress(Exception):
+                    image = fut.result()
+                    if self.in_memory:
+                        self._store_image(out_file, image)
+                    if full is not None:
+                        self._record_pic(out_file, full)
+                    if merged:
+                        self.result["pics"]["merged"].append(out_file.name)
+            self._pending_pics.clear()
+        finally:
+            if self._owns_decoder:
+                self.decoder.close()
+            if self._owns_encoder:
+                self.encoder.close()
+        self.result["decode"] = self.decoder.stats
+        self.result["encode"] = self.encoder.stats
 
         self.result["pics"]["face_alpha"] = natsorted(self.result["pics"]["face_alpha"])
         return self.result
\ No newline at end of file
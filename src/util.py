@@ -1,21 +1,38 @@
+import contextlib
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
 import time
 import zipfile
+from collections.abc import Iterator
 from pathlib import Path
 
 import aiofiles
 import httpx
 
+from config import AUDIT_READ_SIZE, HEADERS
+from downloader import ArkDownloader
 
-async def get_data(url: str, use_proxy=False, params=None, headers=None, cookies=None):
+
+async def get_data(
+    url: str,
+    use_proxy=False,
+    params=None,
+    headers=None,
+    cookies=None,
+    downloader: ArkDownloader | None = None,
+):
+    # 传入 downloader 时复用其连接池，否则临时创建一个客户端
+    if downloader:
+        return await downloader.get(
+            url, params=params, headers=headers, cookies=cookies
+        )
 
     async with httpx.AsyncClient() as client:
-        if headers:
-            client.headers = headers
-        else:
-            client.headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/107.0.0.0 Safari/537.36 Edg/107.0.1418.26"
-            }
+        client.headers = headers or HEADERS
         resp = await client.get(
             url, params=params, cookies=cookies, timeout=60, follow_redirects=True
         )
@@ -28,13 +45,23 @@ async def get_json(url: str, use_proxy, params=None, headers=None, cookies=None)
 
 
 async def download_file(
-    url: str, use_proxy, name: str, path: str | Path, params=None, headers=None
+    url: str,
+    use_proxy,
+    name: str,
+    path: str | Path,
+    params=None,
+    headers=None,
+    downloader: ArkDownloader | None = None,
 ):
     if isinstance(path, str):
         path = Path(path)
 
     path.mkdir(exist_ok=True)
-    resp = await get_data(url, use_proxy, params, headers)
+    if downloader is None:
+        async with ArkDownloader() as downloader:
+            resp = await downloader.get(url, params=params, headers=headers)
+    else:
+        resp = await downloader.get(url, params=params, headers=headers)
     async with aiofiles.open(path / name, "wb") as wf:
         await wf.write(resp.content)
         print(f"{name} 下载成功.")
@@ -51,3 +78,74 @@ def extract_package(file_path: Path) -> bytes:
     with zipfile.ZipFile(file_path) as f, f.open(f.infolist()[0].filename) as ab:
         content = ab.read()
     return content
+
+
+# zip 本地文件头：固定 30 字节，之后是文件名和扩展字段
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+
+
+@contextlib.contextmanager
+def open_package(file_path: Path) -> Iterator[memoryview | str]:
+    """打开资源文件中的 AssetBundle，不把内容复制成 ``bytes``
+
+    与 ``extract_package`` 作用相同，结果可直接传给 ``ArkMediaUnPacker``：
+
+    - 未压缩的成员（资源文件通常如此）：映射整个 zip，返回成员所在区间的 memoryview，
+      由系统按需读取页面
+    - 压缩的成员：流式解压到临时文件，返回路径，由 UnityPy 从文件读取
+
+    只能在 ``with`` 块内使用返回值::
+
+        with open_package(path) as ab:
+            unpack_info = ArkMediaUnPacker(ab).export_avg_chararts()
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        info = zf.infolist()[0]
+        if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+            with open(file_path, "rb") as file:
+                if info.file_size == 0:
+                    yield memoryview(b"")
+                    return
+
+                mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                signature, name_len, extra_len = _LOCAL_HEADER.unpack_from(
+                    mm, info.header_offset
+                )
+                if signature != b"PK\x03\x04":
+                    mm.close()
+                    raise zipfile.BadZipFile(f"{file_path} 的本地文件头损坏")
+                start = info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+                view = memoryview(mm)[start : start + info.file_size]
+                try:
+                    yield view
+                finally:
+                    # UnityPy 的对象可能仍引用这段内存，此时映射在它们被回收后释放
+                    with contextlib.suppress(BufferError):
+                        view.release()
+                        mm.close()
+            return
+
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+            tmp_file = Path(tmp) / Path(info.filename).name
+            with zf.open(info) as src, open(tmp_file, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            yield str(tmp_file)
+
+
+def file_md5(path: Path) -> str:
+    """计算文件 md5
+
+    优先用 mmap 直接对文件映射计算，不经过用户态缓冲区；
+    hashlib 处理大块数据时会释放 GIL，因此可以用线程池并行。
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return hashlib.md5().hexdigest()
+        try:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return hashlib.md5(m).hexdigest()
+        except (OSError, ValueError):
+            digest = hashlib.md5()
+            while chunk := file.read(AUDIT_READ_SIZE):
+                digest.update(chunk)
+            return digest.hexdigest()
@@ -0,0 +1,57 @@
+"""测试 ``batch_unpack.BatchUnpacker`` 对超时、崩溃和出错的资源的处理"""
+
+import os
+import time
+from pathlib import Path
+
+from batch_unpack import BatchUnpacker
+
+
+def fake_unpack(bundle: str, output_path: str) -> dict:
+    """按资源名模拟各种情况的处理函数（在工作进程中运行，需可被 pickle）"""
+    name = Path(bundle).stem
+    if name.startswith("slow"):
+        time.sleep(30)
+    elif name.startswith("crash"):
+        os._exit(3)
+    elif name.startswith("error"):
+        raise ValueError("bad bundle")
+    return {"outputs": [f"{output_path}/{name}.png"], "pid": os.getpid()}
+
+
+def run(bundles: list[str], **kwargs) -> dict[str, dict]:
+    unpacker = BatchUnpacker("out", func=fake_unpack, **kwargs)
+    return {r["bundle"].stem: r for r in unpacker.run(Path(b) for b in bundles)}
+
+
+def test_timeout_replaces_worker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    start = time.perf_counter()
+    results = run(["slow.zip", "a.zip", "b.zip"], jobs=1, timeout=1)
+
+    assert time.perf_counter() - start < 10
+    assert not results["slow"]["ok"]
+    assert "1 秒" in results["slow"]["error"]
+    # 超时的进程被替换，之后的资源照常处理
+    assert results["a"]["ok"]
+    assert results["b"]["ok"]
+
+
+def test_crash_replaces_worker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = run(["crash.zip", "a.zip"], jobs=1, timeout=None)
+
+    assert not results["crash"]["ok"]
+    assert "(3)" in results["crash"]["error"]
+    assert results["a"]["ok"]
+    assert results["a"]["outputs"] == ["out/a.png"]
+
+
+def test_error_keeps_worker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = run(["a.zip", "error.zip", "b.zip"], jobs=1, timeout=None)
+
+    assert not results["error"]["ok"]
+    assert results["error"]["error"] == "ValueError: bad bundle"
+    # 处理函数抛出的异常不影响工作进程
+    assert results["a"]["pid"] == results["b"]["pid"]
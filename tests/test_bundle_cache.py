@@ -0,0 +1,87 @@
+"""在本地模拟服务器上测试 ``bundle_cache.BundleCache`` 的命中和淘汰"""
+
+import asyncio
+
+import pytest
+
+from bundle_cache import BundleCache
+from downloader import ArkDownloader
+from mock_cdn import MockCDN
+
+FILE_SIZE = 4 * 1024
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize(("policy", "evicted"), [("lru", 0), ("lfu", 1)])
+def test_eviction_policy(policy, evicted):
+    with MockCDN(files=3, file_size=FILE_SIZE, anon_files=0) as cdn:
+        infos = cdn.hot_update_list["abInfos"]
+        names = [i["name"] for i in infos]
+        # 只需淘汰一个资源
+        budget = sum(i["totalSize"] for i in infos) - 1
+
+        async def run():
+            async with BundleCache(
+                "cache",
+                budget=budget,
+                policy=policy,
+                downloader=ArkDownloader(backoff=0.01),
+                assets_url=cdn.assets_url,
+            ) as cache:
+                # 0 访问两次但较早，1 访问一次但较晚
+                for name in (names[0], names[0], names[1], names[2]):
+                    await cache.open_bundle(name, cdn.version)
+                paths = [cache.object_path(i["md5"]) for i in infos]
+                return dict(cache.stats), paths, len(cache)
+
+        stats, paths, entries = asyncio.run(run())
+        requests = cdn.stats["requests"]
+
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 1
+    assert entries == 2
+    assert [p.exists() for p in paths] == [i != evicted for i in range(3)]
+    # 文件列表和 3 个资源
+    assert requests == 4
+
+
+def test_concurrent_open_downloads_once():
+    with MockCDN(files=1, file_size=FILE_SIZE, anon_files=0) as cdn:
+        name = cdn.hot_update_list["abInfos"][0]["name"]
+
+        async def run():
+            async with BundleCache(
+                "cache", downloader=ArkDownloader(), assets_url=cdn.assets_url
+            ) as cache:
+                paths = await asyncio.gather(
+                    *(cache.open_bundle(name, cdn.version) for _ in range(4))
+                )
+                return dict(cache.stats), paths
+
+        stats, paths = asyncio.run(run())
+        requests = cdn.stats["requests"]
+
+    assert len(set(paths)) == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] == 3
+    # 文件列表和 1 个资源
+    assert requests == 2
+
+
+def test_unknown_bundle():
+    with MockCDN(files=1, file_size=FILE_SIZE, anon_files=0) as cdn:
+
+        async def run():
+            async with BundleCache(
+                "cache", downloader=ArkDownloader(), assets_url=cdn.assets_url
+            ) as cache:
+                await cache.open_bundle("avg/characters/missing.ab", cdn.version)
+
+        with pytest.raises(KeyError):
+            asyncio.run(run())
@@ -0,0 +1,31 @@
+"""测试 ``decoder.merge_alpha`` 合并遮罩贴图"""
+
+import numpy as np
+from PIL import Image
+
+from decoder import merge_alpha
+
+
+def test_merge_alpha_same_size():
+    rgb = Image.new("RGB", (4, 2), (10, 20, 30))
+    alpha = Image.fromarray(np.array([[0, 64, 128, 255]] * 2, dtype=np.uint8))
+
+    merged = merge_alpha(rgb, alpha)
+
+    assert merged.mode == "RGBA"
+    assert merged.size == (4, 2)
+    pixels = np.asarray(merged)
+    assert (pixels[..., :3] == (10, 20, 30)).all()
+    assert (pixels[..., 3] == [0, 64, 128, 255]).all()
+
+
+def test_merge_alpha_resizes_mask():
+    rgb = Image.new("RGBA", (8, 8), (200, 100, 50, 0))
+    # 遮罩通常是 RGB 贴图，按灰度取值
+    alpha = Image.new("RGB", (4, 4), (255, 255, 255))
+
+    merged = merge_alpha(rgb, alpha)
+
+    assert merged.mode == "RGBA"
+    assert merged.size == (8, 8)
+    assert (np.asarray(merged) == (200, 100, 50, 255)).all()
@@ -0,0 +1,257 @@
+"""在本地模拟服务器（``mock_cdn.MockCDN``）上测试下载和同步"""
+
+import asyncio
+import hashlib
+import io
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import download_res
+from config import DEFAULT_SERVER
+from download_res import ResourceSyncer, bundle_url, get_local_res_version
+from downloader import ArkDownloader, DownloadError
+from journal import DownloadJournal
+from mock_cdn import MOCK_CATEGORIES, MockCDN
+
+# 小于 PACK_REQUEST_OVERHEAD，整包下载的成本更低
+FILE_SIZE = 4 * 1024
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """下载目录、数据库和缓存都使用相对路径，每个测试在单独的目录中运行"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def md5_of(path: Path) -> str:
+    return hashlib.md5(path.read_bytes()).hexdigest()
+
+
+def dat_url(cdn: MockCDN, info: dict) -> str:
+    return bundle_url(cdn.assets_url, cdn.version, info["name"])
+
+
+def bundles(cdn: MockCDN) -> list[dict]:
+    """所选类别（不含 anon）的资源"""
+    infos = cdn.hot_update_list["abInfos"]
+    return [i for i in infos if not i["name"].startswith("anon/")]
+
+
+def make_syncer(cdn: MockCDN, monkeypatch, **downloader_kwargs) -> ResourceSyncer:
+    monkeypatch.setitem(download_res.ak_version_api, DEFAULT_SERVER, cdn.version_url)
+    downloader = ArkDownloader(
+        journal=DownloadJournal(Path("journal.json")),
+        backoff=0.01,
+        **downloader_kwargs,
+    )
+    return ResourceSyncer(MOCK_CATEGORIES, downloader, assets_url=cdn.assets_url)
+
+
+def assert_synced(syncer: ResourceSyncer, cdn: MockCDN, kind: str):
+    for info in bundles(cdn):
+        category = info["name"].rsplit("/", 1)[0]
+        path = syncer._out_file(info, f"{kind}/{category}")
+        assert md5_of(path) == info["md5"]
+        # 版本目录中的文件是资源存储的硬链接
+        assert path.samefile(syncer.store.object_path(info["md5"]))
+
+
+def test_sync_categories(monkeypatch):
+    with MockCDN(files=10, file_size=FILE_SIZE) as cdn:
+        syncer = make_syncer(cdn, monkeypatch)
+
+        async def run():
+            async with syncer:
+                syncer.check_version()
+                return await syncer.sync_categories(use_packs=False)
+
+        stats = asyncio.run(run())
+
+    assert stats["files_done"] == 10
+    assert stats["files_failed"] == 0
+    assert_synced(syncer, cdn, "new")
+    assert get_local_res_version() == cdn.version
+
+
+def test_cancel_only_current_sync(monkeypatch):
+    with MockCDN(files=4, file_size=FILE_SIZE) as cdn:
+        syncer = make_syncer(cdn, monkeypatch)
+
+        async def run():
+            async with syncer:
+                syncer.check_version()
+                # 上一次同步被取消，不影响之后的同步
+                syncer.cancel()
+                return await syncer.sync_categories(use_packs=False)
+
+        stats = asyncio.run(run())
+
+    assert stats["files_done"] == 4
+    assert stats["files_cancelled"] == 0
+
+
+def test_sync_anon_short_md5(monkeypatch):
+    with MockCDN(files=2, file_size=FILE_SIZE, anon_files=4) as cdn:
+        syncer = make_syncer(cdn, monkeypatch)
+
+        async def run():
+            async with syncer:
+                syncer.check_version()
+                return await syncer.sync_anon()
+
+        stats = asyncio.run(run())
+
+    anon = [i for i in cdn.hot_update_list["abInfos"] if i["name"].startswith("anon/")]
+    # 与真实资源一样，md5 只有 4 位，且有两个文件相同
+    assert len({i["md5"] for i in anon}) == len(anon) - 1
+    assert stats["files_done"] == len(anon)
+    for info in anon:
+        stem = info["name"].split("/")[-1][:-4]
+        path = Path("download") / cdn.version / "anon" / f"{stem}.zip"
+        assert path.read_bytes() == cdn.payloads[dat_url(cdn, info).rsplit("/", 1)[1]]
+    # 不以不完整的 md5 为键放入资源存储
+    assert not any(syncer.store.root.rglob("*.zip"))
+
+
+def test_short_md5_checks_size():
+    with MockCDN(files=0, file_size=FILE_SIZE, anon_files=1) as cdn:
+        info = cdn.hot_update_list["abInfos"][0]
+
+        async def fetch(out_file: Path, size: int):
+            async with ArkDownloader() as dl:
+                await dl.fetch(dat_url(cdn, info), out_file, info["md5"], size)
+
+        asyncio.run(fetch(Path("ok.zip"), info["totalSize"]))
+        with pytest.raises(DownloadError):
+            asyncio.run(fetch(Path("bad.zip"), info["totalSize"] + 1))
+
+    assert Path("ok.zip").stat().st_size == info["totalSize"]
+    assert not Path("bad.zip").exists()
+
+
+def test_sync_keeps_version_on_failure(monkeypatch):
+    with MockCDN(files=4, file_size=FILE_SIZE, error_rate=1.0) as cdn:
+        syncer = make_syncer(cdn, monkeypatch, retries=1)
+
+        async def run():
+            async with syncer:
+                syncer.check_version()
+                return await syncer.sync_categories(use_packs=False)
+
+        stats = asyncio.run(run())
+
+    assert stats["files_failed"] == 4
+    assert get_local_res_version() is None
+
+
+def member_bytes(path: Path, name: str) -> bytes:
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(name)
+
+
+def test_sync_full_from_packs(monkeypatch):
+    with MockCDN(files=12, file_size=FILE_SIZE, pack_files=4) as cdn:
+        # 包中该成员的大小与 abSize 不符，改为逐个下载
+        bad = cdn.hot_update_list["abInfos"][5]
+        bad["abSize"] += 1
+        cdn.list_body = json.dumps(cdn.hot_update_list).encode()
+        syncer = make_syncer(cdn, monkeypatch)
+
+        async def run():
+            async with syncer:
+                syncer.check_version()
+                return await syncer.sync_full()
+
+        stats = asyncio.run(run())
+        requests = cdn.stats["requests"]
+
+    assert stats["files_failed"] == 0
+    # 版本号、文件列表、3 个包和 1 个逐个下载的资源
+    assert requests == 6
+    for info in bundles(cdn):
+        category = info["name"].rsplit("/", 1)[0]
+        path = syncer._out_file(info, f"full/{category}")
+        dat = cdn.payloads[dat_url(cdn, info).rsplit("/", 1)[1]]
+        # 从包中取出的资源重新打包，成员内容与逐个下载的 .dat 相同
+        assert member_bytes(path, info["name"]) == zipfile.ZipFile(
+            io.BytesIO(dat)
+        ).read(info["name"])
+        assert syncer.store.has(info["md5"]) == (info is bad)
+    assert not any(Path("download").rglob("*.part"))
+    assert not any(Path("download").rglob("packs/*.dat"))
+
+
+def test_resume_truncated_part():
+    with MockCDN(files=1, file_size=FILE_SIZE) as cdn:
+        info = cdn.hot_update_list["abInfos"][0]
+        url = dat_url(cdn, info)
+        data = cdn.payloads[url.rsplit("/", 1)[1]]
+        out_file = Path("bundle.zip")
+
+        # 模拟上次运行中断：.part 只有前一半，下载日志中有记录
+        journal = DownloadJournal(Path("journal.json"))
+        journal.start(out_file, url, info["md5"], info["totalSize"])
+        Path("bundle.zip.part").write_bytes(data[: len(data) // 2])
+
+        async def run():
+            journal = DownloadJournal(Path("journal.json"))
+            async with ArkDownloader(journal=journal) as dl:
+                await dl.fetch(url, out_file, info["md5"], info["totalSize"])
+
+        asyncio.run(run())
+        sent = cdn.stats["bytes_sent"]
+
+    assert md5_of(out_file) == info["md5"]
+    assert sent == len(data) - len(data) // 2
+    assert DownloadJournal(Path("journal.json")).get(out_file) is None
+
+
+@pytest.mark.parametrize("status", [503, 429])
+def test_retry_transient_status(status):
+    with MockCDN(
+        files=8, file_size=FILE_SIZE, error_rate=0.5, error_status=status, seed=1
+    ) as cdn:
+        infos = bundles(cdn)
+
+        async def run():
+            async with ArkDownloader(retries=20, backoff=0.01) as dl:
+                await asyncio.gather(
+                    *(
+                        dl.fetch(dat_url(cdn, i), Path(f"{i['cid']}.zip"), i["md5"])
+                        for i in infos
+                    )
+                )
+                return dl.stats
+
+        stats = asyncio.run(run())
+        errors = cdn.stats["errors"]
+
+    assert errors > 0
+    assert stats["retries"] == errors
+    assert stats["reasons"][f"状态码 {status}"] == errors
+    for info in infos:
+        assert md5_of(Path(f"{info['cid']}.zip")) == info["md5"]
+
+
+def test_reject_md5_mismatch():
+    with MockCDN(files=1, file_size=FILE_SIZE) as cdn:
+        info = cdn.hot_update_list["abInfos"][0]
+        out_file = Path("bundle.zip")
+
+        async def run():
+            journal = DownloadJournal(Path("journal.json"))
+            async with ArkDownloader(journal=journal) as dl:
+                url = dat_url(cdn, info)
+                await dl.fetch(url, out_file, "0" * 32, info["totalSize"])
+
+        with pytest.raises(DownloadError):
+            asyncio.run(run())
+
+    assert not out_file.exists()
+    # 内容有误的部分文件不保留，下次从头下载
+    assert not Path("bundle.zip.part").exists()
+    assert DownloadJournal(Path("journal.json")).get(out_file) is None
@@ -0,0 +1,68 @@
+"""测试 ``encoder.ImageEncoder`` 的保存、统计和关闭"""
+
+import threading
+
+import pytest
+from PIL import Image
+
+from encoder import CODEC_EXT, ImageEncoder, load_image
+
+
+def gradient(width: int = 16, height: int = 8) -> Image.Image:
+    image = Image.new("RGBA", (width, height))
+    image.putdata(
+        [(x * 16, y * 32, 128, 255 - x) for y in range(height) for x in range(width)]
+    )
+    return image
+
+
+@pytest.mark.parametrize("codec", list(CODEC_EXT))
+def test_roundtrip(tmp_path, codec):
+    image = gradient()
+    with ImageEncoder(codec, workers=2) as encoder:
+        # 与解包时一样每次提交新的图片对象
+        futures = [
+            encoder.submit(image.copy(), tmp_path / f"{i}{encoder.ext}")
+            for i in range(4)
+        ]
+
+    # 退出时等待所有图片保存完成
+    assert all(f.done() for f in futures)
+    for future in futures:
+        assert load_image(future.result()).convert("RGBA").tobytes() == image.tobytes()
+    stats = encoder.stats[codec]
+    assert stats["images"] == 4
+    assert stats["pixels"] == 4 * 16 * 8
+    assert stats["bytes"] == sum(f.result().stat().st_size for f in futures)
+
+
+def test_close_waits_for_queue(tmp_path):
+    release = threading.Event()
+    encoder = ImageEncoder("raw", workers=1, queue_size=2)
+    save = encoder._save
+
+    def slow_save(image, out_file):
+        release.wait()
+        return save(image, out_file)
+
+    encoder._save = slow_save
+    futures = [encoder.submit(gradient(), tmp_path / f"{i}.rgba") for i in range(2)]
+    assert not any(f.done() for f in futures)
+
+    threading.Timer(0.2, release.set).start()
+    encoder.close()
+    assert all(f.result().exists() for f in futures)
+
+
+def test_submit_after_close(tmp_path):
+    encoder = ImageEncoder("raw", workers=1, queue_size=1)
+    encoder.close()
+    with pytest.raises(RuntimeError):
+        encoder.submit(gradient(), tmp_path / "a.rgba")
+    # 提交失败时归还名额，不会阻塞之后的调用
+    assert encoder._slots.acquire(blocking=False)
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError, match="未知的编码格式"):
+        ImageEncoder("jpeg")
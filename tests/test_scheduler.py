@@ -0,0 +1,34 @@
+"""测试 ``scheduler.DownloadScheduler`` 的进度统计"""
+
+import asyncio
+
+from scheduler import DownloadScheduler
+
+
+def test_restart_keeps_transferred_bytes():
+    async def run(on_progress):
+        # 第一次尝试收到 60 字节后失败，重试从头下载
+        for received in (0, 30, 60, 0, 50, 100):
+            await on_progress(received)
+        return True
+
+    scheduler = DownloadScheduler(workers=1)
+    scheduler.add("a.zip", "avg", 100, run)
+    stats = asyncio.run(scheduler.run())
+
+    assert stats["files_done"] == 1
+    assert scheduler.bytes_transferred == 160
+    assert scheduler.bytes_done == 100
+
+
+def test_resume_offset_not_transferred():
+    async def run(on_progress):
+        for received in (40, 70, 100):
+            await on_progress(received)
+        return True
+
+    scheduler = DownloadScheduler(workers=1)
+    scheduler.add("a.zip", "avg", 100, run)
+    asyncio.run(scheduler.run())
+
+    assert scheduler.bytes_transferred == 60
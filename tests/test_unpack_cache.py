@@ -0,0 +1,126 @@
+"""测试 ``unpack_cache.UnpackCache`` 的命中、淘汰、md5 记忆和硬链接"""
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+import unpack_cache
+from unpack_cache import UnpackCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = UnpackCache(tmp_path / "cache", budget=10**9, max_age=3600)
+    yield cache
+    cache.close()
+
+
+def unpack_result(out_dir: Path, name: str, data: bytes = b"pixels") -> dict:
+    """模拟一次解包：输出目录中有一张图片，result 中有元数据和当次统计"""
+    out_dir.mkdir(parents=True)
+    (out_dir / "img").mkdir()
+    (out_dir / "img" / f"{name}.png").write_bytes(data)
+    return {
+        "output_path": out_dir,
+        "pics": [f"img/{name}.png"],
+        "encode": {"png": {"images": 1}},
+    }
+
+
+def test_hit_links_files(cache, tmp_path):
+    key = cache.key("A" * 32, {"codec": "png"})
+    assert cache.load(key, tmp_path / "out") is None
+    cache.save(key, unpack_result(tmp_path / "run1", "a"))
+
+    result = cache.load(key, tmp_path / "out")
+
+    assert result is not None
+    assert result["cached"]
+    assert result["pics"] == ["img/a.png"]
+    # 当次统计不写入缓存
+    assert result["encode"] == {}
+    out_file = result["output_path"] / "img" / "a.png"
+    assert out_file.read_bytes() == b"pixels"
+    assert out_file.samefile(tmp_path / "run1" / "img" / "a.png")
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_key_depends_on_options():
+    md5 = "0" * 32
+    assert UnpackCache.key(md5, {"codec": "png"}) == UnpackCache.key(
+        md5.upper(), {"codec": "png"}
+    )
+    assert UnpackCache.key(md5, {"codec": "png"}) != UnpackCache.key(
+        md5, {"codec": "webp"}
+    )
+
+
+def test_evict_least_recently_used(cache, tmp_path):
+    keys = [cache.key(str(i) * 32, {}) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.save(key, unpack_result(tmp_path / f"run{i}", str(i), b"x" * 100))
+        time.sleep(0.01)
+    # 0 最近使用过，1 最久未使用
+    assert cache.load(keys[0], tmp_path / "out") is not None
+
+    freed = cache.evict(budget=250)
+
+    assert freed == 100
+    assert len(cache) == 2
+    assert cache.load(keys[1], tmp_path / "out") is None
+    assert not cache.entry_path(keys[1]).exists()
+    assert cache.stats["evictions"] == 1
+
+
+def test_evict_expired(cache, tmp_path):
+    key = cache.key("0" * 32, {})
+    cache.save(key, unpack_result(tmp_path / "run", "a"))
+
+    assert cache.evict(max_age=3600) == 0
+    assert cache.evict(max_age=-1) == len(b"pixels")
+    assert len(cache) == 0
+
+
+def test_bundle_md5_memoized(cache, tmp_path, monkeypatch):
+    bundle = tmp_path / "a.zip"
+    bundle.write_bytes(b"bundle")
+    calls = []
+    file_md5 = unpack_cache.file_md5
+
+    def counting_md5(path):
+        calls.append(path)
+        return file_md5(path)
+
+    monkeypatch.setattr(unpack_cache, "file_md5", counting_md5)
+
+    first = cache.bundle_md5(bundle)
+    assert cache.bundle_md5(bundle) == first
+    assert len(calls) == 1
+
+    # 文件变化后重新计算
+    bundle.write_bytes(b"changed bundle")
+    assert cache.bundle_md5(bundle) != first
+    assert len(calls) == 2
+
+    bundle.unlink()
+    assert cache.prune_digests() == 1
+
+
+def test_link_fallback_copies(cache, tmp_path, monkeypatch):
+    def no_link(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    key = cache.key("0" * 32, {})
+    cache.save(key, unpack_result(tmp_path / "run", "a"))
+
+    result = cache.load(key, tmp_path / "out")
+
+    assert result is not None
+    out_file = result["output_path"] / "img" / "a.png"
+    assert out_file.read_bytes() == b"pixels"
+    assert not out_file.samefile(tmp_path / "run" / "img" / "a.png")
+    assert cache.size == len(b"pixels")